@@ -0,0 +1,104 @@
+# Benchmark: batch (NumPy) alarm evaluation vs the per-sample check_levels path
+# Both paths are first run on the same samples and must produce identical alarm events.
+
+import os
+import sys
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import opcua_monitor as monitor
+
+SENSORS = 5000
+SAMPLES_PER_SENSOR = 40
+BATCH_SIZE = 50000
+REPEAT = 3
+TIME_DELAY = 2  # s, exercises the pending_since handling
+
+
+# Fresh runtime objects with the alarm limits of config.json Tank_1
+def make_runtimes(count):
+    rts = []
+    for i in range(count):
+        config = {
+            "nodeId": f"ns=3;i={100000 + i}",
+            "name": f"Sensor_{i}",
+            "alarms": {"high_high": 50, "high": 45, "low": 25, "low_low": 20},
+            "deadband": 2.0,
+        }
+        states = {lvl: {"active": False, "pending_since": None, "started_at": None} for lvl in ("HH", "H", "L", "LL")}
+        rts.append(monitor.SensorRuntime(config, monitor.RollingWindow(1), states))
+    return rts
+
+
+# Mean-reverting walks around 35 that regularly cross the alarm limits, interleaved across sensors like a drained queue
+def make_samples(count):
+    random.seed(7)
+    t0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    values = [random.uniform(25, 45) for _ in range(count)]
+    samples = []
+    for k in range(SAMPLES_PER_SENSOR):
+        for i in range(count):
+            values[i] += 0.1 * (35 - values[i]) + random.gauss(0, 3)
+            samples.append((i, values[i], t0 + timedelta(milliseconds=1000 * k + random.randint(0, 999))))
+    return samples
+
+
+def run_scalar(rts, samples):
+    for i, value, ts in samples:
+        monitor.check_levels(rts[i], value, ts)
+
+
+def run_batch(rts, samples):
+    evaluator = monitor.BatchAlarmEvaluator(rts)
+    for start in range(0, len(samples), BATCH_SIZE):
+        evaluator.evaluate([(rts[i], value, ts) for i, value, ts in samples[start:start + BATCH_SIZE]])
+    evaluator.store_states()
+
+
+# Column form, as used for replayed files: arrays are built before timing
+def run_batch_arrays(rts, columns):
+    rows, values, times = columns
+    evaluator = monitor.BatchAlarmEvaluator(rts)
+    for start in range(0, len(rows), BATCH_SIZE):
+        end = start + BATCH_SIZE
+        evaluator.evaluate_arrays(rows[start:end], values[start:end], times[start:end])
+    evaluator.store_states()
+
+
+# Best of REPEAT runs on fresh state; returns the events of the last run
+def collect_events(runner, samples):
+    best = float("inf")
+    for _ in range(REPEAT):
+        events = []
+        monitor.emit_event = lambda *args, **kwargs: events.append(args + (kwargs.get("started_at"),))
+        rts = make_runtimes(SENSORS)
+        start = time.perf_counter()
+        runner(rts, samples)
+        best = min(best, time.perf_counter() - start)
+    return [(e[0], e[1]["name"]) + e[2:] for e in events], best
+
+
+if __name__ == "__main__":
+    if monitor.load_numpy() is None:
+        sys.exit("NumPy is required for this benchmark.")
+    monitor.TIME_DELAY = TIME_DELAY
+    samples = make_samples(SENSORS)
+
+    scalar_events, scalar_time = collect_events(run_scalar, samples)
+    batch_events, batch_time = collect_events(run_batch, samples)
+    columns = (
+        monitor.np.array([i for i, _, _ in samples]),
+        monitor.np.array([v for _, v, _ in samples]),
+        monitor.np.array([monitor.to_us(ts) for _, _, ts in samples], dtype=monitor.np.int64),
+    )
+    array_events, array_time = collect_events(run_batch_arrays, columns)
+    for name, events in (("evaluate", batch_events), ("evaluate_arrays", array_events)):
+        if events != scalar_events:
+            sys.exit(f"Mismatch: check_levels produced {len(scalar_events)} events, {name} produced {len(events)}.")
+
+    print(f"{len(samples)} samples, {SENSORS} sensors, {len(scalar_events)} identical alarm events")
+    print(f"check_levels (per sample):           {len(samples) / scalar_time:>12,.0f} samples/s")
+    print(f"BatchAlarmEvaluator.evaluate:        {len(samples) / batch_time:>12,.0f} samples/s")
+    print(f"BatchAlarmEvaluator.evaluate_arrays: {len(samples) / array_time:>12,.0f} samples/s")
@@ -0,0 +1,98 @@
+# Benchmark: sample window memory, historian write throughput and history queries
+#
+#   python3 benchmarks/bench_historian.py --sensors 10000
+#
+# 1. Memory of a 5-minute window (1 s scanRate) for all sensors: previous deque of floats vs RollingWindow
+# 2. Historian append + flush throughput and bytes on disk per sample
+# 3. Queries over a day of 1 Hz history of one sensor from the raw, 1 s, 1 min and 1 h tiers
+
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+from collections import deque
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from opcua_monitor import RollingWindow, Historian
+
+WINDOW = 300  # 5 minutes at 1 s
+DAY = 86400
+
+
+def window_memory(factory, sensors, rng):
+    tracemalloc.start()
+    windows = [factory() for _ in range(sensors)]
+    for w in windows:
+        for _ in range(WINDOW):
+            w.append(35 + 10 * rng.random())
+    used = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return used
+
+
+# Two rounds of `samples` samples per sensor: the first flush also creates the directories and segment files
+def bench_append(directory, sensors, samples, rng):
+    names = [f"Sensor_{i}" for i in range(sensors)]
+    historian = Historian(directory, names, flush_interval=3600.0)  # flushed explicitly below
+    t0 = 1_700_000_000 * 10**6
+    values = [35 + 10 * rng.random() for _ in range(1000)]
+    append_s = flush_s = 0.0
+    for round_ in range(2):
+        start = time.perf_counter()
+        for k in range(round_ * samples, (round_ + 1) * samples):
+            t = t0 + k * 10**6
+            for i, name in enumerate(names):
+                historian.append(name, t, values[(i + k) % 1000])
+        append_s += time.perf_counter() - start
+        start = time.perf_counter()
+        historian.flush()
+        flush_s = time.perf_counter() - start
+    historian.close()
+    return append_s / (2 * sensors * samples), flush_s, historian.bytes_written / (2 * sensors * samples)
+
+
+def bench_query(directory, rng):
+    historian = Historian(directory, ["Day"], flush_interval=1.0)
+    t0 = 1_700_006_400 * 10**6  # hour aligned
+    for k in range(DAY):
+        historian.append("Day", t0 + k * 10**6, 35 + 10 * rng.random())
+    historian.close()
+    historian = Historian(directory, ["Day"], flush_interval=60.0)
+    results = []
+    for tier in ("raw", "1s", "1m", "1h"):
+        start = time.perf_counter()
+        records = historian.read("Day", t0, t0 + DAY * 10**6, tier)
+        elapsed = time.perf_counter() - start
+        start = time.perf_counter()
+        last_hour = historian.read("Day", t0 + (DAY - 3600) * 10**6, t0 + DAY * 10**6, tier)
+        results.append((tier, len(records), elapsed, len(last_hour), time.perf_counter() - start))
+    historian.close()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sensors", type=int, default=10000)
+    parser.add_argument("--samples", type=int, default=20, help="samples per sensor for the write benchmark")
+    args = parser.parse_args()
+    rng = random.Random(1)
+
+    old = window_memory(lambda: deque(maxlen=WINDOW), args.sensors, rng)
+    new = window_memory(lambda: RollingWindow(WINDOW), args.sensors, rng)
+    print(f"5-minute window x {args.sensors} sensors: deque {old / 1e6:.1f} MB, RollingWindow {new / 1e6:.1f} MB")
+
+    directory = tempfile.mkdtemp(prefix="opcua_history_")
+    try:
+        append_s, flush_s, per_sample = bench_append(os.path.join(directory, "append"), args.sensors, args.samples, rng)
+        print(f"Historian: append {append_s * 1e6:.2f} us/sample, flush of {args.samples} samples x {args.sensors} sensors "
+              f"{flush_s * 1e3:.0f} ms, {per_sample:.1f} bytes on disk per sample (raw + rollups, 1 Hz)")
+
+        print(f"\n{'tier':>5} | {'day: records':>12} | {'day: ms':>8} | {'last hour: records':>18} | {'last hour: ms':>13}")
+        for tier, count, elapsed, hour_count, hour_elapsed in bench_query(os.path.join(directory, "query"), rng):
+            print(f"{tier:>5} | {count:>12} | {elapsed * 1e3:>8.2f} | {hour_count:>18} | {hour_elapsed * 1e3:>13.2f}")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
@@ -0,0 +1,348 @@
+# Load test: runs the monitor headless against a local python-opcua server with N synthetic temperature nodes
+#
+#   python3 benchmarks/bench_load.py --sensors 500 --update-ms 100 --duration 30 --output baseline.json
+#   python3 benchmarks/bench_load.py --sensors 500 --update-ms 100 --duration 30 --compare baseline.json
+#   python3 benchmarks/bench_load.py --sensors 2000 --update-ms 100 --duration 30 --workers 4
+#   python3 benchmarks/bench_load.py --period 600 --noise 0.02 --deadband 0.2   # slowly drifting values, server-side deadband
+#
+# Reports notifications/s, SourceTimestamp -> Socket.IO emit latency (p50/p99), handler CPU time,
+# RSS per sensor and alarm journal write latency, and stores them as a JSON baseline.
+
+import os
+import sys
+import json
+import math
+import time
+import random
+import socket
+import argparse
+import tempfile
+import threading
+import multiprocessing
+from array import array
+from datetime import timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+NAMESPACE = "urn:opcua-monitor:bench"
+REGRESSION_TOLERANCE = 0.10  # 10 %
+# Metric name -> True when higher is better
+METRICS = {
+    "notifications_per_sec": True,
+    "latency_p50_ms": False,
+    "latency_p99_ms": False,
+    "handler_cpu_us_per_notification": False,
+    "handler_cpu_ms_per_sec": False,
+    "rss_kb_per_sensor": False,
+    "alarm_record_p99_us": False,
+    "alarm_flush_p99_ms": False,
+}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def rss_kb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+# Stand-in server (own process): sine waves between 10 and 60 degrees with noise, crossing all alarm limits
+def run_server(endpoint, count, update_ms, period_s, noise, ready, stop):
+    from opcua import Server, ua
+
+    server = Server()
+    server.set_endpoint(endpoint)
+    idx = server.register_namespace(NAMESPACE)
+    folder = server.get_objects_node().add_folder(idx, "Bench")
+    nodes = [folder.add_variable(ua.NodeId(f"Temperature_{i}", idx), f"{idx}:Temperature_{i}", 35.0) for i in range(count)]
+    server.start()
+    ready.set()
+    rng = random.Random(1)
+    phases = [rng.uniform(0, 2 * math.pi) for _ in range(count)]
+    start = time.monotonic()
+    try:
+        while not stop.is_set():
+            t = time.monotonic() - start
+            for node, phase in zip(nodes, phases):
+                node.set_value(35 + 25 * math.sin(2 * math.pi * t / period_s + phase) + rng.gauss(0, noise))
+            stop.wait(max(0.0, update_ms / 1000 - (time.monotonic() - start - t)))
+    finally:
+        server.stop()
+
+
+def write_config(directory, node_ids, scan_rate, historian, workers, deadband):
+    config = {
+        "sensors": [
+            {
+                "nodeId": node_id,
+                "name": f"Temperature_{i}",
+                "unit": "°C",
+                "alarms": {"high_high": 55, "high": 50, "low": 20, "low_low": 15},
+                "deadband": 1.0,
+                "scanRate": scan_rate,
+            }
+            for i, node_id in enumerate(node_ids)
+        ],
+        "alarmSettings": {"requireAcknowledgment": True, "timeDelay": 0},
+        "trendSettings": {"riseRate": 10.0, "fallRate": -10.0},
+        "logSettings": {"level": "ERROR"},
+        "dashboardSettings": {"frameRate": 10},
+        "pipelineSettings": {"queueSize": 100000, "overflowPolicy": "drop_oldest"},
+        "historianSettings": {"enabled": historian, "directory": os.path.join(directory, "history")},
+        "shardingSettings": {"enabled": workers > 0, "maxSensorsPerWorker": math.ceil(len(node_ids) / max(workers, 1))},
+        "monitoringSettings": {"deadbandType": "absolute" if deadband > 0 else "none", "deadbandValue": deadband},
+    }
+    with open(os.path.join(directory, "config.json"), "w") as f:
+        json.dump(config, f)
+
+
+# Wraps the monitor hot path with timers; everything is measured in this process
+def instrument(monitor, results):
+    lock = threading.Lock()
+    source_ts = {}  # sensor name -> SourceTimestamp (epoch s) of the last processed sample
+    cpu = {"handler": 0.0, "worker": 0.0, "coordinator": 0.0}
+
+    handler_cls = monitor.SubHandler
+    original_notification = handler_cls.datachange_notification
+
+    def datachange_notification(self, node, val, data):
+        t = time.thread_time()
+        original_notification(self, node, val, data)
+        cpu["handler"] += time.thread_time() - t
+        results["notifications"] += 1
+
+    handler_cls.datachange_notification = datachange_notification
+
+    original_process = monitor.process_sample
+
+    def process_sample(rt, val, now_ts, *args, **kwargs):
+        t = time.thread_time()
+        ts = now_ts if now_ts.tzinfo else now_ts.replace(tzinfo=timezone.utc)
+        with lock:
+            source_ts[rt.name] = ts.timestamp()
+        num = original_process(rt, val, now_ts, *args, **kwargs)
+        cpu["worker"] += time.thread_time() - t
+        return num
+
+    monitor.process_sample = process_sample
+
+    # Sharded runs: samples arrive at the coordinator already processed by the worker processes
+    coordinator_cls = monitor.ShardCoordinator
+    original_apply = coordinator_cls.apply
+
+    def apply(self, rts, idx, ts, *args):
+        t = time.thread_time()
+        original_apply(self, rts, idx, ts, *args)
+        cpu["coordinator"] += time.thread_time() - t
+        indices = array("I", idx)
+        with lock:
+            for i, t in zip(indices, array("q", ts)):
+                source_ts[rts[i].name] = t / 1e6
+        results["notifications"] += len(indices)
+
+    coordinator_cls.apply = apply
+
+    monitor.create_web_app()  # the dashboard emits are measured without serving clients
+    original_emit = monitor.socketio.emit
+
+    def emit(event, payload, *args, **kwargs):
+        if event == "update" and kwargs.get("to") == "all":
+            now = time.time()
+            names = payload if "i" not in payload else None
+            with lock:
+                for name in names or ():
+                    if name in source_ts:
+                        results["latencies"].append(now - source_ts[name])
+        return original_emit(event, payload, *args, **kwargs)
+
+    monitor.socketio.emit = emit
+
+    journal_cls = monitor.AlarmJournal
+    original_record, original_flush = journal_cls.record, journal_cls.flush
+
+    def record(self, rec):
+        t = time.perf_counter()
+        original_record(self, rec)
+        results["alarm_record"].append(time.perf_counter() - t)
+
+    def flush(self):
+        t = time.perf_counter()
+        original_flush(self)
+        results["alarm_flush"].append(time.perf_counter() - t)
+
+    journal_cls.record, journal_cls.flush = record, flush
+    return cpu
+
+
+def run(args):
+    port = args.port or free_port()
+    endpoint = f"opc.tcp://127.0.0.1:{port}/bench/"
+    ctx = multiprocessing.get_context("spawn")
+    ready, stop = ctx.Event(), ctx.Event()
+    server = ctx.Process(target=run_server, args=(endpoint, args.sensors, args.update_ms, args.period, args.noise, ready, stop), daemon=True)
+    server.start()
+    if not ready.wait(60):
+        sys.exit("Stand-in server did not start.")
+
+    workdir = tempfile.mkdtemp(prefix="opcua_bench_")
+    import opcua_monitor as monitor
+    from opcua import Client
+    rss_start = rss_kb()
+
+    # Resolve the namespace index of the stand-in server for the generated config
+    probe = Client(endpoint)
+    probe.connect()
+    ns = probe.get_namespace_index(NAMESPACE)
+    probe.disconnect()
+    node_ids = [f"ns={ns};s=Temperature_{i}" for i in range(args.sensors)]
+    write_config(workdir, node_ids, args.scan_rate, args.historian, args.workers, args.deadband)
+
+    results = {"notifications": 0, "latencies": [], "alarm_record": [], "alarm_flush": []}
+    cpu = instrument(monitor, results)
+
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        monitor.load_config_json()
+    finally:
+        os.chdir(cwd)
+    monitor.ENDPOINT = endpoint
+    monitor.file_path = os.path.join(workdir, "alarm_history_bench.json")
+    monitor.stop_monitoring = False
+    monitor.alarm_journal = monitor.AlarmJournal(monitor.file_path, monitor.alarm_history)
+    if monitor.historian_settings["enabled"]:
+        monitor.historian = monitor.Historian(monitor.historian_settings["directory"], [rt.name for rt in monitor.runtime.values()],
+                                              monitor.historian_settings["flush_interval"])
+    monitor.pipeline = monitor.IngestPipeline(monitor.pipeline_settings["queue_size"], monitor.pipeline_settings["overflow_policy"])
+    monitor.dashboard.start()
+
+    client = coordinator = None
+    if args.workers:
+        coordinator = monitor.ShardCoordinator(monitor.plan_shards(monitor.runtime.values()))
+    else:
+        client = monitor.connect_to_opcua()
+        if client is None:
+            sys.exit("Monitor could not connect to the stand-in server.")
+    try:
+        t = time.perf_counter()
+        if coordinator is not None:
+            coordinator.start()
+            while not coordinator.samples:  # workers connected and subscribed
+                time.sleep(0.01)
+        else:
+            monitor.subscribe_sensors(client, monitor.SubHandler())
+        subscribe_s = time.perf_counter() - t
+        rss_subscribed = rss_kb()
+
+        time.sleep(args.warmup)
+        results["notifications"] = 0
+        results["latencies"].clear()
+        cpu["handler"] = cpu["worker"] = cpu["coordinator"] = 0.0
+        t = time.perf_counter()
+        time.sleep(args.duration)
+        elapsed = time.perf_counter() - t
+        notifications = results["notifications"]
+        counters = monitor.pipeline.counters()
+    finally:
+        monitor.stop_monitoring = True
+        if coordinator is not None:
+            coordinator.stop()
+        try:
+            client.disconnect()
+        except Exception:
+            pass
+        monitor.pipeline.stop()
+        if monitor.historian is not None:
+            monitor.historian.close()
+        monitor.alarm_journal.close()
+        stop.set()
+        server.join(10)
+
+    notifications = max(notifications, 1)
+    latencies = results["latencies"]
+    return {
+        "parameters": {
+            "sensors": args.sensors,
+            "update_ms": args.update_ms,
+            "scan_rate_ms": args.scan_rate,
+            "duration_s": args.duration,
+            "historian": args.historian,
+            "workers": args.workers,
+            "noise": args.noise,
+            "deadband": args.deadband,
+        },
+        "notifications_per_sec": round(notifications / elapsed, 1),
+        "latency_p50_ms": round(percentile(latencies, 50) * 1000, 2) if latencies else None,
+        "latency_p99_ms": round(percentile(latencies, 99) * 1000, 2) if latencies else None,
+        # Sharded runs: CPU of this (coordinator) process only
+        "handler_cpu_us_per_notification": round((cpu["handler"] + cpu["worker"] + cpu["coordinator"]) / notifications * 1e6, 2),
+        "handler_cpu_ms_per_sec": round((cpu["handler"] + cpu["worker"] + cpu["coordinator"]) / elapsed * 1000, 2),
+        "subscribe_s": round(subscribe_s, 3),
+        "rss_kb_per_sensor": round((rss_subscribed - rss_start) / args.sensors, 2),
+        "alarms": monitor.alarm_history["statistics"]["total_alarms"],
+        "alarm_record_p99_us": round(percentile(results["alarm_record"], 99) * 1e6, 2) if results["alarm_record"] else None,
+        "alarm_flush_p99_ms": round(percentile(results["alarm_flush"], 99) * 1000, 2) if results["alarm_flush"] else None,
+        "pipeline": counters,
+        "historian": monitor.historian.counters() if monitor.historian is not None else None,
+    }
+
+
+# Print metrics that moved in the wrong direction by more than REGRESSION_TOLERANCE
+def compare(result, baseline):
+    regressions = 0
+    for name, higher_is_better in METRICS.items():
+        new, old = result.get(name), baseline.get(name)
+        if new is None or not old:
+            continue
+        change = (new - old) / old
+        worse = change < -REGRESSION_TOLERANCE if higher_is_better else change > REGRESSION_TOLERANCE
+        regressions += worse
+        print(f"{name:<34} {old:>12} -> {new:<12} ({change:+.1%}){'  REGRESSION' if worse else ''}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sensors", type=int, default=200, help="number of synthetic temperature nodes")
+    parser.add_argument("--update-ms", type=int, default=100, help="server value update period (ms)")
+    parser.add_argument("--scan-rate", type=int, default=100, help="scanRate of the generated sensors (ms)")
+    parser.add_argument("--period", type=float, default=20.0, help="waveform period (s)")
+    parser.add_argument("--noise", type=float, default=0.5, help="standard deviation of the noise added to the waveform")
+    parser.add_argument("--deadband", type=float, default=0.0, help="absolute deadband of the monitored items (monitoringSettings)")
+    parser.add_argument("--duration", type=float, default=20.0, help="measurement duration (s)")
+    parser.add_argument("--warmup", type=float, default=3.0, help="time before measuring (s)")
+    parser.add_argument("--historian", action="store_true", help="write the sample history (historianSettings.enabled)")
+    parser.add_argument("--workers", type=int, default=0, help="run the sensors in this many shard worker processes (shardingSettings)")
+    parser.add_argument("--port", type=int, default=0, help="server port (default: a free port)")
+    parser.add_argument("--output", help="write the results as a JSON baseline to this file")
+    parser.add_argument("--compare", help="compare the results with a JSON baseline")
+    args = parser.parse_args()
+
+    result = run(args)
+    print(json.dumps(result, indent=4))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=4)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        sys.exit(1 if compare(result, baseline) else 0)
+    os._exit(0)  # python-opcua client threads may linger after disconnect
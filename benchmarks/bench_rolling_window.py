@@ -0,0 +1,46 @@
+# Benchmark: per-sample cost of the rolling Min/Max/Avg statistics vs window size
+# Compares the previous list copy + min/max/mean approach with RollingWindow.
+
+import os
+import sys
+import random
+import time
+from collections import deque
+from statistics import mean
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from opcua_monitor import RollingWindow
+
+SAMPLES = 20000
+WINDOWS = (30, 300, 3000)  # 50 s scanRate, 1 s scanRate, 100 ms scanRate
+
+
+# Previous implementation: copy the deque and scan it on every sample
+def bench_list_copy(values, window):
+    buf = deque(maxlen=window)
+    start = time.perf_counter()
+    for v in values:
+        buf.append(v)
+        numeric_values = list(buf)
+        min(numeric_values), max(numeric_values), mean(numeric_values)
+    return (time.perf_counter() - start) / len(values)
+
+
+def bench_rolling(values, window):
+    buf = RollingWindow(window)
+    start = time.perf_counter()
+    for v in values:
+        buf.append(v)
+        buf.min(), buf.max(), buf.mean()
+    return (time.perf_counter() - start) / len(values)
+
+
+if __name__ == "__main__":
+    random.seed(1)
+    values = [35 + 10 * random.random() for _ in range(SAMPLES)]
+    print(f"{'window':>8} | {'list copy (us/sample)':>22} | {'rolling (us/sample)':>20}")
+    for window in WINDOWS:
+        # The list copy path is slow on big windows, so keep its sample count bounded
+        old = bench_list_copy(values[:2000], window)
+        new = bench_rolling(values, window)
+        print(f"{window:>8} | {old * 1e6:>22.2f} | {new * 1e6:>20.2f}")
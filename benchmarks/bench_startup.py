@@ -0,0 +1,66 @@
+# Benchmark: startup time and baseline memory of a fresh monitor process (what a service manager restart costs)
+#
+#   python3 benchmarks/bench_startup.py --sensors 1000 --runs 10
+#
+# Every run is a new interpreter that imports opcua_monitor, loads a generated configuration and, for "web",
+# creates the Flask/Socket.IO app. Reports the median import time, time to ready and RSS at ready, headless vs web.
+
+import os
+import sys
+import json
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+PROBE = """
+import sys, time, json
+t = time.perf_counter()
+sys.path.insert(0, {root!r})
+import opcua_monitor as monitor
+imported = time.perf_counter() - t
+monitor.config_path = {config!r}
+monitor.load_config_json()
+if {web!r}:
+    monitor.create_web_app()
+monitor.mark_ready()
+print(json.dumps({{"import_ms": imported * 1000, "ready_ms": monitor.metrics.startup_seconds * 1000,
+                  "rss_mb": monitor.resident_bytes() / 2**20, "flask_loaded": "flask" in sys.modules}}))
+"""
+
+
+def write_config(directory, count):
+    sensors = [{"nodeId": f"ns=2;s=Temperature_{i}", "name": f"Temperature_{i}", "unit": "°C", "scanRate": 1000,
+                "alarms": {"high_high": 90, "high": 80, "low": 10, "low_low": 5}} for i in range(count)]
+    path = os.path.join(directory, "config.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"sensors": sensors, "logSettings": {"quiet": True}}, f)
+    return path
+
+
+def measure(config, web, runs):
+    code = PROBE.format(root=os.path.abspath(ROOT), config=config, web=web)
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+        samples.append(json.loads(out.strip().splitlines()[-1]))
+    return {
+        "import_ms": round(statistics.median(s["import_ms"] for s in samples), 1),
+        "ready_ms": round(statistics.median(s["ready_ms"] for s in samples), 1),
+        "rss_mb": round(statistics.median(s["rss_mb"] for s in samples), 1),
+        "flask_loaded": samples[-1]["flask_loaded"],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sensors", type=int, default=100, help="sensors in the generated configuration")
+    parser.add_argument("--runs", type=int, default=7, help="processes started per variant (the median is reported)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="opcua_bench_") as workdir:
+        config = write_config(workdir, args.sensors)
+        result = {"sensors": args.sensors, "headless": measure(config, False, args.runs), "web": measure(config, True, args.runs)}
+    print(json.dumps(result, indent=4))
@@ -1,53 +1,214 @@
                                                                  # OPC UA Sensor Monitoring with interactive menu
                                                                 # Prosys OPC UA Simulation Server (Free Version)
 
-from opcua import Client
-from opcua import ua
-from datetime import datetime, timezone
-from collections import deque
-from statistics import mean
-from opcua import Client, ua
-from flask import Flask, render_template
-from flask_socketio import SocketIO
 import time
+STARTED = time.perf_counter()  # startup time is measured from here (the interpreter itself is not included)
+
+from datetime import datetime, timezone, timedelta
+from collections import deque, OrderedDict
+from opcua import Client, ua
+from opcua.ua.ua_binary import struct_from_binary
 import json
-import csv
 import math
 import os
 import threading
-import keyboard
+import logging
+import logging.handlers
+import queue
+import sys
+import atexit
+import argparse
+import types
+import random
+import signal
+import contextlib
+import struct
+import heapq
+import itertools
+import importlib
+import asyncio
+from array import array
+from bisect import bisect_left
+from operator import itemgetter
+
+try:
+    import fcntl  # alarm journal lock files
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+# Imported on first use, so a headless run does not load the web stack and restarts stay fast:
+# Flask and Flask-SocketIO (create_web_app), pyarrow (Parquet export), asyncua, uvicorn, asgiref and
+# python-socketio (asyncio engine), NumPy (load_numpy). The standard modules used only by the export, the
+# historian, sharding and the web access checks (csv, gzip, zipfile, tempfile, shutil, mmap, hashlib,
+# multiprocessing, hmac, ipaddress) are imported where they are used.
+pa = pq = None
+asyncua = None
+app = socketio = None
+request = render_template = join_room = leave_room = None
+np = None            # optional: batch alarm evaluation, sample window views, NPZ export, history reads
+numpy_missing = False
+
+def optional_import(name):
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        return None
+
+# NumPy, imported on first use; None when it is not installed
+def load_numpy():
+    global np, numpy_missing, SAMPLE_DTYPE, ROLLUP_DTYPE
+    if np is None and not numpy_missing:
+        module = optional_import("numpy")
+        if module is None:
+            numpy_missing = True
+            return None
+        SAMPLE_DTYPE = module.dtype({"names": ["t", "v", "q"], "formats": ["<i8", "<f8", "<u4"], "offsets": [0, 8, 16], "itemsize": 24})
+        ROLLUP_DTYPE = module.dtype({"names": ["t", "min", "max", "avg", "count"], "formats": ["<i8", "<f8", "<f8", "<f8", "<u4"],
+                                     "offsets": [0, 8, 16, 24, 32], "itemsize": 40})
+        np = module
+    return np
+
+# Flask routes and Socket.IO handlers, registered on the app by create_web_app
+web_routes = []       # (rule, options, view)
+socket_handlers = []  # (event, handler)
+
+def route(rule, **options):
+    def register(view):
+        web_routes.append((rule, options, view))
+        return view
+    return register
+
+def on_socket(event):
+    def register(handler):
+        socket_handlers.append((event, handler))
+        return handler
+    return register
 
 # Flask & SocketIO setup
-app = Flask(__name__)
-socketio = SocketIO(app, cors_allowed_origins="*", async_mode="threading")
+def create_web_app():
+    global app, socketio, request, render_template, join_room, leave_room
+    if app is None:
+        import flask
+        import flask_socketio
+        request, render_template = flask.request, flask.render_template
+        join_room, leave_room = flask_socketio.join_room, flask_socketio.leave_room
+        web = flask.Flask(__name__)
+        for rule, options, view in web_routes:
+            web.add_url_rule(rule, view_func=view, **options)
+        socketio = flask_socketio.SocketIO(web, cors_allowed_origins="*", async_mode="threading")
+        for event, handler in socket_handlers:
+            socketio.on_event(event, handler)
+        app = web
+    return app
+
+# True for loopback addresses and "localhost", which only clients on this machine can reach
+def is_loopback(host):
+    import ipaddress
+    if host == "localhost":
+        return True
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    if address.version == 6 and address.ipv4_mapped is not None:
+        address = address.ipv4_mapped
+    return address.is_loopback
+
+# A web server reachable from other machines needs webSettings.apiToken for its state-changing routes; prints why not
+def web_host_allowed(host):
+    if is_loopback(host) or web_settings["api_token"]:
+        return True
+    print(f"{iso(datetime.now(timezone.utc))} | Refusing to serve on {host}: set webSettings.apiToken in the configuration "
+          f"to accept profiling and acknowledgement requests from other machines, or use a loopback --host.")
+    return False
+
+# Routes that change state (profiling, acknowledgements) require "Authorization: Bearer <webSettings.apiToken>" when a
+# token is configured, otherwise a client on this machine. None when the request may proceed, else the error response.
+def write_access_error():
+    import hmac
+    token = web_settings["api_token"]
+    if token:
+        if hmac.compare_digest(request.headers.get("Authorization", "").encode(), f"Bearer {token}".encode()):
+            return None
+        return error_json(401, "this request needs an 'Authorization: Bearer <apiToken>' header")
+    if is_loopback(request.remote_addr or ""):
+        return None
+    return error_json(403, "this request is only accepted from this machine (no webSettings.apiToken is set)")
+
+def start_web_server(host, port):
+    create_web_app()
+    threading.Thread(target=lambda: socketio.run(app, host=host, port=port, allow_unsafe_werkzeug=True), daemon=True).start()
 
-@app.route("/")
+@route("/")
 def index():
     return render_template("index.html")
 
 # OPC UA Configuration
 ENDPOINT = "opc.tcp://localhost:53530/OPCUA/SimulationServer"
+WEB_HOST = "127.0.0.1" # dashboard and History API (--host/--port)
+WEB_PORT = 5000
 MAX_RETRIES = 20
 RETRY_DELAY = 3 # s
 MIN_SCANRATE = 100 # ms
 MAX_SCANRATE = 10000 # ms
+JOURNAL_FLUSH_INTERVAL = 1.0 # s
+JOURNAL_BATCH_SIZE = 100 # records
+SNAPSHOT_INTERVAL = 60 # s
+MAX_ITEMS_PER_CALL = 1000 # monitored items per CreateMonitoredItems request
+DEFAULT_MAX_NODES_PER_READ = 1000 # used when the server does not report its limit
+HEARTBEAT_NODE = "i=1008"
+OVERFLOW_POLICIES = ("block", "drop_oldest", "coalesce")
+DEADBAND_TYPES = ("none", "absolute", "percent") # DataChangeFilter of the monitored items
+PIPELINE_BATCH_SIZE = 256 # samples taken from the queue per worker iteration
+TREND_MIN_SAMPLES = 3 # samples in the window before a slope is computed
+PROFILE_INTERVAL = 0.005 # s between two stack samples while profiling
+EXPORT_CHUNK = 5000 # alarms copied from the history per lock acquisition during an export
+MIN_WINDOW_SAMPLES = 2 # shortest sample window left by the memory budget
+WINDOW_SLACK = 0.25 # extra room of the sample window arrays, as a fraction of the window length
     
 # Global flag
 stop_monitoring = False
 exit_program = False
 
 # Global variables
+config_path = "./config.json"
+config_mtime = None # modification time of the loaded configuration file
+loaded_config = {} # settings and sensors of the running configuration (sent to shard workers)
 sensors = []
 alarm_settings = {}
 buffers = {}
 states = {}
-alarm_history = {}
 TIME_DELAY = 0
 file_path = ""
 DECIMALS =2
 last_values = {}
 prev_values = {}
-trend_settings = {"rise_rate": 1.0, "fall_rate": -1.0}
+runtime = {} # ua.NodeId -> SensorRuntime
+runtime_by_name = {}
+trend_settings = {"rise_rate": 1.0, "fall_rate": -1.0, "window": 30.0, "smoothing": 0.3, "hysteresis": 0.5}
+alarm_journal = None
+config_revision = 0 # bumped by every configuration load
+alarm_revision = 0  # bumped by every alarm event
+alarm_modified = None
+pipeline = None
+pipeline_settings = {"queue_size": 10000, "overflow_policy": "drop_oldest", "batch_alarms": False}
+dashboard_settings = {"frame_rate": 10.0, "compact": False}
+web_settings = {"api_token": ""}
+historian = None
+historian_settings = {"enabled": False, "directory": "./history", "flush_interval": 5.0}
+reload_settings = {"watch": False, "interval": 2.0}
+connection_settings = {"health_interval": 1.0, "keepalive": 5.0, "lifetime": 120.0, "backoff_initial": 0.5, "backoff_max": 30.0}
+buffer_settings = {"window": 300.0, "memory_budget": 256.0} # s, MB (0: no budget)
+monitoring_settings = {"deadband_type": "none", "deadband_value": 0.0, "sampling_interval": 0.0, "queue_size": 1, "discard_oldest": True}
+supervisor = None
+sharding_settings = {"enabled": False, "max_sensors_per_worker": 5000, "batch_interval": 0.05}
+outbox = None # shard worker: samples and alarm events go to the coordinator process
+log_settings = {"level": "INFO", "format": "text", "file": None, "status_interval": 0.0, "quiet": False}
+logger = logging.getLogger("opcua_monitor")
+log_listener = None
+ALARM_FIELDS = ["timestamp", "sensor", "nodeId", "type", "priority", "value", "threshold", "duration", "active", "acknowledged"]
+TREND_FIELDS = ["timestamp", "sensor", "nodeId", "type", "value", "slope", "duration", "active"]
 
 
         # === Utility functions ===
@@ -76,14 +237,995 @@ def fmt_num(x):
     except Exception:
         return str(x)
 
-# Function to have the alarm history in a new JSON file
+# Write a JSON file atomically: a temporary file in the same directory, renamed over the target
+def write_json_atomic(path, data):
+    if not path:
+        raise ValueError("no file name given")
+    import tempfile
+    with tempfile.NamedTemporaryFile("w", dir=os.path.dirname(path) or ".", prefix=os.path.basename(path) + ".",
+                                     suffix=".tmp", delete=False) as f:
+        try:
+            json.dump(data, f, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        except BaseException:
+            f.close()
+            os.remove(f.name)
+            raise
+    try:
+        os.replace(f.name, path)
+    except BaseException:
+        os.remove(f.name)
+        raise
+
+# Function to have the alarm history in a new JSON file (nothing to do before a monitoring run named it)
 def write_alarm_history():
-    global alarm_history, file_path
+    if not file_path:
+        return
+    started = time.perf_counter()
     try:
-        with open(file_path, "w") as f:
-            json.dump(alarm_history, f, indent=4)
+        write_json_atomic(file_path, alarm_history)
     except Exception as e:
-        print(f"iso(datetime.now(timezone.utc))Failed to write alarm history: {e}")
+        metrics.history_write_errors["snapshot"] += 1
+        print(f"{iso(datetime.now(timezone.utc))} | Failed to write alarm history: {e}")
+    metrics.history_write["snapshot"].observe(time.perf_counter() - started)
+
+
+        # === Metrics ===
+
+LATENCY_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5) # s
+RECONNECT_BUCKETS = (0.5, 1, 2.5, 5, 10, 30, 60, 120, 300) # s
+
+# Fixed-bucket histogram. Each one is written by a single thread (or the event loop), so observe() takes no lock;
+# a scrape may see a sample in count but not yet in sum, which Prometheus tolerates.
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last: above the largest bucket
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    # Prometheus text lines (cumulative buckets)
+    def lines(self, name, labels=""):
+        sep = "," if labels else ""
+        out = []
+        total = 0
+        for bound, n in zip(self.buckets, self.counts):
+            total += n
+            out.append(f'{name}_bucket{{{labels}{sep}le="{bound}"}} {total}')
+        out.append(f'{name}_bucket{{{labels}{sep}le="+Inf"}} {self.count}')
+        braces = f"{{{labels}}}" if labels else ""
+        out.append(f"{name}_sum{braces} {self.sum:.9g}")
+        out.append(f"{name}_count{braces} {self.count}")
+        return out
+
+# Hot path timings; counts and occupancy that the monitor already keeps are read at scrape time
+class Metrics:
+    def __init__(self):
+        self.notification_seconds = Histogram()
+        self.check_levels = {"sample": Histogram(), "batch": Histogram()}
+        self.history_write = {"snapshot": Histogram(), "journal": Histogram(), "compact": Histogram()}
+        self.history_write_errors = {"snapshot": 0, "journal": 0, "compact": 0}
+        self.emit = {}  # Socket.IO event -> Histogram
+        self.reconnects = 0
+        self.reconnect_seconds = Histogram(RECONNECT_BUCKETS)
+        self.startup_seconds = None  # module load -> ready (configuration loaded, web server started)
+
+    def emit_histogram(self, event):
+        histogram = self.emit.get(event)
+        if histogram is None:
+            histogram = self.emit.setdefault(event, Histogram())
+        return histogram
+
+metrics = Metrics()
+
+def mark_ready():
+    metrics.startup_seconds = time.perf_counter() - STARTED
+
+# Resident memory of this process in bytes (the peak where /proc is not available)
+def resident_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+def label_value(text):
+    return str(text).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+# Prometheus text exposition format 0.0.4
+def render_metrics():
+    out = []
+
+    def family(name, kind, help_text):
+        out.append(f"# HELP {name} {help_text}")
+        out.append(f"# TYPE {name} {kind}")
+
+    rts = list(runtime.values())
+    family("opcua_notifications_total", "counter", "Data change notifications received per sensor.")
+    out.extend(f'opcua_notifications_total{{sensor="{label_value(rt.name)}"}} {rt.notifications}' for rt in rts)
+    family("opcua_buffer_samples", "gauge", "Samples in the rolling window of a sensor.")
+    out.extend(f'opcua_buffer_samples{{sensor="{label_value(rt.name)}"}} {len(rt.buffer)}' for rt in rts)
+    family("opcua_buffer_capacity", "gauge", "Rolling window length of a sensor.")
+    out.extend(f'opcua_buffer_capacity{{sensor="{label_value(rt.name)}"}} {rt.buffer.maxlen}' for rt in rts)
+    family("opcua_buffer_bytes", "gauge", "Memory allocated by the rolling windows of all sensors.")
+    out.append(f"opcua_buffer_bytes {sum(RollingWindow.nbytes(rt.buffer.maxlen) for rt in rts)}")
+    family("opcua_buffer_budget_bytes", "gauge", "bufferSettings.memoryBudget (0: no budget).")
+    out.append(f"opcua_buffer_budget_bytes {int(buffer_settings['memory_budget'] * 2**20)}")
+
+    family("opcua_datachange_notification_seconds", "histogram", "Time spent in the subscription handler per notification.")
+    out.extend(metrics.notification_seconds.lines("opcua_datachange_notification_seconds"))
+    family("opcua_check_levels_seconds", "histogram", "Alarm level evaluation time, per sample or per NumPy batch.")
+    for mode, histogram in metrics.check_levels.items():
+        out.extend(histogram.lines("opcua_check_levels_seconds", f'mode="{mode}"'))
+    family("opcua_alarm_history_write_seconds", "histogram", "Alarm history writes: JSON snapshot, journal flush (fsync) and compaction.")
+    for op, histogram in metrics.history_write.items():
+        out.extend(histogram.lines("opcua_alarm_history_write_seconds", f'op="{op}"'))
+    family("opcua_alarm_history_write_errors_total", "counter", "Failed alarm history writes; journal records are kept for the next attempt.")
+    out.extend(f'opcua_alarm_history_write_errors_total{{op="{op}"}} {n}' for op, n in metrics.history_write_errors.items())
+    family("opcua_socketio_emit_seconds", "histogram", "Socket.IO emit duration per event.")
+    for event, histogram in list(metrics.emit.items()):
+        out.extend(histogram.lines("opcua_socketio_emit_seconds", f'event="{label_value(event)}"'))
+    family("opcua_reconnects_total", "counter", "Connection losses that started a reconnect.")
+    out.append(f"opcua_reconnects_total {metrics.reconnects}")
+    family("opcua_reconnect_seconds", "histogram", "Time from the last healthy check to restored subscriptions.")
+    out.extend(metrics.reconnect_seconds.lines("opcua_reconnect_seconds"))
+
+    running = pipeline
+    if running is not None:
+        counters = running.counters()
+        family("opcua_queue_depth", "gauge", "Samples waiting in the ingest queue.")
+        out.append(f"opcua_queue_depth {counters['queue_depth']}")
+        family("opcua_samples_processed_total", "counter", "Samples processed by the ingest pipeline.")
+        out.append(f"opcua_samples_processed_total {counters['processed']}")
+        family("opcua_samples_dropped_total", "counter", "Samples dropped or coalesced on a full ingest queue.")
+        out.append(f'opcua_samples_dropped_total{{reason="dropped"}} {counters["dropped"]}')
+        out.append(f'opcua_samples_dropped_total{{reason="coalesced"}} {counters["coalesced"]}')
+    family("opcua_active_alarms", "gauge", "Active alarms.")
+    out.append(f"opcua_active_alarms {alarm_history.get('statistics', {}).get('active_alarms', 0)}")
+    family("opcua_dashboard_frames_total", "counter", "Dashboard update frames sent.")
+    out.append(f"opcua_dashboard_frames_total {dashboard.frames}")
+    if metrics.startup_seconds is not None:
+        family("opcua_startup_seconds", "gauge", "Time from module load to ready (configuration loaded, web server started).")
+        out.append(f"opcua_startup_seconds {metrics.startup_seconds:.6f}")
+    family("process_resident_memory_bytes", "gauge", "Resident memory size in bytes.")
+    out.append(f"process_resident_memory_bytes {resident_bytes()}")
+    return "\n".join(out) + "\n"
+
+@route("/metrics")
+def api_metrics():
+    return render_metrics(), 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+
+# Sampling profiler: a thread records the stacks of all other threads every PROFILE_INTERVAL and writes them in the
+# collapsed format of flame graph tools ("thread;outer;...;inner count"). Nothing runs while it is off.
+class StackSampler:
+    def __init__(self, interval=PROFILE_INTERVAL):
+        self.interval = interval
+        self.path = None
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    # Profile for the given seconds, then write path; False when a profile is already running
+    def start(self, seconds, path):
+        if self.running:
+            return False
+        self.path = path
+        self.samples = 0
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(time.monotonic() + seconds,), name="stack-sampler", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        self._stop.set()
+        if self.running:
+            self._thread.join()
+
+    def _run(self, deadline):
+        me = threading.get_ident()
+        stacks = {}
+        names = {}
+        while not self._stop.wait(self.interval) and time.monotonic() < deadline:
+            frames = sys._current_frames()
+            if frames.keys() - names.keys():
+                names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in frames.items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                key = ";".join(reversed(stack))
+                stacks[key] = stacks.get(key, 0) + 1
+            self.samples += 1
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "w", encoding="utf-8") as f:
+                for key, n in sorted(stacks.items(), key=lambda item: -item[1]):
+                    f.write(f"{key} {n}\n")
+            print(f"{iso(datetime.now(timezone.utc))} | Profile of {self.samples} samples written to {self.path}.")
+        except Exception as e:
+            print(f"{iso(datetime.now(timezone.utc))} | Failed to write profile: {e}")
+
+profiler = StackSampler()
+
+def start_profile(seconds):
+    timestamp_str = datetime.now().strftime("%Y%m%d_%H%M%S")
+    path = os.path.expanduser(f"~/Downloads/profile_{timestamp_str}.folded")
+    return path if profiler.start(seconds, path) else None
+
+# POST starts a profile (?seconds=, default 30), DELETE stops it early and writes the file
+@route("/api/profile", methods=["GET", "POST", "DELETE"])
+def api_profile():
+    if request.method != "GET":
+        denied = write_access_error()
+        if denied is not None:
+            return denied
+    if request.method == "POST":
+        try:
+            seconds = float(request.args.get("seconds", 30))
+        except ValueError:
+            return {"error": "seconds must be a number"}, 400
+        if not 0 < seconds <= 3600:
+            return {"error": "seconds must be between 0 and 3600"}, 400
+        path = start_profile(seconds)
+        if path is None:
+            return {"error": "a profile is already running", "path": profiler.path}, 409
+        return {"running": True, "seconds": seconds, "path": path}, 202
+    if request.method == "DELETE":
+        profiler.stop()
+    return {"running": profiler.running, "path": profiler.path, "samples": profiler.samples}
+
+
+        # === Logging ===
+
+# Structured fields copied into JSON-lines records when passed as `extra`
+LOG_FIELDS = ("sensor", "value", "min", "max", "avg", "samples", "event", "alarm", "trend")
+
+# "<ISO timestamp> | <message>" lines, like the console output
+class TextFormatter(logging.Formatter):
+    def format(self, record):
+        ts = iso(datetime.fromtimestamp(record.created, timezone.utc))
+        return f"{ts} | {record.getMessage()}"
+
+# One JSON object per line
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "timestamp": iso(datetime.fromtimestamp(record.created, timezone.utc)),
+            "level": record.levelname,
+            "message": record.getMessage(),
+        }
+        for field in LOG_FIELDS:
+            if field in record.__dict__:
+                entry[field] = record.__dict__[field]
+        return json.dumps(entry, default=str)
+
+# Hands the record to the queue untouched, so message formatting happens on the writer thread
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        return record
+
+# (Re)configure the logger: queue in the calling thread, formatting and I/O on a background listener
+def setup_logging():
+    global log_listener
+    shutdown_logging()
+    level = getattr(logging, str(log_settings["level"]).upper(), logging.INFO)
+    logger.setLevel(max(level, logging.WARNING) if log_settings["quiet"] else level)
+    logger.propagate = False
+    for h in list(logger.handlers):
+        logger.removeHandler(h)
+
+    if log_settings["file"]:
+        target = logging.FileHandler(log_settings["file"], encoding="utf-8")
+    else:
+        target = logging.StreamHandler(sys.stdout)
+    target.setFormatter(JsonFormatter() if log_settings["format"] == "json" else TextFormatter())
+
+    log_queue = queue.SimpleQueue()
+    logger.addHandler(DeferredQueueHandler(log_queue))
+    log_listener = logging.handlers.QueueListener(log_queue, target)
+    log_listener.start()
+
+# Flush queued records and stop the writer thread
+def shutdown_logging():
+    global log_listener
+    if log_listener is not None:
+        log_listener.stop()
+        for h in log_listener.handlers:
+            h.close()
+        log_listener = None
+
+atexit.register(shutdown_logging)
+
+
+        # === Alarm journal ===
+
+# Empty alarm history structure
+def new_alarm_history():
+    return {
+        "alarms": [],
+        "trends": [],
+        "statistics": {"total_alarms": 0, "active_alarms": 0, "unacknowledged_alarms": 0, "by_type": {"HH":0,"H":0,"L":0,"LL":0}}
+    }
+
+# Alarm history with indexes. The dict itself is the JSON document (alarms, trends, statistics) and is written as is;
+# the indexes and statistics are rebuilt on load and then maintained by apply(), so no event scans the alarm list.
+class AlarmHistory(dict):
+    def __init__(self, data=None):
+        super().__init__(new_alarm_history() if data is None else data)
+        self.lock = threading.Lock()  # apply() vs. queries from the API threads
+        self.reindex()
+
+    def reindex(self):
+        alarms = self.setdefault("alarms", [])
+        self.active = {}          # (sensor, level) -> indexes of its active alarms, oldest first
+        self.unacknowledged = {}  # index -> None, in index order
+        self.by_sensor = {}       # sensor -> indexes
+        self.active_trends = {}   # sensor -> index of its active trend
+        by_type = {"HH": 0, "H": 0, "L": 0, "LL": 0}
+        for i, alarm in enumerate(alarms):
+            self.by_sensor.setdefault(alarm["sensor"], []).append(i)
+            by_type[alarm["type"]] = by_type.get(alarm["type"], 0) + 1
+            if alarm["active"]:
+                self.active.setdefault((alarm["sensor"], alarm["type"]), []).append(i)
+            if not alarm["acknowledged"]:
+                self.unacknowledged[i] = None
+        for i, trend in enumerate(self.setdefault("trends", [])):
+            if trend["active"]:
+                self.active_trends[trend["sensor"]] = i
+        self["statistics"] = {
+            "total_alarms": len(alarms),
+            "active_alarms": sum(len(indexes) for indexes in self.active.values()),
+            "unacknowledged_alarms": len(self.unacknowledged),
+            "by_type": by_type,
+        }
+
+    def reset(self):
+        with self.lock:
+            self.clear()
+            self.update(new_alarm_history())
+            self.reindex()
+
+    # Apply one journal record (ALARM_ACTIVE, ALARM_CLEAR, ACK, TREND_START or TREND_END)
+    def apply(self, record):
+        event = record["event"]
+        with self.lock:
+            stats = self["statistics"]
+            if event == "ALARM_ACTIVE":
+                i = len(self["alarms"])
+                self["alarms"].append({k: record[k] for k in ALARM_FIELDS})
+                self.by_sensor.setdefault(record["sensor"], []).append(i)
+                self.active.setdefault((record["sensor"], record["type"]), []).append(i)
+                self.unacknowledged[i] = None
+                stats["total_alarms"] += 1
+                stats["active_alarms"] += 1
+                stats["unacknowledged_alarms"] += 1
+                stats["by_type"][record["type"]] += 1
+            elif event == "ALARM_CLEAR":
+                # The latest active alarm of the level clears (a level that stays active repeats ALARM_ACTIVE)
+                key = (record["sensor"], record["type"])
+                indexes = self.active.get(key)
+                if indexes:
+                    alarm = self["alarms"][indexes.pop()]
+                    if not indexes:
+                        del self.active[key]
+                    alarm["active"] = False
+                    alarm["duration"] = record["duration"]
+                    stats["active_alarms"] -= 1
+            elif event == "ACK":
+                i = record["index"]
+                self["alarms"][i]["acknowledged"] = True
+                if i in self.unacknowledged:
+                    del self.unacknowledged[i]
+                    stats["unacknowledged_alarms"] -= 1
+            elif event == "TREND_START":
+                self.active_trends[record["sensor"]] = len(self["trends"])
+                self["trends"].append({k: record[k] for k in TREND_FIELDS})
+            elif event == "TREND_END":
+                i = self.active_trends.pop(record["sensor"], None)
+                if i is not None:
+                    self["trends"][i]["active"] = False
+                    self["trends"][i]["duration"] = record["duration"]
+
+    # Indexes of the alarms matching the filters, newest first: (number of matches, indexes[offset:offset + limit]).
+    # The active and unacknowledged indexes narrow the candidates before the filters are checked.
+    def query(self, sensor=None, level=None, active=None, acknowledged=None, offset=0, limit=None):
+        with self.lock:
+            alarms = self["alarms"]
+            if active:
+                candidates = sorted(i for (name, lvl), indexes in self.active.items()
+                                    if (sensor is None or name == sensor) and (level is None or lvl == level) for i in indexes)
+            elif acknowledged is False:
+                candidates = list(self.unacknowledged)
+            elif sensor is not None:
+                candidates = self.by_sensor.get(sensor, [])
+            else:
+                candidates = range(len(alarms))
+            if sensor is not None or level is not None or active is not None or acknowledged is not None:
+                candidates = [i for i in candidates
+                              if (sensor is None or alarms[i]["sensor"] == sensor) and (level is None or alarms[i]["type"] == level)
+                              and (active is None or alarms[i]["active"] == active)
+                              and (acknowledged is None or alarms[i]["acknowledged"] == acknowledged)]
+            total = len(candidates)
+            end = total if limit is None else min(total, offset + limit)
+            return total, [candidates[total - 1 - k] for k in range(offset, end)]
+
+    # sensor -> set of its active alarm levels
+    def active_levels(self):
+        with self.lock:
+            levels = {}
+            for sensor, level in self.active:
+                levels.setdefault(sensor, set()).add(level)
+            return levels
+
+alarm_history = AlarmHistory()
+
+# Alarm history file of a new run; the process id keeps runs started in the same second apart
+def new_history_path(prefix="alarm_history"):
+    timestamp_str = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return os.path.expanduser(f"~/Downloads/{prefix}_{timestamp_str}_{os.getpid()}.json")
+
+# Exclusive lock on an open file without waiting (fcntl.flock, msvcrt.locking on Windows). The lock goes away with
+# the process, so a journal whose lock can be taken has no running owner. False when another process holds it.
+def try_lock(f):
+    try:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+# Append-only JSONL journal of alarm events, flushed in batches and compacted into the JSON snapshot. The journal's
+# .lock file stays locked while it is open, so recover_alarm_journals leaves it alone.
+class AlarmJournal:
+    def __init__(self, snapshot_path, history, background=True):
+        self.snapshot_path = snapshot_path
+        self.path = os.path.splitext(snapshot_path)[0] + ".jsonl"
+        self.lock_path = os.path.splitext(snapshot_path)[0] + ".lock"
+        self.history = history
+        self.seq = history.get("journal_seq", 0)
+        self._pending = []
+        self._lock = threading.Lock()     # history, seq and pending records
+        self._io_lock = threading.Lock()  # journal file (taken before _lock)
+        self._wakeup = threading.Event()
+        self._closed = False
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._lock_file = open(self.lock_path, "a+")
+        if not try_lock(self._lock_file):
+            self._lock_file.close()
+            raise RuntimeError(f"alarm journal {self.path} is in use by another process")
+        self._lock_file.write(f"{os.getpid()}\n")
+        self._lock_file.flush()
+        if history["alarms"] or history["trends"]:
+            write_json_atomic(snapshot_path, history)  # compact() builds on the last snapshot
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._last_snapshot = time.monotonic()
+        self._thread = None
+        if background:  # otherwise the owner calls maintain() periodically
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    # Apply a record to the in-memory history and queue it for the journal
+    def record(self, record):
+        with self._lock:
+            self.seq += 1
+            record["seq"] = self.seq
+            self.history.apply(record)
+            self._pending.append(json.dumps(record))
+            if len(self._pending) >= JOURNAL_BATCH_SIZE:
+                self._wakeup.set()
+
+    # Write queued records and fsync them in one batch
+    def flush(self):
+        with self._io_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            self._write(batch)
+
+    # A batch that cannot be written goes back to the front of the queue; replay skips records written twice
+    def _write(self, batch):
+        if not batch:
+            return
+        started = time.perf_counter()
+        try:
+            if self._file.closed:
+                raise ValueError(f"journal {self.path} is closed")
+            self._file.write("\n".join(batch) + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        except Exception:
+            with self._lock:
+                self._pending[:0] = batch
+            raise
+        metrics.history_write["journal"].observe(time.perf_counter() - started)
+
+    # Records recorded but not yet in the journal file
+    def pending(self):
+        with self._lock:
+            return len(self._pending)
+
+    # Rotate the journal and write a snapshot: the last snapshot with the journal records replayed on top, so record()
+    # is not held up while the history is copied. The journal is reopened even when the rotation fails, and a rotated
+    # journal whose snapshot failed is kept (not rotated over, both are replayed) until a snapshot succeeds.
+    def compact(self):
+        rotated = self.path + ".1"
+        started = time.perf_counter()
+        with self._io_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            self._write(batch)
+            journals = (rotated, self.path)
+            if not os.path.exists(rotated):
+                self._file.close()
+                try:
+                    os.replace(self.path, rotated)
+                    journals = (rotated,)
+                finally:
+                    if not self._closed:
+                        self._file = open(self.path, "a", encoding="utf-8")
+            snapshot = replay_alarm_journal(self.snapshot_path, journals)
+        write_json_atomic(self.snapshot_path, snapshot)
+        os.remove(rotated)
+        metrics.history_write["compact"].observe(time.perf_counter() - started)
+
+    # Periodic work: a snapshot every SNAPSHOT_INTERVAL, otherwise a journal flush
+    def maintain(self):
+        op = "journal"
+        try:
+            if time.monotonic() - self._last_snapshot >= SNAPSHOT_INTERVAL:
+                op = "compact"
+                self.compact()
+                self._last_snapshot = time.monotonic()
+            else:
+                self.flush()
+        except Exception as e:
+            metrics.history_write_errors[op] += 1
+            logger.error("Failed to write alarm journal %s (%d records pending, retried): %s", self.path, self.pending(), e)
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(JOURNAL_FLUSH_INTERVAL)
+            self._wakeup.clear()
+            self.maintain()
+
+    # Final compaction; the journal is not reopened, so only the snapshot remains
+    def close(self):
+        self._closed = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+        try:
+            self.compact()
+        finally:
+            self._file.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)  # not rotated by the compaction, and all its records are in the snapshot
+        os.remove(self.lock_path)
+        self._lock_file.close()
+
+# Rebuild an alarm history from its snapshot and journal files (default: the rotated and the current journal)
+def replay_alarm_journal(snapshot_path, journals=None):
+    history = AlarmHistory()
+    if os.path.exists(snapshot_path):
+        with open(snapshot_path, "r") as f:
+            history = AlarmHistory(json.load(f))
+    seq = history.get("journal_seq", 0)
+    if journals is None:
+        journal_path = os.path.splitext(snapshot_path)[0] + ".jsonl"
+        journals = (journal_path + ".1", journal_path)
+    for path in journals:
+        if not os.path.exists(path):
+            continue
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    break  # torn write at the end of the journal
+                if record["seq"] > seq:
+                    history.apply(record)
+                    seq = record["seq"]
+    history["journal_seq"] = seq
+    return history
+
+# Compact journals left behind by a crashed run into their JSON snapshots. Journals whose lock is held belong to a
+# running instance and are skipped; the lock is kept while a journal is recovered.
+def recover_alarm_journals(directory):
+    if not os.path.isdir(directory):
+        return
+    bases = set()
+    for name in os.listdir(directory):
+        if name.startswith("alarm_history_") and (name.endswith(".jsonl") or name.endswith(".jsonl.1")):
+            bases.add(os.path.join(directory, name[:name.index(".jsonl")]))
+    for base in sorted(bases):
+        snapshot_path = base + ".json"
+        try:
+            with open(base + ".lock", "a+") as lock:
+                if not try_lock(lock):
+                    continue  # journal of a running instance
+                history = replay_alarm_journal(snapshot_path)
+                write_json_atomic(snapshot_path, history)
+                for path in (base + ".jsonl.1", base + ".jsonl", base + ".lock"):
+                    if os.path.exists(path):
+                        os.remove(path)
+            print(f"{iso(datetime.now(timezone.utc))} | Recovered alarm history from journal into {snapshot_path}.")
+        except Exception as e:
+            print(f"{iso(datetime.now(timezone.utc))} | Failed to recover alarm journal {base}.jsonl: {e}")
+
+# Record an alarm event through the journal, or rewrite the JSON history when no run is active
+def record_alarm_event(record):
+    record_alarm_events([record])
+
+# Several events at once: without a journal the JSON history is rewritten once for all of them
+def record_alarm_events(records):
+    global alarm_revision, alarm_modified
+    if outbox is not None:
+        for record in records:
+            outbox.alarm(record)  # shard worker: the coordinator keeps the alarm history
+        return
+    if alarm_journal is not None:
+        for record in records:
+            alarm_journal.record(record)
+    else:
+        for record in records:
+            alarm_history.apply(record)
+        write_alarm_history()
+    alarm_modified = datetime.now(timezone.utc)
+    alarm_revision += 1
+
+
+        # === Rolling statistics ===
+
+# Fixed-size sample window with O(1) amortized Min/Max/Avg (running sum + monotonic queues)
+# Samples live in preallocated typed arrays (int64 timestamp, float64 value) with WINDOW_SLACK extra room: the window
+# is always one contiguous slice, which arrays() returns as zero-copy NumPy views. When the end of the arrays is
+# reached the window is moved back to the start, a C-level copy once per maxlen / WINDOW_SLACK samples. The monotonic
+# queues are rings of slot indices, so a full window costs 1.25 * 16 + 2 * 4 bytes per sample at most.
+class RollingWindow:
+    __slots__ = ("maxlen", "capacity", "_values", "_times", "_count", "_end", "_seq", "_min", "_min_head", "_min_len",
+                 "_max", "_max_head", "_max_len", "_sum", "_since_resum", "appended", "trend")
+
+    def __init__(self, maxlen):
+        self.maxlen = maxlen
+        self.capacity = self.slots(maxlen)
+        index_type = "H" if self.capacity <= 0x10000 else "I"
+        self._min = array(index_type, [0]) * maxlen  # slot indices, increasing values
+        self._max = array(index_type, [0]) * maxlen  # slot indices, decreasing values
+        self.trend = None  # TrendWindow reading this window
+        self.clear()
+
+    @staticmethod
+    def slots(maxlen):
+        return maxlen + max(1, int(maxlen * WINDOW_SLACK))
+
+    # Bytes allocated by a window of maxlen samples (bufferSettings.memoryBudget)
+    @staticmethod
+    def nbytes(maxlen):
+        capacity = RollingWindow.slots(maxlen)
+        return capacity * 16 + 2 * maxlen * (2 if capacity <= 0x10000 else 4)
+
+    # t: sample time in microseconds since the epoch (see to_us)
+    def append(self, value, t=0):
+        self._seq += 1  # odd while the window changes (see snapshot)
+        n = self.maxlen
+        values = self._values
+        if self._count == n:
+            # The oldest sample leaves the window, and the trend sums if it is the oldest one in them
+            oldest = self._end - n
+            trend = self.trend
+            if trend is not None and trend._first == self.appended - n < trend._next:
+                trend.drop(self._times[oldest], values[oldest])
+            self._sum -= values[oldest]
+            if self._min[self._min_head] == oldest:
+                self._min_head = (self._min_head + 1) % n
+                self._min_len -= 1
+            if self._max[self._max_head] == oldest:
+                self._max_head = (self._max_head + 1) % n
+                self._max_len -= 1
+        else:
+            self._count += 1
+        if self._end == self.capacity:
+            self._compact()
+        i = self._end
+        values[i] = value
+        self._times[i] = t
+        self._sum += value
+        self._end = i + 1
+
+        mins, head, length = self._min, self._min_head, self._min_len
+        while length and values[mins[(head + length - 1) % n]] >= value:
+            length -= 1
+        mins[(head + length) % n] = i
+        self._min_len = length + 1
+        maxs, head, length = self._max, self._max_head, self._max_len
+        while length and values[maxs[(head + length - 1) % n]] <= value:
+            length -= 1
+        maxs[(head + length) % n] = i
+        self._max_len = length + 1
+
+        # Re-sum once per window to stop floating point drift of the running sum
+        self._since_resum += 1
+        if self._since_resum >= n:
+            self._sum = math.fsum(memoryview(values)[self._end - self._count:self._end])
+            self._since_resum = 0
+        self.appended += 1
+        self._seq += 1
+
+    # Move the samples staying in the window (all but the oldest) to the start of the arrays
+    def _compact(self):
+        keep = self._count - 1
+        shift = self._end - keep
+        # In place (memmove): arrays() views keep the arrays from being resized
+        for buffer in (memoryview(self._values), memoryview(self._times)):
+            buffer[:keep] = buffer[shift:self._end]
+        self._end = keep
+        n = self.maxlen
+        for queue, head, length in ((self._min, self._min_head, self._min_len), (self._max, self._max_head, self._max_len)):
+            for k in range(head, head + length):
+                queue[k % n] -= shift
+
+    # Report by exception: repeat the last sample every period microseconds up to t (a sample due within half a
+    # period of t counts as t itself), so a value held between deadband reports keeps its weight in Min/Max/Avg
+    def hold(self, t, period):
+        if not self._count:
+            return
+        t0 = self._times[self._end - 1]
+        missing = (t - t0 - period // 2) // period
+        if missing <= 0:
+            return
+        value = self._values[self._end - 1]
+        for k in range(max(1, missing - self.maxlen + 1), missing + 1):
+            self.append(value, t0 + k * period)
+
+    def clear(self):
+        self._values = array("d", [0.0]) * self.capacity
+        self._times = array("q", [0]) * self.capacity
+        self._count = self._end = self._seq = 0
+        self._min_head = self._min_len = self._max_head = self._max_len = 0
+        self._sum = 0.0
+        self._since_resum = 0
+        self.appended = 0  # samples appended since the window was cleared: the number of the next sample
+        if self.trend is not None:
+            self.trend.start()
+
+    def min(self):
+        return self._values[self._min[self._min_head]] if self._min_len else None
+
+    def max(self):
+        return self._values[self._max[self._max_head]] if self._max_len else None
+
+    def mean(self):
+        return self._sum / self._count if self._count else None
+
+    def __len__(self):
+        return self._count
+
+    # Samples in arrival order
+    def __iter__(self):
+        return iter(self._values[self._end - self._count:self._end])
+
+    # (timestamps, values) of the window in arrival order as zero-copy NumPy views (int64 microseconds, float64;
+    # memoryviews without NumPy). They are only valid until the next append: other threads than the writer use snapshot()
+    def arrays(self):
+        start, count = self._end - self._count, self._count
+        if load_numpy() is None:
+            return memoryview(self._times)[start:start + count], memoryview(self._values)[start:start + count]
+        return (np.frombuffer(self._times, dtype=np.int64, count=count, offset=start * 8),
+                np.frombuffer(self._values, dtype=np.float64, count=count, offset=start * 8))
+
+    # New window of another length holding the most recent samples of this one
+    def resized(self, maxlen):
+        window = RollingWindow(maxlen)
+        times, values = self.snapshot()
+        for t, value in zip(times[-maxlen:], values[-maxlen:]):
+            window.append(value, t)
+        return window
+
+    # (timestamps, values) array copies in arrival order; safe to call from other threads than the writer
+    def snapshot(self):
+        while True:
+            seq = self._seq
+            if seq & 1:
+                time.sleep(0)  # an append is in progress
+                continue
+            end, count = self._end, self._count
+            times, values = self._times[end - count:end], self._values[end - count:end]
+            if self._seq == seq:
+                return times, values
+
+# Least-squares slope (per second) of the samples of the last window_us microseconds of a sensor's RollingWindow,
+# plus its EWMA. The samples stay in the RollingWindow's arrays: only running sums of x, v, x*x and x*v (x: seconds
+# since the oldest sample at the last re-sum) over the sample numbers [first, next) are kept, which makes each sample
+# O(1) amortized, whatever the window length. A sample leaving the RollingWindow while it is still in the sums is
+# dropped by the RollingWindow (a trend window longer than the sample window is cut to it). The sums are recomputed
+# once per window against floating point drift.
+class TrendWindow:
+    __slots__ = ("window_us", "buffer", "_first", "_next", "_origin", "_sx", "_sv", "_sxx", "_sxv", "_since_resum",
+                 "slope", "direction", "started_at")
+
+    def __init__(self, window_us, buffer):
+        self.window_us = window_us
+        self.buffer = buffer
+        buffer.trend = self
+        self.slope = None       # smoothed slope after the last update
+        self.direction = None   # "rise" or "fall" while a trend is active
+        self.started_at = None  # timestamp of the TREND_START
+        self.start()
+
+    # Empty sums, starting at the next sample of the buffer
+    def start(self):
+        self._first = self._next = self.buffer.appended
+        self._origin = 0
+        self._sx = self._sv = self._sxx = self._sxv = 0.0
+        self._since_resum = 0
+
+    # The oldest sample in the sums (t, value) leaves the buffer
+    def drop(self, t, value):
+        x = (t - self._origin) / 1e6
+        self._sx -= x
+        self._sv -= value
+        self._sxx -= x * x
+        self._sxv -= x * value
+        self._first += 1
+
+    # Add the samples appended to the buffer since the last update and drop those older than window_us before the
+    # newest one; returns the smoothed slope, or None while it is unknown
+    def update(self, smoothing):
+        buffer = self.buffer
+        end = buffer.appended
+        if end == self._next:
+            return self.slope
+        times, values = buffer._times, buffer._values
+        base = buffer._end - end  # slot of sample number k: base + k
+        first = max(self._next, end - len(buffer))
+        if self._first == self._next:
+            # Nothing left in the sums (all samples older than the window, or dropped by the buffer)
+            self._first = first
+            self._origin = times[base + first]
+            self._sx = self._sv = self._sxx = self._sxv = 0.0
+        origin = self._origin
+        for i in range(base + first, base + end):
+            x = (times[i] - origin) / 1e6
+            value = values[i]
+            self._sx += x
+            self._sv += value
+            self._sxx += x * x
+            self._sxv += x * value
+        self._since_resum += end - first
+        self._next = end
+
+        t = times[base + end - 1]
+        limit = t - self.window_us
+        i = base + self._first
+        while times[i] < limit:
+            x = (times[i] - origin) / 1e6
+            value = values[i]
+            self._sx -= x
+            self._sv -= value
+            self._sxx -= x * x
+            self._sxv -= x * value
+            i += 1
+        self._first = i - base
+        n = end - self._first
+        if self._since_resum >= n:
+            self.resum()
+
+        if n < TREND_MIN_SAMPLES or 2 * (t - times[i]) < self.window_us:
+            return self.slope  # warming up: fewer than TREND_MIN_SAMPLES or less than half a window
+        den = n * self._sxx - self._sx * self._sx
+        if den <= 0:
+            return self.slope
+        slope = (n * self._sxv - self._sx * self._sv) / den
+        self.slope = slope if self.slope is None else self.slope + smoothing * (slope - self.slope)
+        return self.slope
+
+    def resum(self):
+        buffer = self.buffer
+        times, values = buffer.arrays()
+        offset = len(buffer) - buffer.appended  # index in the arrays of sample number k: offset + k
+        times, values = times[offset + self._first:offset + self._next], values[offset + self._first:offset + self._next]
+        self._origin = int(times[0])
+        if isinstance(times, memoryview):  # without NumPy
+            xs = [(t - self._origin) / 1e6 for t in times]
+            self._sx = math.fsum(xs)
+            self._sv = math.fsum(values)
+            self._sxx = math.fsum(x * x for x in xs)
+            self._sxv = math.fsum(x * v for x, v in zip(xs, values))
+        else:
+            xs = (times - self._origin) / 1e6
+            self._sx, self._sv = float(xs.sum()), float(values.sum())
+            self._sxx, self._sxv = float(xs @ xs), float(xs @ values)
+        self._since_resum = 0
+
+    # New window of another length, or on another buffer, with the trend state of this one; its sums start over with
+    # the samples in the buffer
+    def resized(self, window_us, smoothing, buffer=None):
+        window = TrendWindow(window_us, buffer or self.buffer)
+        window._first = window._next = window.buffer.appended - len(window.buffer)
+        window.update(smoothing)
+        window.slope, window.direction, window.started_at = self.slope, self.direction, self.started_at
+        return window
+
+def trend_window_us():
+    return int(trend_settings["window"] * 1e6)
+
+
+        # === Sensor runtime model ===
+
+# Key of a sensor in runtime: its NodeId, qualified by the endpoint for sensors of a "servers" entry
+def sensor_key(sensor):
+    node_id = ua.NodeId.from_string(sensor["nodeId"])
+    return (sensor["endpoint"], node_id) if "endpoint" in sensor else node_id
+
+# Per-sensor data compiled once from the config, so the notification path does no parsing
+class SensorRuntime:
+    __slots__ = ("config", "key", "name", "node_id", "unit", "deadband", "levels", "buffer", "states", "subscription", "handle",
+                 "last_status_log", "samples_since_log", "trend", "revision", "removed", "backfill_t",
+                 "notifications", "monitoring", "hold_us")
+
+    def __init__(self, config, buffer, states):
+        self.name = config["name"]
+        self.node_id = ua.NodeId.from_string(config["nodeId"])
+        self.key = sensor_key(config)  # key in runtime
+        self.buffer = buffer
+        self.states = states
+        self.subscription = None  # shared subscription of this sensor's scanRate
+        self.handle = None        # monitored item handle returned by the server
+        self.last_status_log = float("-inf")  # log rate limiting (time.monotonic)
+        self.samples_since_log = 0
+        self.trend = TrendWindow(trend_window_us(), buffer)
+        self.revision = 0  # samples added to the buffer (cache key of the history API)
+        self.removed = False  # dropped by a config reload; queued samples are ignored
+        self.backfill_t = None  # SourceTimestamp (us) of the sample read after a reconnect
+        self.notifications = 0  # data change notifications received (/metrics)
+        self.configure(config)
+
+    # (Re)compile the parts of the config that can change in place
+    def configure(self, config):
+        self.config = config
+        self.unit = config.get("unit", "")
+        self.deadband = float(config.get("deadband", 0.0))
+        self.monitoring = monitoring_params(config)
+        # With a deadband the server only reports changes beyond it: the last value is held for the statistics
+        self.hold_us = int(sample_interval(config) * 1000) if self.monitoring[3] != "none" else 0
+        states = self.states
+        alarms = config.get("alarms", {})
+        keys = (("H", "high", True), ("HH", "high_high", True), ("L", "low", False), ("LL", "low_low", False))
+        levels = []
+        for level, key, is_high in keys:
+            thr = alarms.get(key)
+            if thr is None:
+                continue
+            limit = float(thr)
+            clear_limit = limit - self.deadband if is_high else limit + self.deadband
+            # (level, threshold as configured, active limit, clear limit, high side?, state)
+            levels.append((level, thr, limit, clear_limit, is_high, states[level]))
+        self.levels = tuple(levels)
 
 
         # === Alarm detection ===
@@ -106,66 +1248,40 @@ def emit_event(event_type, sensor, level, value, threshold, now_ts, started_at=N
     }
 
     if event_type == "ALARM_CLEAR" and started_at is not None:
-        duration_sec = max(0, (now_ts - started_at).total_seconds())
+        duration_sec = max(0, (to_us(now_ts) - to_us(started_at)) / 1e6)  # either may be naive UTC
         payload["duration"] = round(duration_sec, 3)
-        for alarm in reversed(alarm_history["alarms"]):
-            if alarm["sensor"] == sensor["name"] and alarm["type"] == level and alarm["active"]:
-                alarm["active"] = False
-                alarm["duration"] = payload["duration"]
-                break
-        alarm_history["statistics"]["active_alarms"] = sum(1 for a in alarm_history["alarms"] if a["active"])
-    else:
-        alarm_history["alarms"].append(payload)
-        alarm_history["statistics"]["total_alarms"] += 1
-        alarm_history["statistics"]["active_alarms"] += 1
-        alarm_history["statistics"]["by_type"][level] += 1
 
-    print(f"\n[ALARM-{event_type}] {json.dumps(payload)}\n", flush=True)
+    if logger.isEnabledFor(logging.WARNING):
+        logger.warning("[ALARM-%s] %s", event_type, json.dumps(payload), extra={"event": event_type, "alarm": payload})
     notification_node = alarm_settings.get("notificationNode")
     if notification_node:
-       print(f"{iso(datetime.now(timezone.utc))} | Skipping write of alarm status to {notification_node} (read-only in Prosys Free).\n")
-    write_alarm_history()
+        logger.debug("Skipping write of alarm status to %s (read-only in Prosys Free).", notification_node)
+    record_alarm_event(dict(payload, event=event_type))
 
-    try:
-        socketio.emit("alarm", payload)
-    except Exception as e:
-        print(f"{iso(datetime.now(timezone.utc))} | Failed to emit alarm: {e}")
+    publish("alarm", payload)
 
 # Definition of the different alarm levels from the config file
-def check_levels(sensor, value, now_ts):
-    global states, TIME_DELAY
-    name = sensor["name"]
-    db = float(sensor.get("deadband", 0.0))
-    alarms = sensor.get("alarms", {})
-
-    th = {
-        "HH": alarms.get("high_high"),
-        "H":  alarms.get("high"),
-        "L":  alarms.get("low"),
-        "LL": alarms.get("low_low"),
-    }
+def check_levels(rt, value, now_ts):
+    global TIME_DELAY
+    if value is None:
+        return
 
     # Which alarm is active?
-    def process(level, is_high_side):
-        st = states[name][level]
-        thr = th[level]
-        if thr is None:
-            return
-
-        if is_high_side:
-            cond_active = (value is not None) and (value >= float(thr))
-            cond_clear  = (value is not None) and (value <= float(thr) - db)
+    for level, thr, limit, clear_limit, is_high, st in rt.levels:
+        if is_high:
+            cond_active = value >= limit
+            cond_clear = value <= clear_limit
         else:
-            cond_active = (value is not None) and (value <= float(thr))
-            cond_clear  = (value is not None) and (value >= float(thr) + db)
+            cond_active = value <= limit
+            cond_clear = value >= clear_limit
 
         if st["active"]:
             if cond_clear:
-                emit_event("ALARM_CLEAR", sensor, level, value, thr, now_ts, started_at=st["started_at"])
+                emit_event("ALARM_CLEAR", rt.config, level, value, thr, now_ts, started_at=st["started_at"])
                 st["active"] = False
                 st["pending_since"] = None
                 st["started_at"] = None
-                return
+                continue
 
         if cond_active:
             if st["pending_since"] is None:
@@ -173,366 +1289,3479 @@ def check_levels(sensor, value, now_ts):
             if (now_ts - st["pending_since"]).total_seconds() >= TIME_DELAY:
                 st["active"] = True
                 st["started_at"] = now_ts
-                emit_event("ALARM_ACTIVE", sensor, level, value, thr, now_ts)
+                emit_event("ALARM_ACTIVE", rt.config, level, value, thr, now_ts)
         else:
             st["pending_since"] = None
 
-    process("H", True)
-    process("HH", True)
-    process("L", False)
-    process("LL", False)
-
 
-        # === Bonus challenges ===
-
-# Alarm acknowledgement (locally) - not functional with the Free version, only the logic is written
-def acknowledge_alarm(alarm_index, client=None, comment="Acknowledge via client"):
-    global alarm_history
-    try:
-        alarm = alarm_history["alarms"][alarm_index]
-    except IndexError:
-        print(f"{iso(datetime.now(timezone.utc))} | Invalid alarm index")
-        return
+        # === Batch alarm evaluation ===
 
-    if alarm["acknowledged"]:
-        print(f"{iso(datetime.now(timezone.utc))} | Alarm {alarm_index} already acknowledged.")
-        return
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+NO_TIME = -(2 ** 62) # "None" marker in the int64 microsecond arrays
 
-    actual_index = alarm_index + 1
-    nodeID = alarm["nodeId"]
+# Microseconds since the epoch; naive datetimes are UTC, as in iso(). Exact for microsecond timestamps.
+def to_us(ts):
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return round(ts.timestamp() * 1_000_000)
 
-    # OPC UA method call
-    if client:
-        try:
-            condition_node = client.get_node(nodeID)
-            acknowledge_method = condition_node.get_child("0:Acknowledge")
+def from_us(us):
+    return EPOCH + timedelta(microseconds=int(us))
 
-            event_id = ua.Variant(alarm["timestamp"].encode(), ua.VariantType.ByteString)
-            comment_val = ua.Variant(comment, ua.VariantType.LocalizedText)
+# HH/H/L/LL state machine for all sensors held in NumPy arrays; produces the same events as check_levels.
+# A batch is evaluated in rounds (the k-th sample of every sensor together), then events are emitted in sample order.
+# The evaluator owns the alarm state while in use; store_states() copies it back to the SensorRuntime dicts.
+class BatchAlarmEvaluator:
+    LEVELS = ("H", "HH", "L", "LL")  # same order as check_levels
+    SIGN = (1.0, 1.0, -1.0, -1.0)     # high side / low side
 
-            result = condition_node.call_method(acknowledge_method, event_id, comment_val)
-            print(f"{iso(datetime.now(timezone.utc))} | Acknowledge method result: {result}")
+    def __init__(self, rts):
+        if load_numpy() is None:
+            raise RuntimeError("NumPy is required for batch alarm evaluation")
+        self.rts = list(rts)
+        self.rows = {rt: i for i, rt in enumerate(self.rts)}
+        shape = (len(self.rts), len(self.LEVELS))
+        # Limits are stored multiplied by SIGN so both sides compare the same way: value*sign >= limit
+        self.limit = np.full(shape, np.inf)          # +inf: level not configured, never active
+        self.clear_limit = np.full(shape, -np.inf)   # -inf: never clears
+        self.has_level = np.zeros(shape, dtype=bool)
+        self.threshold = np.empty(shape, dtype=object)
+        self.active = np.zeros(shape, dtype=bool)
+        self.pending_us = np.full(shape, NO_TIME, dtype=np.int64)
+        self.started_at = np.full(shape, None, dtype=object)
+        self.dirty = np.zeros(len(self.rts), dtype=bool)
+        self.naive = None  # whether sample datetimes are naive (python-opcua) or timezone aware
+        column = {level: j for j, level in enumerate(self.LEVELS)}
+        for i, rt in enumerate(self.rts):
+            for level, thr, limit, clear_limit, is_high, st in rt.levels:
+                j = column[level]
+                self.has_level[i, j] = True
+                self.limit[i, j] = self.SIGN[j] * limit
+                self.clear_limit[i, j] = self.SIGN[j] * clear_limit
+                self.threshold[i, j] = thr
+                self.active[i, j] = st["active"]
+                self.started_at[i, j] = st["started_at"]
+                if st["pending_since"] is not None:
+                    self.pending_us[i, j] = to_us(st["pending_since"])
+                    self.naive = st["pending_since"].tzinfo is None
 
-        except Exception as e:
-            print(f"{iso(datetime.now(timezone.utc))} | Server acknowledgment not supported, marking locally. Reason: {e}")
+    # samples: iterable of (SensorRuntime, numeric value, datetime)
+    def evaluate(self, samples):
+        samples = [s for s in samples if s[0] in self.rows and s[1] is not None]
+        n = len(samples)
+        if not n:
+            return 0
+        rows = np.fromiter((self.rows[s[0]] for s in samples), dtype=np.intp, count=n)
+        values = np.fromiter((s[1] for s in samples), dtype=float, count=n)
+        times = np.fromiter((to_us(s[2]) for s in samples), dtype=np.int64, count=n)
+        return self.evaluate_arrays(rows, values, times, [s[2] for s in samples])
 
-    # Update local history regardless
-    alarm["acknowledged"] = True
-    write_alarm_history()
-    print(f"{iso(datetime.now(timezone.utc))} | Alarm {actual_index} acknowledged (locally).")
+    # Column form: evaluator row, value and microsecond timestamp per sample (e.g. a replayed file).
+    # Datetimes for the events are taken from `stamps` when given, otherwise built from the timestamps.
+    def evaluate_arrays(self, rows, values, times, stamps=None):
+        rows = np.asarray(rows, dtype=np.intp)
+        values = np.asarray(values, dtype=float)
+        times = np.asarray(times, dtype=np.int64)
+        n = len(rows)
+        if not n:
+            return 0
+        if stamps is not None:
+            self.naive = stamps[0].tzinfo is None
+        delay_us = int(TIME_DELAY * 1_000_000)
+        sign = np.array(self.SIGN)
 
-#Trend detection
-def check_trend(sensor, value, now_ts):
-    global last_values, trend_settings, prev_values
-    name = sensor["name"]
+        # Position of each sample among the samples of its sensor
+        order = np.argsort(rows, kind="stable")
+        sorted_rows = rows[order]
+        starts = np.flatnonzero(np.r_[True, sorted_rows[1:] != sorted_rows[:-1]])
+        counts = np.diff(np.r_[starts, n])
 
-    # Skip non-numeric values
-    if value is None or not isinstance(value, (int, float)):
-        return
+        events = []  # (sample position, level column, event type)
+        for k in range(int(counts.max())):
+            pos = order[starts[counts > k] + k]
+            r = rows[pos]
+            v = values[pos][:, None] * sign
+            t = times[pos][:, None]
 
-    if name in last_values:
-        prev_val, prev_ts = prev_values[name]
-        if prev_ts is not None:
-            dt = (now_ts - prev_ts).total_seconds() 
-            if dt > 0:
-                rate = (value - prev_val) / dt
-                if rate >= trend_settings["rise_rate"]:
-                    print(f"{iso(datetime.now(timezone.utc))} | [TREND] {name}: Rapid rise detected (rate={rate:.2f} per sec)\n")
-                elif rate <= trend_settings["fall_rate"]:
-                    print(f"{iso(datetime.now(timezone.utc))} | [TREND] {name}: Rapid fall detected (rate={rate:.2f} per sec)\n")
-
-    # store current value for next calculation
-    last_values[name] = (value, now_ts)
-
-# Export alarm history to CSV format
-def export_alarm_history_csv():
-    global alarm_history, file_path
-    if not alarm_history.get("alarms"):
-        print("No alarm history to export.\n")
-        return
+            cond_active = v >= self.limit[r]
+            cond_clear = v <= self.clear_limit[r]
+            active = self.active[r]
+            pending_us = self.pending_us[r]
 
-    # CSV file path - same as json
-    csv_path = os.path.splitext(file_path)[0] + ".csv"
+            clear_now = active & cond_clear
+            armed = cond_active & ~clear_now
+            pending_us = np.where(armed & (pending_us == NO_TIME), t, pending_us)
+            fire = armed & (t - pending_us >= delay_us)
 
-    try:
-        with open(csv_path, mode='w', newline='') as csvfile:
-            fieldnames = ["timestamp", "sensor", "nodeId", "type", "priority", "value", "threshold", "duration", "active", "acknowledged"]
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+            for i, j in zip(*(a.tolist() for a in np.nonzero(clear_now))):
+                events.append((int(pos[i]), j, "ALARM_CLEAR"))
+            for i, j in zip(*(a.tolist() for a in np.nonzero(fire))):
+                events.append((int(pos[i]), j, "ALARM_ACTIVE"))
 
-            writer.writeheader()
-            for alarm in alarm_history["alarms"]:
-                writer.writerow(alarm)
+            self.active[r] = (active & ~clear_now) | fire
+            self.pending_us[r] = np.where(armed, pending_us, NO_TIME)
+            self.dirty[r] = True
 
-        print(f"Alarm history exported to CSV: {csv_path}")
-    except Exception as e:
-        print(f"Failed to export CSV: {e}")
-        
+        # Each sensor's state only depends on its own samples, so emitting after the rounds keeps check_levels' order
+        events.sort()
+        started = self.started_at
+        for p, j, event_type in events:
+            i = int(rows[p])
+            now_ts = stamps[p] if stamps is not None else self.stamp(int(times[p]))
+            started_at = started[i, j]
+            started[i, j] = now_ts if event_type == "ALARM_ACTIVE" else None
+            emit_event(event_type, self.rts[i].config, self.LEVELS[j], float(values[p]), self.threshold[i, j], now_ts,
+                       started_at=started_at if event_type == "ALARM_CLEAR" else None)
+        return len(events)
 
-        # === Subscription handler ===
+    def stamp(self, us):
+        ts = from_us(us)
+        return ts.replace(tzinfo=None) if self.naive else ts
 
-# Handle data change notifications from server
-class SubHandler:
-    def datachange_notification(self, node, val, data):
-        global stop_monitoring, buffers
-        if stop_monitoring:
-            return
+    # Copy the array state of the sensors evaluated since the last call back into the SensorRuntime state dicts
+    def store_states(self):
+        for i in np.flatnonzero(self.dirty).tolist():
+            rt = self.rts[i]
+            for j, level in enumerate(self.LEVELS):
+                if self.has_level[i, j]:
+                    st = rt.states[level]
+                    st["active"] = bool(self.active[i, j])
+                    pending_us = int(self.pending_us[i, j])
+                    st["pending_since"] = None if pending_us == NO_TIME else self.stamp(pending_us)
+                    st["started_at"] = self.started_at[i, j]
+        self.dirty[:] = False
 
-        sensor = next((s for s in sensors if s["nodeId"] == node.nodeid.to_string()), None)
-        if not sensor:
-            return
 
-        src_ts = getattr(getattr(data, "monitored_item", None), "Value", None)
-        src_ts = getattr(src_ts, "SourceTimestamp", None)
-        now_ts = src_ts if isinstance(src_ts, datetime) else datetime.now(timezone.utc)
+        # === Bonus challenges ===
 
-        num = normalize_number(val)
-        if num is not None:
-            buffers[sensor["name"]].append(num)
-        else:
-            print(f"{iso(datetime.now(timezone.utc))} | [WARNING] Invalid data type received for {sensor['name']}: {val} ({type(val).__name__})")
-            return
-        
-        numeric_values = list(buffers[sensor["name"]])
-        if numeric_values:
-            min_val = min(numeric_values)
-            max_val = max(numeric_values)
-            avg_val = mean(numeric_values)
-            print(
-                f"{iso(datetime.now(timezone.utc))} | {sensor['name']} = {fmt_num(val)} {sensor.get('unit','')} | "
-                f"Min: {fmt_num(min_val)}, Max: {fmt_num(max_val)}, Avg: {fmt_num(avg_val)} "
-                f"(buffer {len(numeric_values)}/{buffers[sensor['name']].maxlen})",
-                flush=True
-            )
-            last_val, last_ts = last_values.get(sensor["name"], (None, None))
-            prev_values[sensor["name"]] = (last_val, last_ts)
-            if num is not None:
-                last_values[sensor["name"]] = (num, now_ts)
+# Alarm acknowledgement (locally) - not functional with the Free version, only the logic is written.
+# indexes are positions in the alarm history. With a client, the Acknowledge method of every condition is called in
+# batched Call requests (MAX_ITEMS_PER_CALL methods each) on that session; the local history is updated regardless.
+# Returns the indexes that were acknowledged.
+def acknowledge_alarms(indexes, client=None, comment="Acknowledge via client"):
+    alarms = alarm_history["alarms"]
+    pending = [i for i in dict.fromkeys(indexes) if 0 <= i < len(alarms) and not alarms[i]["acknowledged"]]
+    if not pending:
+        print(f"{iso(datetime.now(timezone.utc))} | No unacknowledged alarm selected.")
+        return []
 
+    # OPC UA method calls
+    if client:
+        method_id = ua.NodeId(ua.ObjectIds.AcknowledgeableConditionType_Acknowledge)
+        comment_val = ua.Variant(ua.LocalizedText(comment), ua.VariantType.LocalizedText)
+        confirmed = 0
+        for start in range(0, len(pending), MAX_ITEMS_PER_CALL):
+            calls = []
+            for i in pending[start:start + MAX_ITEMS_PER_CALL]:
+                call = ua.CallMethodRequest()
+                call.ObjectId = ua.NodeId.from_string(alarms[i]["nodeId"])
+                call.MethodId = method_id
+                call.InputArguments = [ua.Variant(alarms[i]["timestamp"].encode(), ua.VariantType.ByteString), comment_val]
+                calls.append(call)
             try:
-                socketio.emit("update",{s:v[0] for s,v in last_values.items()})
+                results = client.uaclient.call(calls)
             except Exception as e:
-                print(f"{iso(datetime.now(timezone.utc))} | Failed live emit: {e}.\n")
-                
-            if num is not None:
-                check_trend(sensor, num, now_ts)
-                check_levels(sensor, num, now_ts)
-        else:
-            print(f"{iso(now_ts)} | {sensor['name']} = {val} {sensor.get('unit','')}", flush=True)
+                print(f"{iso(datetime.now(timezone.utc))} | Server acknowledgment not supported, marking locally. Reason: {str(e) or type(e).__name__}")
+                break
+            confirmed += sum(1 for result in results if result.StatusCode.is_good())
+            failed = [result.StatusCode.name for result in results if not result.StatusCode.is_good()]
+            if failed:
+                print(f"{iso(datetime.now(timezone.utc))} | Server acknowledgment failed for {len(failed)} alarms ({failed[0]}), marking locally.")
+        print(f"{iso(datetime.now(timezone.utc))} | Server acknowledged {confirmed}/{len(pending)} alarms.")
 
+    # Update local history regardless
+    now = iso(datetime.now(timezone.utc))
+    record_alarm_events([{"event": "ACK", "index": i, "timestamp": now} for i in pending])
+    print(f"{iso(datetime.now(timezone.utc))} | {len(pending)} alarm(s) acknowledged (locally).")
+    return pending
 
-        # === Connect to OPC UA server ===
+class SessionUnavailable(RuntimeError):
+    pass
 
-# Connect to OPC UA with a retry logic
-def connect_to_opcua():
-    client = Client(ENDPOINT)
-    print(f"{iso(datetime.now(timezone.utc))} | Anonymous connection enabled.")
-    for attempt in range(1, MAX_RETRIES + 1):
-        try:
-            client.connect()
-            print(f"{iso(datetime.now(timezone.utc))} | Successfully connected to {ENDPOINT}.")
-            return client
-        except Exception as e:
-            print(f"{iso(datetime.now(timezone.utc))} | Connection failed (attempt {attempt}/{MAX_RETRIES}): {e}")
-            time.sleep(RETRY_DELAY)
-    print(f"{iso(datetime.now(timezone.utc))} | Unable to connect after multiple attempts.")
-    return None
+# Session of the running simulation, if any, for acknowledgements. Does not wait for a recovery in progress
+def running_client():
+    running = supervisor
+    if running is None:
+        return None
+    if running.recovering or running.failed:
+        raise SessionUnavailable("the OPC UA session is being restored, try again later")
+    return running.client
 
-# Reconection to OPC UA
-def reconnect(client):
-    print(f"{iso(datetime.now(timezone.utc))} | Attempting reconnect.")
-    try:
-        client.disconnect()
-    except:
-        pass
-    for attempt in range(1, MAX_RETRIES + 1):
+# Menu option 4: pages of the alarm history (newest first) to acknowledge alarms, several at once
+def browse_alarms(page_size=20):
+    page = 0
+    while True:
+        total = alarm_history.query(limit=0)[0]
+        if not total:
+            print("No alarms to acknowledge.")
+            return
+        pages = (total + page_size - 1) // page_size
+        page = min(page, pages - 1)
+        total, indexes = alarm_history.query(offset=page * page_size, limit=page_size)
+        stats = alarm_history["statistics"]
+        print(f"\nAlarms {page * page_size + 1}-{page * page_size + len(indexes)} of {total} (page {page + 1}/{pages}, "
+              f"{stats['unacknowledged_alarms']} unacknowledged, newest first)")
+        alarms = alarm_history["alarms"]
+        for i in indexes:
+            alarm = alarms[i]
+            status = "ACK" if alarm["acknowledged"] else "UNACK"
+            print(f"[{i + 1}] {alarm['timestamp']} | {alarm['sensor']} | {alarm['type']} | Active={alarm['active']} | {status}")
+        choice = input("\nAlarm numbers to acknowledge (e.g. 3,5-8), 'all' for all unacknowledged, n/p for the next/previous page, 0 to return: ").strip().lower()
+        if choice in ("", "0"):
+            print("Canceled acknowledgment.")
+            return
+        if choice == "n":
+            page = min(page + 1, pages - 1)
+            continue
+        if choice == "p":
+            page = max(page - 1, 0)
+            continue
+        if choice == "all":
+            selected = alarm_history.query(acknowledged=False)[1]
+        else:
+            try:
+                selected = []
+                for part in choice.split(","):
+                    first, _, last = part.partition("-")
+                    selected.extend(range(int(first) - 1, int(last or first)))
+            except ValueError:
+                print("Invalid input.")
+                continue
+        # Attempt real method calls, on one session for the whole selection
+        client = connect_to_opcua()
         try:
-            new_client = Client(ENDPOINT)
-            new_client.connect()
-            print(f"{iso(datetime.now(timezone.utc))} | Reconnected to {ENDPOINT} (attempt {attempt}).\n")
-            return new_client
-        except Exception as e:
-            print(f"{iso(datetime.now(timezone.utc))} | Reconnect failed (attempt {attempt}/{MAX_RETRIES}): {e}\n")
-            time.sleep(RETRY_DELAY)
-    print(f"{iso(datetime.now(timezone.utc))} | Reconnect failed after max retries.\n")
-    return None
+            acknowledge_alarms(selected, client)
+        finally:
+            if client:
+                client.disconnect()
+        return
 
+# Trend events (TREND_START and TREND_END) go through the alarm channels: log, alarm history and dashboard
+def emit_trend(event_type, rt, direction, value, slope, now_ts, started_at=None):
+    payload = {
+        "timestamp": iso(now_ts),
+        "sensor": rt.name,
+        "nodeId": rt.config["nodeId"],
+        "type": direction.upper(),
+        "value": fmt_num(value),
+        "slope": round(slope, 6),
+        "duration": None,
+        "active": event_type == "TREND_START"
+    }
+    if event_type == "TREND_END" and started_at is not None:
+        payload["duration"] = round(max(0, (to_us(now_ts) - to_us(started_at)) / 1e6), 3)
 
-        # === Load configuration JSON ===
+    if logger.isEnabledFor(logging.INFO):
+        logger.info("[%s] %s", event_type, json.dumps(payload), extra={"sensor": rt.name, "event": event_type, "trend": payload})
+    record_alarm_event(dict(payload, event=event_type))
+    publish("alarm", payload)
 
-# Load the configuration file when 2 is entered in the menu
-def load_config_json():
-    global sensors, alarm_settings, TIME_DELAY, buffers, states, alarm_history, trend_settings
-    path = "./config.json"  # fixed path
+# Trend detection on the smoothed window slope (per second) of the samples in the sensor's buffer; value: the sample
+# just added to it. A trend starts when the slope reaches riseRate or fallRate and ends when it falls back below
+# hysteresis times that rate.
+def check_trend(rt, value, now_ts):
+    if value is None or not isinstance(value, (int, float)):
+        return
+    trend = rt.trend
+    slope = trend.update(trend_settings["smoothing"])
+    if slope is None:
+        return
 
-    try:
-        with open(path, "r") as f:
-            try:
-                config = json.load(f)
-            except json.JSONDecodeError as jde:
-                print(f"{iso(datetime.now(timezone.utc))} | Malformed JSON in configuration file '{path}: {jde}")
-                return
-            
-        sensors = config["sensors"]
-        if not sensors:
-            print(f"{iso(datetime.now(timezone.utc))} | No sensors found in configuration file '{path}'.")
+    rise, fall = trend_settings["rise_rate"], trend_settings["fall_rate"]
+    if trend.direction == "rise" and slope < rise * trend_settings["hysteresis"] or \
+            trend.direction == "fall" and slope > fall * trend_settings["hysteresis"]:
+        emit_trend("TREND_END", rt, trend.direction, value, slope, now_ts, started_at=trend.started_at)
+        trend.direction = trend.started_at = None
+    if trend.direction is None:
+        if slope >= rise:
+            trend.direction = "rise"
+        elif slope <= fall:
+            trend.direction = "fall"
+        else:
             return
+        trend.started_at = now_ts
+        emit_trend("TREND_START", rt, trend.direction, value, slope, now_ts)
 
-        alarm_settings = config.get("alarmSettings", {})
-        TIME_DELAY = int(alarm_settings.get("timeDelay", 0))
-        trend_cfg = config.get("trendSettings", {})
-        trend_settings["rise_rate"] = float(trend_cfg.get("riseRate", trend_settings["rise_rate"]))
-        trend_settings["fall_rate"] = float(trend_cfg.get("fallRate", trend_settings["fall_rate"]))
-        
-        # Clamp scanRate and print warnings
-        for sensor in sensors:
-            default_rate = sensor.get("scanRate", MIN_SCANRATE)
-            final_rate = default_rate
-            if final_rate > MAX_SCANRATE:
-                print(f"\nWarning: {sensor['name']} requested scan rate {final_rate}ms exceeds MAX_SCANRATE ({MAX_SCANRATE}ms). Clamping to maximum.\n")
-            if final_rate < MIN_SCANRATE:
-                print(f"\nWarning: {sensor['name']} requested scan rate {final_rate}ms is below MIN_SCANRATE ({MIN_SCANRATE}ms). Clamping to minimum.\n")
-            sensor["scanRate"] = max(MIN_SCANRATE, min(final_rate, MAX_SCANRATE))
-            print(f"Sensor: {sensor['name']}, NodeId: {sensor['nodeId']}, ScanRate: {sensor['scanRate']}ms")
-
-        # Initialize buffers and states
-        buffers.clear()
-        states.clear()
-        for sensor in sensors:
-            samples = math.ceil(5 * 60 * 1000 / sensor.get("scanRate", MIN_SCANRATE))
-            buffers[sensor["name"]] = deque(maxlen=samples)
-        levels = ("HH", "H", "L", "LL")
-        states.update({s["name"]: {lvl: {"active": False, "pending_since": None, "started_at": None} for lvl in levels} for s in sensors})
 
-        # Initialize alarm history
-        alarm_history.clear()
-        alarm_history.update({
-            "alarms": [],
-            "statistics": {"total_alarms": 0, "active_alarms": 0, "by_type": {"HH":0,"H":0,"L":0,"LL":0}}
-        })
+        # === Alarm export ===
 
-        print(f"{iso(datetime.now(timezone.utc))} | Configuration loaded from {path}")
+EXPORT_FIELDS = ALARM_FIELDS + ["index"]  # index: position in the alarm history (the watermark of incremental exports)
+alarm_row = itemgetter(*ALARM_FIELDS)
 
-    except FileNotFoundError:
-        print(f"{iso(datetime.now(timezone.utc))} | Configuration file '{path}' not found.")
+# Parse an ISO 8601 time (naive = UTC) to microseconds since the epoch
+def parse_iso_us(text):
+    ts = datetime.fromisoformat(str(text).strip().replace("Z", "+00:00"))
+    return to_us(ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc))
 
-    except Exception as e:
-        print(f"{iso(datetime.now(timezone.utc))} | Failed to load configuration: {e}")
+def parse_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
 
+# Rows of one chunk as typed columns for the columnar writers
+def export_columns(rows):
+    cols = list(zip(*rows))
+    named = dict(zip(EXPORT_FIELDS, cols))
+    return {
+        "index": named["index"],
+        "timestamp": [parse_iso_us(ts) for ts in named["timestamp"]],
+        "sensor": named["sensor"],
+        "nodeId": named["nodeId"],
+        "type": named["type"],
+        "priority": named["priority"],
+        "value": [parse_float(v) for v in named["value"]],
+        "threshold": [parse_float(v) for v in named["threshold"]],
+        "duration": [math.nan if v is None else float(v) for v in named["duration"]],
+        "active": named["active"],
+        "acknowledged": named["acknowledged"],
+    }
 
-        # === Run simulation ===
+# CSV rows, optionally gzip-compressed; appending adds a gzip member (readers see one stream)
+class CsvExportWriter:
+    def __init__(self, path, compress=False, append=False):
+        import csv
+        import gzip
+        header = not (append and os.path.exists(path) and os.path.getsize(path) > 0)
+        mode = "a" if append else "w"
+        if compress:
+            self._file = gzip.open(path, mode + "t", compresslevel=6, newline="", encoding="utf-8")
+        else:
+            self._file = open(path, mode, newline="", encoding="utf-8")
+        self._writer = csv.writer(self._file)
+        if header:
+            self._writer.writerow(EXPORT_FIELDS)
 
-# Run the simulation when 1 is entered in the menu 
-def run_simulation():
-    global stop_monitoring, file_path
+    def write(self, rows):
+        self._writer.writerows(rows)
 
-    if not sensors:
-        print(f"{iso(datetime.now(timezone.utc))} | No configuration loaded. Loading default config.json.")
+    def close(self):
+        self._file.close()
+
+def import_pyarrow():
+    global pa, pq
+    if pq is None:
+        pa, pq = optional_import("pyarrow"), optional_import("pyarrow.parquet")
+    return pq is not None
+
+# One Parquet row group per chunk
+class ParquetExportWriter:
+    def __init__(self, path, compress=True):
+        self.schema = pa.schema([
+            ("index", pa.int64()), ("timestamp", pa.timestamp("us", tz="UTC")), ("sensor", pa.dictionary(pa.int32(), pa.string())),
+            ("nodeId", pa.dictionary(pa.int32(), pa.string())), ("type", pa.dictionary(pa.int8(), pa.string())), ("priority", pa.int8()),
+            ("value", pa.float64()), ("threshold", pa.float64()), ("duration", pa.float64()), ("active", pa.bool_()),
+            ("acknowledged", pa.bool_()),
+        ])
+        self._writer = pq.ParquetWriter(path, self.schema, compression="zstd" if compress else "none")
+
+    def write(self, rows):
+        cols = export_columns(rows)
+        self._writer.write_table(pa.Table.from_pydict(cols, schema=self.schema))
+
+    def close(self):
+        self._writer.close()
+
+# NPZ with the columns as .npy entries. The row count is only known at the end, so each column is spooled to a
+# temporary file and copied into the archive on close. Sensors, nodeIds and levels are stored as codes plus a
+# dictionary (sensor_names, sensor_node_ids, types).
+class NpzExportWriter:
+    COLUMNS = (("index", "<u8"), ("timestamp", "<i8"), ("sensor", "<u4"), ("type", "u1"), ("priority", "u1"), ("value", "<f8"),
+               ("threshold", "<f8"), ("duration", "<f8"), ("active", "?"), ("acknowledged", "?"))
+
+    def __init__(self, path, compress=True):
+        import tempfile
+        self.path = path
+        self.compress = compress
+        self.count = 0
+        self.sensors = {}  # name -> code
+        self.node_ids = []
+        self.types = {}
+        self._dir = tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(path)))
+        self._spools = {name: open(os.path.join(self._dir.name, name), "wb") for name, _ in self.COLUMNS}
+
+    def write(self, rows):
+        cols = export_columns(rows)
+        for name, node_id in zip(cols["sensor"], cols["nodeId"]):
+            if name not in self.sensors:
+                self.sensors[name] = len(self.sensors)
+                self.node_ids.append(node_id)
+        cols["sensor"] = [self.sensors[name] for name in cols["sensor"]]
+        cols["type"] = [self.types.setdefault(level, len(self.types)) for level in cols["type"]]
+        for name, dtype in self.COLUMNS:
+            self._spools[name].write(np.asarray(cols[name], dtype=dtype).tobytes())
+        self.count += len(rows)
+
+    def close(self):
+        import shutil
+        import zipfile
+        for spool in self._spools.values():
+            spool.close()
+        method = zipfile.ZIP_DEFLATED if self.compress else zipfile.ZIP_STORED
+        try:
+            with zipfile.ZipFile(self.path, "w", method, allowZip64=True) as archive:
+                for name, dtype in self.COLUMNS:
+                    with archive.open(name + ".npy", "w", force_zip64=True) as entry, open(self._spools[name].name, "rb") as spool:
+                        np.lib.format.write_array_header_1_0(entry, {"descr": np.lib.format.dtype_to_descr(np.dtype(dtype)),
+                                                                     "fortran_order": False, "shape": (self.count,)})
+                        shutil.copyfileobj(spool, entry)
+                for name, values in (("sensor_names", list(self.sensors)), ("sensor_node_ids", self.node_ids), ("types", list(self.types))):
+                    with archive.open(name + ".npy", "w") as entry:
+                        np.lib.format.write_array(entry, np.array(values, dtype=str))
+        finally:
+            self._dir.cleanup()
+
+# Export path without its format extension(s): the base of incremental part files
+def export_stem(path):
+    for ext in (".csv.gz", ".csv", ".parquet", ".npz"):
+        if path.endswith(ext):
+            return path[:-len(ext)]
+    return path
+
+# Stream the alarm history to a file in chunks of EXPORT_CHUNK alarms (constant memory). fmt: "csv", "parquet" or
+# "npz" (Parquet needs pyarrow and falls back to NPZ). sensors, start and end (microseconds since the epoch) filter
+# the alarms. An incremental export only takes the alarms added since the last incremental export to the same path
+# with the same filters, recorded in <path>.watermark.json: CSV is appended to, Parquet/NPZ get a part file
+# <name>-<first>-<last>.<ext>. A full export replaces the file and drops its watermark. Exported rows hold the alarm
+# state of their export; a later clear or acknowledgement appears in the next full export.
+def export_alarms(path, fmt="csv", compress=False, sensors=None, start=None, end=None, incremental=False):
+    if fmt == "parquet" and not import_pyarrow():
+        logger.warning("pyarrow is not installed (python3 -m pip install pyarrow), exporting NPZ instead.")
+        fmt = "npz"
+        path = export_stem(path) + ".npz"
+    if fmt == "npz" and load_numpy() is None:
+        logger.error("NPZ export needs NumPy (python3 -m pip install numpy).")
+        return None
+    stem = export_stem(path)
+    watermark_path = path + ".watermark.json"
+    watermark = {}
+    if os.path.exists(watermark_path):
+        try:
+            with open(watermark_path, "r", encoding="utf-8") as f:
+                watermark = json.load(f)
+        except (OSError, ValueError):
+            watermark = {}
+    filters = {"sensors": sorted(sensors) if sensors else None, "from": start, "to": end}
+    first = 0
+    if incremental and watermark.get("history") == file_path:
+        if watermark.get("filters") != filters:
+            logger.error("%s holds an incremental export with other sensor or time filters. "
+                     "Export to another file, or without the incremental option.", path)
+            return None
+        first = watermark.get("next_index", 0)
+
+    # Alarm indexes to visit: all from the watermark on, or the merged per-sensor indexes
+    with alarm_history.lock:
+        total = len(alarm_history["alarms"])
+        if sensors:
+            lists = [alarm_history.by_sensor.get(name, []) for name in sensors]
+            lists = [lst[bisect_left(lst, first):bisect_left(lst, total)] for lst in lists]
+    indexes = heapq.merge(*lists) if sensors else iter(range(first, total))
+    if incremental and first >= total:
+        logger.info("No new alarms since the last export to %s.", path)
+        return {"path": path, "rows": 0, "next_index": total}
+
+    if incremental and fmt != "csv":
+        path = f"{stem}-{first}-{total - 1}.{fmt}"
+    append = incremental and fmt == "csv" and first > 0
+    target = path if append else path + ".tmp"
+    writer = (CsvExportWriter(target, compress, append) if fmt == "csv" else
+              ParquetExportWriter(target, compress) if fmt == "parquet" else NpzExportWriter(target, compress))
+    rows_written = 0
+    started = time.perf_counter()
+    try:
+        while True:
+            chunk = list(itertools.islice(indexes, EXPORT_CHUNK))
+            if not chunk:
+                break
+            with alarm_history.lock:
+                alarms = alarm_history["alarms"]
+                rows = [alarm_row(alarms[i]) + (i,) for i in chunk]
+            if start is not None or end is not None:
+                rows = [row for row in rows if (start is None or parse_iso_us(row[0]) >= start) and (end is None or parse_iso_us(row[0]) < end)]
+            if rows:
+                writer.write(rows)
+                rows_written += len(rows)
+    finally:
+        writer.close()
+    if not append:
+        os.replace(target, path)
+    if incremental:
+        write_json_atomic(watermark_path, {"history": file_path, "filters": filters, "next_index": total,
+                                           "updated": iso(datetime.now(timezone.utc))})
+    elif os.path.exists(watermark_path):
+        os.remove(watermark_path)  # the file it described was replaced
+    elapsed = time.perf_counter() - started
+    logger.info("Exported %d alarms to %s in %.2f s.", rows_written, path, elapsed)
+    return {"path": path, "rows": rows_written, "next_index": total}
+
+# Menu option 5
+def export_alarm_history():
+    if not alarm_history.get("alarms"):
+        print("No alarm history to export.\n")
+        return
+    fmt = input("Format: csv (default), csv.gz, parquet or npz: ").strip().lower() or "csv"
+    if fmt not in ("csv", "csv.gz", "parquet", "npz"):
+        print("Unknown format.")
+        return
+    incremental = input("Only alarms added since the last export? [y/N]: ").strip().lower() == "y"
+    sensors = [name.strip() for name in input("Sensors (comma separated, empty = all): ").split(",") if name.strip()]
+    try:
+        start = input("From (ISO 8601, empty = beginning): ").strip()
+        end = input("To (ISO 8601, empty = now): ").strip()
+        start = parse_iso_us(start) if start else None
+        end = parse_iso_us(end) if end else None
+    except ValueError:
+        print("Invalid time.")
+        return
+
+    # Export file path - same as json
+    path = os.path.splitext(file_path)[0] + "." + fmt
+    try:
+        export_alarms(path, "csv" if fmt == "csv.gz" else fmt, fmt in ("csv.gz", "parquet", "npz"), sensors or None, start, end, incremental)
+    except Exception as e:
+        logger.error("Failed to export alarm history: %s", e)
+
+
+        # === Historian ===
+
+# Fixed-width little-endian records; timestamps are microseconds since the epoch (UTC), as in to_us()
+SAMPLE_RECORD = struct.Struct("<qdI4x")    # timestamp, value, OPC UA StatusCode
+ROLLUP_RECORD = struct.Struct("<qdddI4x")  # bucket start, min, max, avg, sample count
+# Tier -> (bucket length, segment file span), in microseconds
+HISTORY_TIERS = {
+    "raw": (0, 3600 * 10**6),
+    "1s": (10**6, 86400 * 10**6),
+    "1m": (60 * 10**6, 7 * 86400 * 10**6),
+    "1h": (3600 * 10**6, 366 * 86400 * 10**6),
+}
+ROLLUP_TIERS = ("1s", "1m", "1h")
+STATUS_BAD = 0x80000000  # quality stored for samples that are not numeric
+SAMPLE_DTYPE = ROLLUP_DTYPE = None  # NumPy record dtypes, set by load_numpy
+
+# Directory name of a sensor in the history directory
+def history_dirname(name):
+    return "".join(c if c.isalnum() or c in "-_." else "_" for c in name)
+
+# Start times of the segment files in a tier directory, sorted
+def list_segments(directory):
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    return sorted(int(n[:-4]) for n in names if n.endswith(".seg"))
+
+# Read-only mapping of a segment file trimmed to whole records (a crash can leave a torn record at the end)
+def map_segment(path, record_size):
+    import mmap
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size // record_size * record_size
+        if size == 0:
+            return None
+        return memoryview(mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ))
+
+# Append-only segment files of one sensor and tier (<tier>/<segment start>.seg); records are buffered in memory
+# until the historian thread writes them
+class SegmentWriter:
+    __slots__ = ("directory", "span", "record_size", "segment", "end", "buffer", "ready", "created")
+
+    def __init__(self, directory, span, record_size):
+        self.directory = directory
+        self.span = span
+        self.record_size = record_size
+        self.segment = self.end = None
+        self.buffer = bytearray()
+        self.ready = []  # (segment start, records) of segments the buffer has moved past
+        self.created = False
+
+    def append(self, t, record):
+        if self.segment is None or not self.segment <= t < self.end:
+            if self.buffer:
+                self.ready.append((self.segment, self.buffer))
+                self.buffer = bytearray()
+            self.segment = t - t % self.span
+            self.end = self.segment + self.span
+        self.buffer += record
+
+    # Buffered records as (segment start, records) chunks; the caller writes them
+    def take(self):
+        chunks = self.ready
+        if self.buffer:
+            chunks.append((self.segment, self.buffer))
+        self.ready, self.buffer = [], bytearray()
+        return chunks
+
+    def write(self, chunks):
+        if not self.created:
+            os.makedirs(self.directory, exist_ok=True)
+            self.created = True
+        written = 0
+        for segment, records in chunks:
+            fd = os.open(os.path.join(self.directory, f"{segment}.seg"), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+            try:
+                size = os.fstat(fd).st_size
+                if size % self.record_size:
+                    os.ftruncate(fd, size - size % self.record_size)
+                view = memoryview(records)
+                while view:
+                    view = view[os.write(fd, view):]
+            finally:
+                os.close(fd)
+            written += len(records)
+        return written
+
+# Samples of one sensor: raw records plus open 1 s / 1 min / 1 h buckets, each closed bucket rolled into the next tier
+class SensorHistory:
+    __slots__ = ("name", "directory", "writers", "buckets", "last_t", "samples", "out_of_order")
+
+    def __init__(self, directory, name):
+        self.name = name
+        self.directory = directory
+        self.writers = {
+            tier: SegmentWriter(os.path.join(directory, tier), span, SAMPLE_RECORD.size if tier == "raw" else ROLLUP_RECORD.size)
+            for tier, (_, span) in HISTORY_TIERS.items()
+        }
+        self.buckets = [None] * len(ROLLUP_TIERS)  # [start, min, max, sum, count] per rollup tier
+        self.samples = 0
+        self.out_of_order = 0
+        # Segments must stay sorted by time: continue after the last sample on disk
+        self.last_t = NO_TIME
+        raw = self.writers["raw"].directory
+        for segment in reversed(list_segments(raw)):
+            view = map_segment(os.path.join(raw, f"{segment}.seg"), SAMPLE_RECORD.size)
+            if view is not None:
+                self.last_t = SAMPLE_RECORD.unpack_from(view, len(view) - SAMPLE_RECORD.size)[0]
+                break
+
+    def append(self, t, value, quality=0):
+        if t < self.last_t:
+            self.out_of_order += 1
+            return
+        if value is None:
+            value, quality = math.nan, quality or STATUS_BAD
+        self.last_t = t
+        self.samples += 1
+        self.writers["raw"].append(t, SAMPLE_RECORD.pack(t, value, quality))
+        # Only good, numeric samples go into the rollups
+        if not quality & 0xC0000000 and value == value:
+            self._roll(0, t - t % 10**6, value, value, value, 1)
+
+    def _roll(self, level, start, low, high, total, count):
+        bucket = self.buckets[level]
+        if bucket is not None and bucket[0] != start:
+            self._close(level)
+            bucket = None
+        if bucket is None:
+            self.buckets[level] = [start, low, high, total, count]
+        else:
+            if low < bucket[1]:
+                bucket[1] = low
+            if high > bucket[2]:
+                bucket[2] = high
+            bucket[3] += total
+            bucket[4] += count
+
+    def _close(self, level):
+        start, low, high, total, count = self.buckets[level]
+        self.buckets[level] = None
+        self.writers[ROLLUP_TIERS[level]].append(start, ROLLUP_RECORD.pack(start, low, high, total / count, count))
+        if level + 1 < len(ROLLUP_TIERS):
+            width = HISTORY_TIERS[ROLLUP_TIERS[level + 1]][0]
+            self._roll(level + 1, start - start % width, low, high, total, count)
+
+    # Records of the tier's buckets that are still open, including samples not rolled up from lower tiers yet
+    def open_buckets(self, level):
+        width = HISTORY_TIERS[ROLLUP_TIERS[level]][0]
+        merged = {}
+        for bucket in self.buckets[:level + 1]:
+            if bucket is None:
+                continue
+            start = bucket[0] - bucket[0] % width
+            low, high, total, count = merged.get(start, (math.inf, -math.inf, 0.0, 0))
+            merged[start] = (min(low, bucket[1]), max(high, bucket[2]), total + bucket[3], count + bucket[4])
+        return [ROLLUP_RECORD.pack(start, low, high, total / count, count) for start, (low, high, total, count) in sorted(merged.items())]
+
+    # Write out the partial buckets (end of a run); a later run continuing the same bucket adds a second record for it
+    def close_buckets(self):
+        for level in range(len(ROLLUP_TIERS)):
+            if self.buckets[level] is not None:
+                self._close(level)
+
+# Sample history of all sensors in fixed-width segment files, written in batches by a background thread.
+# Reads map the segments read-only: with NumPy they return structured arrays (zero-copy when the range fits in one
+# segment), otherwise lists of tuples.
+class Historian:
+    def __init__(self, directory, names, flush_interval=5.0, background=True):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.series = {name: SensorHistory(os.path.join(directory, history_dirname(name)), name) for name in names}
+        self.bytes_written = 0
+        self.flushes = 0
+        self._lock = threading.Lock()     # write buffers and open buckets
+        self._io_lock = threading.Lock()  # segment files (taken before _lock)
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._thread = None
+        if background:  # otherwise the owner calls flush() every flush_interval
+            self._thread = threading.Thread(target=self._run, name="historian", daemon=True)
+            self._thread.start()
+
+    # Start histories for sensors added by a config reload
+    def add(self, names):
+        with self._lock:
+            for name in names:
+                if name not in self.series:
+                    self.series[name] = SensorHistory(os.path.join(self.directory, history_dirname(name)), name)
+
+    # Queue one sample; value None records a NaN with a bad quality
+    def append(self, name, t, value, quality=0):
+        series = self.series.get(name)
+        if series is not None:
+            with self._lock:
+                series.append(t, value, quality)
+
+    # Write buffered records of all sensors (or of the given ones) to their segment files
+    def flush(self, names=None):
+        with self._io_lock:
+            with self._lock:
+                selected = self.series.values() if names is None else [self.series[n] for n in names if n in self.series]
+                pending = [(writer, writer.take()) for series in selected for writer in series.writers.values()
+                           if writer.buffer or writer.ready]
+            for writer, chunks in pending:
+                self.bytes_written += writer.write(chunks)
+            self.flushes += 1
+
+    # Records of a sensor with start <= t < end (microseconds since the epoch) from one tier ("raw", "1s", "1m", "1h").
+    # Rollup results include the still open bucket and merge buckets that were written in two parts.
+    def read(self, name, start, end, tier="raw"):
+        series = self.series[name]
+        record = SAMPLE_RECORD if tier == "raw" else ROLLUP_RECORD
+        span = HISTORY_TIERS[tier][1]
+        self.flush([name])
+        directory = series.writers[tier].directory
+        parts = []
+        with self._io_lock:
+            for segment in list_segments(directory):
+                if segment + span <= start or segment >= end:
+                    continue
+                view = map_segment(os.path.join(directory, f"{segment}.seg"), record.size)
+                if view is not None:
+                    parts.append(self._slice(view, record, start, end))
+        if tier != "raw":
+            with self._lock:
+                open_records = series.open_buckets(ROLLUP_TIERS.index(tier))
+            if open_records:
+                parts.append(self._slice(memoryview(b"".join(open_records)), record, start, end))
+        if load_numpy() is not None:
+            dtype = SAMPLE_DTYPE if tier == "raw" else ROLLUP_DTYPE
+            parts = [p for p in parts if len(p)]
+            records = parts[0] if len(parts) == 1 else np.concatenate(parts) if parts else np.empty(0, dtype)
+            return records if tier == "raw" else merge_rollups(records)
+        records = [r for p in parts for r in p]
+        return records if tier == "raw" else merge_rollups(records)
+
+    # Records of a mapped segment in [start, end), found by binary search on the timestamps
+    @staticmethod
+    def _slice(view, record, start, end):
+        if load_numpy() is not None:
+            records = np.frombuffer(view, SAMPLE_DTYPE if record is SAMPLE_RECORD else ROLLUP_DTYPE)
+            lo, hi = np.searchsorted(records["t"], (start, end))
+            return records[lo:hi]
+        count = len(view) // record.size
+
+        def bisect(t):
+            lo, hi = 0, count
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if struct.unpack_from("<q", view, mid * record.size)[0] < t:
+                    lo = mid + 1
+                else:
+                    hi = mid
+            return lo
+
+        lo, hi = bisect(start), bisect(end)
+        return list(record.iter_unpack(view[lo * record.size:hi * record.size]))
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error("Failed to write sample history: %s", e)
+
+    # Close the open buckets and write everything
+    def close(self):
+        self._closed = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+        with self._lock:
+            for series in self.series.values():
+                series.close_buckets()
+        self.flush()
+
+    def counters(self):
+        return {
+            "samples": sum(s.samples for s in self.series.values()),
+            "out_of_order": sum(s.out_of_order for s in self.series.values()),
+            "bytes_written": self.bytes_written,
+            "flushes": self.flushes,
+        }
+
+# Combine adjacent rollup records with the same bucket start (a bucket split across two runs)
+def merge_rollups(records):
+    if np is not None:
+        if len(records) < 2 or not (records["t"][1:] == records["t"][:-1]).any():
+            return records
+        starts = np.flatnonzero(np.r_[True, records["t"][1:] != records["t"][:-1]])
+        merged = np.empty(len(starts), ROLLUP_DTYPE)
+        merged["t"] = records["t"][starts]
+        merged["min"] = np.minimum.reduceat(records["min"], starts)
+        merged["max"] = np.maximum.reduceat(records["max"], starts)
+        merged["count"] = np.add.reduceat(records["count"], starts)
+        merged["avg"] = np.add.reduceat(records["avg"] * records["count"], starts) / merged["count"]
+        return merged
+    merged = []
+    for t, low, high, avg, count in records:
+        if merged and merged[-1][0] == t:
+            _, low0, high0, avg0, count0 = merged[-1]
+            total = count0 + count
+            merged[-1] = (t, min(low0, low), max(high0, high), (avg0 * count0 + avg * count) / total, total)
+        else:
+            merged.append((t, low, high, avg, count))
+    return merged
+
+
+        # === Ingest pipeline ===
+
+# Bounded FIFO with an overflow policy: block, drop_oldest or coalesce. Coalescing only happens once the queue is
+# full: a put then replaces the item already queued for its key; below maxsize every item is kept
+class BoundedQueue:
+    def __init__(self, maxsize, policy="drop_oldest"):
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy '{policy}'")
+        self.maxsize = maxsize
+        self.policy = policy
+        self.closed = False
+        self.enqueued = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.max_depth = 0
+        self._items = deque()  # [key, item] entries
+        self._latest = {}      # key -> queued entry (coalesce policy)
+        self._cond = threading.Condition()
+
+    def put(self, key, item):
+        with self._cond:
+            if self.policy == "coalesce" and len(self._items) >= self.maxsize:
+                entry = self._latest.get(key)
+                if entry is not None:
+                    entry[1] = item
+                    self.coalesced += 1
+                    return
+            while len(self._items) >= self.maxsize:
+                if self.policy == "block" and not self.closed:
+                    self._cond.wait()
+                    continue
+                old = self._items.popleft()
+                self.dropped += 1
+                if self._latest.get(old[0]) is old:
+                    del self._latest[old[0]]
+            entry = [key, item]
+            self._items.append(entry)
+            if self.policy == "coalesce":
+                self._latest[key] = entry
+            self.enqueued += 1
+            if len(self._items) > self.max_depth:
+                self.max_depth = len(self._items)
+            self._cond.notify_all()
+
+    # Take up to max_items entries; returns an empty list once closed and drained
+    def get_batch(self, max_items):
+        with self._cond:
+            while not self._items and not self.closed:
+                self._cond.wait()
+            batch = []
+            while self._items and len(batch) < max_items:
+                entry = self._items.popleft()
+                if self._latest.get(entry[0]) is entry:
+                    del self._latest[entry[0]]
+                batch.append(entry)
+            self._cond.notify_all()
+            return batch
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    def __len__(self):
+        return len(self._items)
+
+# Samples are enqueued by the subscription thread; workers run statistics/alarms and dashboard fan-out
+class IngestPipeline:
+    def __init__(self, queue_size, overflow_policy, batch_alarms=False):
+        self.evaluator = self.new_evaluator(batch_alarms)
+        self.samples = BoundedQueue(queue_size, overflow_policy)
+        self.events = BoundedQueue(queue_size, "drop_oldest")
+        self.processed = 0
+        self.errors = 0
+        self.lock = threading.Lock()  # held while a batch is processed; config reloads take it to change the model
+        self._threads = [
+            threading.Thread(target=self._run_samples, name="ingest-worker", daemon=True),
+            threading.Thread(target=self._run_events, name="fanout-worker", daemon=True),
+        ]
+        for t in self._threads:
+            t.start()
+
+    @staticmethod
+    def new_evaluator(batch_alarms):
+        if not batch_alarms:
+            return None
+        if load_numpy() is None:
+            logger.warning("[WARNING] NumPy is not installed, alarms are evaluated per sample.")
+            return None
+        return BatchAlarmEvaluator(runtime.values())
+
+    def put(self, rt, value, now_ts, quality=0):
+        self.samples.put(rt, (value, now_ts, quality))
+
+    def publish(self, event, payload):
+        self.events.put(event, payload)
+
+    def process_batch(self, batch):
+        with self.lock:
+            evaluator = self.evaluator
+            alarm_batch = []
+            for rt, (value, now_ts, quality) in batch:
+                if rt.removed:
+                    continue
+                try:
+                    num = process_sample(rt, value, now_ts, evaluate_alarms=evaluator is None, quality=quality)
+                    if num is not None and evaluator is not None:
+                        alarm_batch.append((rt, num, now_ts))
+                except Exception as e:
+                    self.errors += 1
+                    logger.error("Failed to process sample for %s: %s", rt.name, e)
+            if alarm_batch:
+                started = time.perf_counter()
+                try:
+                    evaluator.evaluate(alarm_batch)
+                    metrics.check_levels["batch"].observe(time.perf_counter() - started)
+                except Exception as e:
+                    self.errors += 1
+                    logger.error("Failed to evaluate alarms for %d samples: %s", len(alarm_batch), e)
+        self.processed += len(batch)
+
+    def _run_samples(self):
+        while True:
+            batch = self.samples.get_batch(PIPELINE_BATCH_SIZE)
+            if not batch:
+                return
+            self.process_batch(batch)
+
+    def _run_events(self):
+        while True:
+            batch = self.events.get_batch(PIPELINE_BATCH_SIZE)
+            if not batch:
+                return
+            for event, payload in batch:
+                try:
+                    emit_timed(event, payload)
+                except Exception as e:
+                    logger.error("Failed to emit %s: %s", event, e)
+
+    # Drain the sample queue, then the fan-out queue
+    def stop(self):
+        self.samples.close()
+        self._threads[0].join()
+        if self.evaluator is not None:
+            self.evaluator.store_states()
+        self.events.close()
+        self._threads[1].join()
+
+    def counters(self):
+        return {
+            "queue_depth": len(self.samples),
+            "max_queue_depth": self.samples.max_depth,
+            "enqueued": self.samples.enqueued,
+            "processed": self.processed,
+            "dropped": self.samples.dropped,
+            "coalesced": self.samples.coalesced,
+            "errors": self.errors,
+            "fanout_dropped": self.events.dropped,
+        }
+
+        # === Dashboard broadcaster ===
+
+# Collects the latest value per sensor and sends only the changed ones, at most frame_rate times per second
+class DashboardBroadcaster:
+    def __init__(self):
+        self.frame_rate = dashboard_settings["frame_rate"]
+        self.compact = dashboard_settings["compact"]
+        self.frames = 0
+        self.messages = 0
+        self._values = {}   # last broadcast value per sensor
+        self._dirty = {}    # changes since the last frame
+        self._index = {}    # sensor name -> index used by the compact encoding
+        self._filters = {}  # sid -> sensor names (clients that only display some sensors)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="dashboard-broadcaster", daemon=True)
+            self._thread.start()
+
+    def update(self, name, value):
+        with self._lock:
+            self._dirty[name] = value
+
+    def subscribe(self, sid, names):
+        with self._lock:
+            if names:
+                self._filters[sid] = set(names)
+            else:
+                self._filters.pop(sid, None)
+
+    def unsubscribe(self, sid):
+        with self._lock:
+            self._filters.pop(sid, None)
+
+    # Full state for a newly connected (or re-subscribed) client
+    def snapshot(self, names=None):
+        with self._lock:
+            values = dict(self._values)
+            values.update(self._dirty)
+            for name in values:
+                self._index.setdefault(name, len(self._index))
+            sensor_names = sorted(self._index, key=self._index.get)
+        if names:
+            values = {n: v for n, v in values.items() if n in names}
+        return {"sensors": sensor_names, "values": values, "compact": self.compact}
+
+    # Compact frames send parallel index/value lists; names appear once, when first indexed
+    def encode(self, delta, with_names=False):
+        if not self.compact:
+            return delta
+        frame = {"i": [], "v": []}
+        new_names = {}
+        for name, value in delta.items():
+            idx = self._index.get(name)
+            if idx is None:
+                idx = self._index[name] = len(self._index)
+                new_names[name] = idx
+            elif with_names:
+                new_names[name] = idx
+            frame["i"].append(idx)
+            frame["v"].append(round(value, DECIMALS) if isinstance(value, float) else value)
+        if new_names:
+            frame["n"] = new_names
+        return frame
+
+    # Frames with the changes since the previous call: [(frame, room or sid)]
+    def take_frames(self):
+        with self._lock:
+            delta, self._dirty = self._dirty, {}
+            if not delta:
+                return []
+            self._values.update(delta)
+            frames = [(self.encode(delta), "all")]
+            for sid, names in self._filters.items():
+                part = {n: v for n, v in delta.items() if n in names}
+                if part:
+                    frames.append((self.encode(part, with_names=True), sid))
+        self.frames += 1
+        return frames
+
+    def flush(self):
+        try:
+            for frame, to in self.take_frames():
+                emit_timed("update", frame, to=to)
+                self.messages += 1
+        except Exception as e:
+            logger.error("Failed live emit: %s.", e)
+
+    def _run(self):
+        while True:
+            time.sleep(1.0 / max(self.frame_rate, 0.1))
+            self.flush()
+
+dashboard = DashboardBroadcaster()
+
+# Clients start in the "all" room and can narrow it down to the sensors they display
+@on_socket("connect")
+def on_connect():
+    join_room("all")
+    socketio.emit("snapshot", dashboard.snapshot(), to=request.sid)
+
+@on_socket("subscribe")
+def on_subscribe(data):
+    names = (data or {}).get("sensors") or []
+    dashboard.subscribe(request.sid, names)
+    if names:
+        leave_room("all")
+    else:
+        join_room("all")
+    socketio.emit("snapshot", dashboard.snapshot(names), to=request.sid)
+
+@on_socket("disconnect")
+def on_disconnect(*args):
+    dashboard.unsubscribe(request.sid)
+
+# Send a dashboard event through the fan-out worker (inline when no pipeline is running)
+def publish(event, payload):
+    if outbox is not None:
+        return  # shard worker: the coordinator publishes
+    if pipeline is not None:
+        pipeline.publish(event, payload)
+        return
+    try:
+        emit_timed(event, payload)
+    except Exception as e:
+        logger.error("Failed to emit %s: %s", event, e)
+
+def emit_timed(event, payload, **kwargs):
+    if socketio is None:
+        return  # no web server
+    started = time.perf_counter()
+    socketio.emit(event, payload, **kwargs)
+    metrics.emit_histogram(event).observe(time.perf_counter() - started)
+
+
+        # === History API ===
+
+API_CACHE_SIZE = 256   # cached responses
+DEFAULT_POINTS = 500   # series points when ?points= is not given
+MAX_POINTS = 10000
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# Small thread-safe LRU cache: key -> (etag, body)
+class ResponseCache:
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+api_cache = ResponseCache(API_CACHE_SIZE)
+
+class BadRequest(ValueError):
+    pass
+
+# JSON response built once per cache key (the key includes the data revision), with ETag/Last-Modified revalidation
+def cached_json(key, last_modified, build):
+    import hashlib
+    entry = api_cache.get(key)
+    if entry is None:
+        body = json.dumps(build(), separators=(",", ":"))
+        entry = (hashlib.blake2b(body.encode(), digest_size=16).hexdigest(), body)
+        api_cache.put(key, entry)
+    etag, body = entry
+    response = app.response_class(body, mimetype="application/json")
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+def error_json(status, message):
+    return app.response_class(json.dumps({"error": message}), status=status, mimetype="application/json")
+
+# Query time: ISO 8601 or epoch milliseconds -> microseconds since the epoch
+def parse_time_param(name):
+    text = request.args.get(name, "").strip()
+    if not text:
+        return None
+    try:
+        return round(float(text) * 1000)
+    except ValueError:
+        pass
+    try:
+        return to_us(datetime.fromisoformat(text.replace("Z", "+00:00")))
+    except ValueError:
+        raise BadRequest(f"'{name}' must be an ISO 8601 time or epoch milliseconds")
+
+def parse_int_param(name, default, low, high):
+    text = request.args.get(name, "").strip()
+    if not text:
+        return default
+    try:
+        return max(low, min(int(text), high))
+    except ValueError:
+        raise BadRequest(f"'{name}' must be an integer")
+
+def parse_bool_param(name):
+    text = request.args.get(name, "").strip().lower()
+    if not text:
+        return None
+    if text in ("1", "true", "yes"):
+        return True
+    if text in ("0", "false", "no"):
+        return False
+    raise BadRequest(f"'{name}' must be true or false")
+
+# Largest-Triangle-Three-Buckets: indices of `points` samples that keep the visual shape of the series
+def lttb_indices(t, v, points):
+    n = len(t)
+    if points >= n or points < 3:
+        return list(range(n)) if points >= n else [0, n - 1][:points]
+    selected = [0]
+    width = (n - 2) / (points - 2)
+    a = 0
+    for k in range(points - 2):
+        start, end = int(k * width) + 1, int((k + 1) * width) + 1
+        # Average point of the next bucket (the last point for the last bucket)
+        nstart, nend = end, min(int((k + 2) * width) + 1, n - 1)
+        if nstart >= nend:
+            nstart, nend = n - 1, n
+        avg_t = sum(t[nstart:nend]) / (nend - nstart)
+        avg_v = sum(v[nstart:nend]) / (nend - nstart)
+        ta, va = t[a], v[a]
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            area = abs((ta - avg_t) * (v[j] - va) - (ta - t[j]) * (avg_v - va))
+            if area > best_area:
+                best, best_area = j, area
+        selected.append(best)
+        a = best
+    selected.append(n - 1)
+    return selected
+
+# Min and max sample of each of points / 2 buckets, in time order
+def minmax_indices(v, points):
+    n = len(v)
+    buckets = max(1, points // 2)
+    if n <= points:
+        return list(range(n))
+    selected = []
+    for k in range(buckets):
+        start, end = k * n // buckets, (k + 1) * n // buckets
+        chunk = v[start:end]
+        low = start + chunk.index(min(chunk))
+        high = start + chunk.index(max(chunk))
+        selected.extend(sorted({low, high}))
+    return selected
+
+# Merge consecutive rollup rows (t, min, max, avg, count) into at most `points` rows
+def merge_rollup_rows(rows, points):
+    n = len(rows)
+    if n <= points:
+        return rows
+    merged = []
+    for k in range(points):
+        group = rows[k * n // points:(k + 1) * n // points]
+        count = sum(r[4] for r in group)
+        merged.append((group[0][0], min(r[1] for r in group), max(r[2] for r in group),
+                       sum(r[3] * r[4] for r in group) / count, count))
+    return merged
+
+# Coarsest history tier that still has `points` buckets in the range ("raw" for short ranges)
+def pick_tier(start, end, points):
+    for tier in reversed(ROLLUP_TIERS):
+        if (end - start) // HISTORY_TIERS[tier][0] >= points:
+            return tier
+    return "raw"
+
+# Series of a sensor with start <= t <= end (microseconds), from the historian when it runs, else the in-memory window
+def build_series(rt, start, end, points, method):
+    result = {"sensor": rt.name, "unit": rt.unit, "from": iso(from_us(start)), "to": iso(from_us(end)), "method": method}
+    if historian is not None and rt.name in historian.series:
+        tier = pick_tier(start, end, points)
+        rows = historian.read(rt.name, start, end + 1, tier)
+        rows = [tuple(r) for r in rows.tolist()] if np is not None else rows
+        result["source"] = tier
+        if tier != "raw":
+            rows = merge_rollup_rows(rows, points)
+            result["count"] = len(rows)
+            result["t"] = [r[0] / 1000 for r in rows]
+            result["v"] = [r[3] for r in rows]
+            result["min"] = [r[1] for r in rows]
+            result["max"] = [r[2] for r in rows]
+            return result
+        rows = [r for r in rows if r[1] == r[1]]  # skip samples without a numeric value
+        times, values = [r[0] for r in rows], [r[1] for r in rows]
+    else:
+        result["source"] = "memory"
+        times, values = rt.buffer.snapshot()
+        if load_numpy() is not None:
+            t_arr, v_arr = np.frombuffer(times, dtype=np.int64), np.frombuffer(values, dtype=np.float64)
+            keep = (t_arr >= start) & (t_arr <= end)
+            times, values = t_arr[keep].tolist(), v_arr[keep].tolist()
+        else:
+            keep = [i for i, t in enumerate(times) if start <= t <= end]
+            times, values = [times[i] for i in keep], [values[i] for i in keep]
+    result["count"] = len(times)
+    selected = lttb_indices(times, values, points) if method == "lttb" else minmax_indices(values, points)
+    result["t"] = [times[i] / 1000 for i in selected]
+    result["v"] = [values[i] for i in selected]
+    return result
+
+# Sensors from the configuration with their active alarm levels
+@route("/api/sensors")
+def api_sensors():
+    def build():
+        active = alarm_history.active_levels()
+        return {"sensors": [{
+            "name": rt.name,
+            "nodeId": rt.config["nodeId"],
+            "endpoint": rt.config.get("endpoint", ENDPOINT),
+            "unit": rt.unit,
+            "scanRate": rt.config["scanRate"],
+            "deadband": rt.deadband,
+            "alarms": rt.config.get("alarms", {}),
+            "window": rt.buffer.maxlen,
+            "activeAlarms": sorted(active.get(rt.name, ())),
+        } for rt in runtime.values()]}
+    return cached_json(("sensors", config_revision, alarm_revision), alarm_modified, build)
+
+# /api/sensors/<name>/series?from=&to=&points=&method=lttb|minmax (times as ISO 8601 or epoch ms; default: the
+# sample window up to the last sample). Returns column arrays: t (epoch ms) and v, plus min/max from rollups.
+@route("/api/sensors/<name>/series")
+def api_series(name):
+    rt = runtime_by_name.get(name)
+    if rt is None:
+        return error_json(404, f"Unknown sensor '{name}'")
+    try:
+        start, end = parse_time_param("from"), parse_time_param("to")
+        points = parse_int_param("points", DEFAULT_POINTS, 2, MAX_POINTS)
+    except BadRequest as e:
+        return error_json(400, str(e))
+    method = request.args.get("method", "lttb")
+    if method not in ("lttb", "minmax"):
+        return error_json(400, "'method' must be lttb or minmax")
+    last_val, last_ts = last_values.get(name, (None, None))
+    if end is None:
+        end = to_us(last_ts) if last_ts is not None else to_us(datetime.now(timezone.utc))
+    if start is None:
+        start = end - int(rt.buffer.maxlen * sample_interval(rt.config) * 1000)
+    if start > end:
+        return error_json(400, "'from' must not be after 'to'")
+    last_modified = last_ts.replace(tzinfo=last_ts.tzinfo or timezone.utc) if last_ts is not None else None
+    key = ("series", name, start, end, points, method, config_revision, rt.revision, historian is not None)
+    return cached_json(key, last_modified, lambda: build_series(rt, start, end, points, method))
+
+# /api/alarms?sensor=&type=&active=&acknowledged=&page=&pageSize= - newest first; "index" is the position used
+# for acknowledgement
+@route("/api/alarms")
+def api_alarms():
+    try:
+        active = parse_bool_param("active")
+        acknowledged = parse_bool_param("acknowledged")
+        page = parse_int_param("page", 1, 1, 10**9)
+        page_size = parse_int_param("pageSize", DEFAULT_PAGE_SIZE, 1, MAX_PAGE_SIZE)
+    except BadRequest as e:
+        return error_json(400, str(e))
+    sensor = request.args.get("sensor") or None
+    level = request.args.get("type") or None
+
+    def build():
+        total, selected = alarm_history.query(sensor, level, active, acknowledged, (page - 1) * page_size, page_size)
+        alarms = alarm_history["alarms"]
+        return {
+            "total": total,
+            "page": page,
+            "pageSize": page_size,
+            "pages": (total + page_size - 1) // page_size,
+            "alarms": [dict(alarms[i], index=i) for i in selected],
+        }
+    key = ("alarms", sensor, level, active, acknowledged, page, page_size, config_revision, alarm_revision)
+    return cached_json(key, alarm_modified, build)
+
+# Bulk acknowledgement: {"indexes": [...]} or the unacknowledged alarms matching {"sensor", "type"} (all without
+# filters). Uses the session of the running simulation; without one the alarms are acknowledged locally only.
+@route("/api/alarms/acknowledge", methods=["POST"])
+def api_acknowledge_alarms():
+    denied = write_access_error()
+    if denied is not None:
+        return denied
+    body = request.get_json(silent=True) or {}
+    if "indexes" in body:
+        indexes = body["indexes"]
+        if not isinstance(indexes, list) or not all(isinstance(i, int) and not isinstance(i, bool) for i in indexes):
+            return error_json(400, "'indexes' must be a list of integers")
+    else:
+        indexes = alarm_history.query(body.get("sensor"), body.get("type"), acknowledged=False)[1]
+    comment = str(body.get("comment") or "Acknowledge via client")
+    try:
+        client = running_client()
+    except SessionUnavailable as e:
+        return error_json(503, str(e))
+    acknowledged = acknowledge_alarms(indexes, client, comment)
+    return {"acknowledged": sorted(acknowledged), "count": len(acknowledged)}
+
+
+        # === Subscription handler ===
+
+# Status line with the rolling statistics, at most one per sensor per status interval
+def log_status(rt, num):
+    if not logger.isEnabledFor(logging.INFO):
+        return
+    rt.samples_since_log += 1
+    t = time.monotonic()
+    if t - rt.last_status_log < log_settings["status_interval"]:
+        return
+    buf = rt.buffer
+    min_val, max_val, avg_val = buf.min(), buf.max(), buf.mean()
+    samples = rt.samples_since_log
+    suffix = f" [{samples} samples]" if samples > 1 else ""
+    logger.info(
+        "%s = %s %s | Min: %s, Max: %s, Avg: %s (buffer %d/%d)%s",
+        rt.name, fmt_num(num), rt.unit, fmt_num(min_val), fmt_num(max_val), fmt_num(avg_val), len(buf), buf.maxlen, suffix,
+        extra={"sensor": rt.name, "value": num, "min": min_val, "max": max_val, "avg": avg_val, "samples": samples}
+    )
+    rt.last_status_log = t
+    rt.samples_since_log = 0
+
+# History, statistics, trend and alarm evaluation for one sample (runs on the ingest worker); returns the numeric value
+def process_sample(rt, val, now_ts, evaluate_alarms=True, quality=0):
+    num = normalize_number(val)
+    if num is not None and not math.isfinite(num):
+        num = None  # NaN/inf would poison the window sums
+    t = to_us(now_ts)
+    if historian is not None:
+        historian.append(rt.name, t, num, quality)
+    if outbox is not None:
+        outbox.sample(rt, t, num, quality)
+    if num is not None:
+        if rt.hold_us:
+            rt.buffer.hold(t, rt.hold_us)
+        rt.buffer.append(num, t)
+        rt.revision += 1
+    else:
+        logger.warning("[WARNING] Invalid data type received for %s: %s (%s)", rt.name, val, type(val).__name__)
+        return None
+
+    log_status(rt, num)
+    last_val, last_ts = last_values.get(rt.name, (None, None))
+    prev_values[rt.name] = (last_val, last_ts)
+    last_values[rt.name] = (num, now_ts)
+
+    dashboard.update(rt.name, num)
+
+    check_trend(rt, num, now_ts)
+    if evaluate_alarms:
+        started = time.perf_counter()
+        check_levels(rt, num, now_ts)
+        metrics.check_levels["sample"].observe(time.perf_counter() - started)
+    return num
+
+# Handle data change notifications from server: timestamp and enqueue only
+class SubHandler:
+    def lookup(self, node):
+        return runtime.get(node.nodeid)
+
+    def datachange_notification(self, node, val, data):
+        global stop_monitoring
+        if stop_monitoring:
+            return
+
+        started = time.perf_counter()
+        rt = self.lookup(node)
+        if rt is None:
+            return
+        rt.notifications += 1
+
+        data_value = getattr(getattr(data, "monitored_item", None), "Value", None)
+        src_ts = getattr(data_value, "SourceTimestamp", None)
+        now_ts = src_ts if isinstance(src_ts, datetime) else datetime.now(timezone.utc)
+        status = getattr(data_value, "StatusCode", None)
+        quality = getattr(status, "value", 0)
+
+        if rt.backfill_t is not None:
+            backfilled, rt.backfill_t = rt.backfill_t, None
+            if backfilled == to_us(now_ts):
+                return  # already ingested by the reconnect backfill
+
+        if pipeline is not None:
+            pipeline.put(rt, val, now_ts, quality)
+        else:
+            process_sample(rt, val, now_ts, quality=quality)
+        metrics.notification_seconds.observe(time.perf_counter() - started)
+
+    # Subscription status from the server, e.g. BadTimeout when the subscription expired
+    def status_change_notification(self, status):
+        logger.warning("[WARNING] Subscription status changed: %s", status.name)
+        if supervisor is not None and not status.is_good():
+            supervisor.trigger(f"subscription status {status.name}")
+
+
+        # === Connect to OPC UA server ===
+
+# Connect to OPC UA with a retry logic
+def connect_to_opcua():
+    client = Client(ENDPOINT)
+    logger.info("Anonymous connection enabled.")
+    for attempt in range(1, MAX_RETRIES + 1):
+        try:
+            client.connect()
+            logger.info("Successfully connected to %s.", ENDPOINT)
+            return client
+        except Exception as e:
+            logger.warning("Connection failed (attempt %d/%d): %s", attempt, MAX_RETRIES, e)
+            if stop_requested(RETRY_DELAY):
+                return None
+    logger.error("Unable to connect after multiple attempts.")
+    return None
+
+# Exponential backoff with jitter: a random delay in [d/2, d], d doubling per attempt up to backoffMax
+def backoff_delay(attempt):
+    delay = min(connection_settings["backoff_max"], connection_settings["backoff_initial"] * 2 ** (attempt - 1))
+    return random.uniform(delay / 2, delay)
+
+# Drop a broken session locally. It is not closed on the server, so its subscriptions can still be transferred
+def abandon_session(client):
+    try:
+        if client.keepalive is not None:
+            client.keepalive.stop()
+        client.disconnect_socket()
+    except Exception:
+        pass
+
+# Reconection to OPC UA; gives up after MAX_RETRIES attempts or when stop is set
+def reconnect(client, stop=None):
+    logger.info("Attempting reconnect.")
+    abandon_session(client)
+    stop = stop or threading.Event()
+    for attempt in range(1, MAX_RETRIES + 1):
+        try:
+            new_client = Client(ENDPOINT)
+            new_client.connect()
+            logger.info("Reconnected to %s (attempt %d).", ENDPOINT, attempt)
+            return new_client
+        except Exception as e:
+            delay = backoff_delay(attempt)
+            logger.warning("Reconnect failed (attempt %d/%d): %s. Retrying in %.1f s.", attempt, MAX_RETRIES,
+                           str(e) or type(e).__name__, delay)
+            if stop.wait(delay):
+                return None
+    logger.error("Reconnect failed after max retries.")
+    return None
+
+
+        # === Subscriptions ===
+
+# Subscription whose keepalive (connectionSettings.keepAlive) lets a silent session be noticed within seconds and whose
+# lifetime (connectionSettings.lifetime) keeps it on the server during a short outage, so it can be transferred
+def create_subscription(client, rate, handler):
+    return client.create_subscription(subscription_params(ua, rate), handler)
+
+# CreateSubscriptionParameters of python-opcua or asyncua (ua_types is the library's ua module)
+def subscription_params(ua_types, rate):
+    keepalive = max(1, math.ceil(connection_settings["keepalive"] * 1000 / rate))
+    params = ua_types.CreateSubscriptionParameters()
+    params.RequestedPublishingInterval = rate
+    params.RequestedMaxKeepAliveCount = keepalive
+    params.RequestedLifetimeCount = max(3 * keepalive, math.ceil(connection_settings["lifetime"] * 1000 / rate))
+    params.MaxNotificationsPerPublish = 10000
+    params.PublishingEnabled = True
+    params.Priority = 0
+    return params
+
+# Status codes of a DataChangeFilter the server does not support (e.g. a percent deadband on a variable without an
+# EURange); these items are created again without a filter
+FILTER_REJECTED = {ua.StatusCodes.BadFilterNotAllowed, ua.StatusCodes.BadMonitoredItemFilterUnsupported,
+                   ua.StatusCodes.BadMonitoredItemFilterInvalid, ua.StatusCodes.BadDeadbandFilterInvalid}
+
+# ClientHandles of the monitored items, unique within the process and so within every subscription
+client_handles = itertools.count(1)
+
+# MonitoredItemCreateRequests of python-opcua or asyncua (ua_types is the library's ua module) with the sensors'
+# samplingInterval, queueSize, discardOldest and deadband (monitoring_params). Built from the ua types of the
+# library: the private Subscription._make_monitored_item_request has different signatures in the two.
+def monitored_item_requests(ua_types, nodes, rts, filtered=True):
+    requests = []
+    for node, rt in zip(nodes, rts):
+        sampling, queue_size, discard_oldest, deadband_type, deadband_value = rt.monitoring
+        params = ua_types.MonitoringParameters()
+        params.ClientHandle = next(client_handles)
+        params.SamplingInterval = sampling
+        params.QueueSize = queue_size
+        params.DiscardOldest = discard_oldest
+        if filtered and deadband_type != "none":
+            mfilter = ua_types.DataChangeFilter()
+            mfilter.Trigger = ua_types.DataChangeTrigger.StatusValue
+            mfilter.DeadbandType = ua_types.DeadbandType.Percent if deadband_type == "percent" else ua_types.DeadbandType.Absolute
+            mfilter.DeadbandValue = deadband_value
+            params.Filter = mfilter
+        item = ua_types.ReadValueId()
+        item.NodeId = node.nodeid
+        item.AttributeId = ua_types.AttributeIds.Value
+        request = ua_types.MonitoredItemCreateRequest()
+        request.ItemToMonitor = item
+        request.MonitoringMode = ua_types.MonitoringMode.Reporting
+        request.RequestedParameters = params
+        requests.append(request)
+    return requests
+
+# Indexes of the items whose filter was rejected
+def rejected_filters(handles):
+    return [i for i, handle in enumerate(handles) if not isinstance(handle, int) and handle.value in FILTER_REJECTED]
+
+def log_rejected_filters(rts, handles):
+    for rt, handle in zip(rts, handles):
+        logger.warning("Server rejected the %s deadband of %s (%s), subscribing without filter.", rt.monitoring[3], rt.name,
+                       handle.name)
+
+# Create the monitored items of sensors on a subscription; returns their handles (or StatusCodes) in request order
+def create_monitored_items(client, sub, rts):
+    nodes = [client.get_node(rt.node_id) for rt in rts]
+    handles = sub.create_monitored_items(monitored_item_requests(ua, nodes, rts))
+    retry = rejected_filters(handles)
+    if retry:
+        log_rejected_filters([rts[i] for i in retry], [handles[i] for i in retry])
+        again = sub.create_monitored_items(monitored_item_requests(ua, [nodes[i] for i in retry], [rts[i] for i in retry], False))
+        for i, handle in zip(retry, again):
+            handles[i] = handle
+    return handles
+
+# Create one subscription per distinct scanRate and register its nodes in batches (all sensors by default)
+def subscribe_sensors(client, handler, rts=None):
+    groups = {}
+    for rt in runtime.values() if rts is None else rts:
+        rt.subscription = rt.handle = None
+        groups.setdefault(rt.config["scanRate"], []).append(rt)
+
+    subscriptions = {}
+    for rate, group in sorted(groups.items()):
+        try:
+            sub = create_subscription(client, rate, handler)
+        except Exception as e:
+            logger.error("Failed to create subscription with scanRate=%sms: %s", rate, e)
+            continue
+        subscriptions[rate] = sub
+        subscribe_group(client, sub, rate, group)
+    return subscriptions
+
+# Register sensors on a subscription in batches of MAX_ITEMS_PER_CALL
+def subscribe_group(client, sub, rate, group):
+    subscribed = 0
+    for start in range(0, len(group), MAX_ITEMS_PER_CALL):
+        chunk = group[start:start + MAX_ITEMS_PER_CALL]
+        try:
+            handles = create_monitored_items(client, sub, chunk)
+        except Exception as e:
+            logger.error("Failed to subscribe %d sensors with scanRate=%sms: %s", len(chunk), rate, e)
+            continue
+        # Handles come back in request order; failed items are returned as a StatusCode
+        for rt, handle in zip(chunk, handles):
+            if isinstance(handle, ua.StatusCode):
+                logger.warning("[PERMISSION ERROR] Cannot subscribe to node %s (%s): %s", rt.config["nodeId"], rt.name, handle.name)
+                continue
+            rt.subscription = sub
+            rt.handle = handle
+            subscribed += 1
+    logger.info("Subscribed to %d/%d sensors with scanRate=%sms.", subscribed, len(group), rate)
+    return subscribed
+
+# Drop the monitored items of removed sensors and register added ones on the subscription of their scanRate
+# (created when missing); subscriptions left without sensors are deleted. Returns the scanRates of new subscriptions
+def resubscribe(client, subscriptions, handler, removed, added):
+    unsubscribe_sensors(removed)
+    groups = {}
+    for rt in added:
+        groups.setdefault(rt.config["scanRate"], []).append(rt)
+    created = set()
+    for rate, group in sorted(groups.items()):
+        sub = subscriptions.get(rate)
+        if sub is None:
+            try:
+                sub = subscriptions[rate] = create_subscription(client, rate, handler)
+            except Exception as e:
+                logger.error("Failed to create subscription with scanRate=%sms: %s", rate, e)
+                continue
+            created.add(rate)
+        subscribe_group(client, sub, rate, group)
+    in_use = {rt.subscription for rt in runtime.values()}
+    for rate, sub in list(subscriptions.items()):
+        if sub not in in_use:
+            try:
+                sub.delete()
+            except Exception as e:
+                logger.error("Failed to delete subscription with scanRate=%sms: %s", rate, e)
+            del subscriptions[rate]
+    return created
+
+# Delete the monitored items of sensors, one request per subscription and MAX_ITEMS_PER_CALL items
+def unsubscribe_sensors(rts):
+    groups = {}
+    for rt in rts:
+        if rt.subscription is not None:
+            groups.setdefault(rt.subscription, []).append(rt)
+    for sub, group in groups.items():
+        for start in range(0, len(group), MAX_ITEMS_PER_CALL):
+            handles = [rt.handle for rt in group[start:start + MAX_ITEMS_PER_CALL]]
+            try:
+                sub.unsubscribe(handles)
+            except Exception as e:
+                logger.error("Failed to unsubscribe %d sensors: %s", len(handles), e)
+            # Publish responses already in flight may still carry the removed items and are logged as
+            # "notification for unknown handle" once
+            opcua_internals.forget_items(sub, handles)
+        for rt in group:
+            rt.subscription = rt.handle = None
+
+
+        # === Bulk reads ===
+
+# Server operation limit for the Read service (0 means no limit)
+def get_max_nodes_per_read(client):
+    try:
+        limit = client.get_node(ua.NodeId(ua.ObjectIds.Server_ServerCapabilities_OperationLimits_MaxNodesPerRead)).get_value()
+        return int(limit) if limit else 0
+    except Exception:
+        return DEFAULT_MAX_NODES_PER_READ
+
+# Read the Value attribute of many nodes with as few Read requests as the server allows
+def read_values(client, node_ids, max_nodes=0):
+    node_ids = [nid if isinstance(nid, ua.NodeId) else ua.NodeId.from_string(nid) for nid in node_ids]
+    chunk_size = max_nodes or len(node_ids) or 1
+    results = []
+    for start in range(0, len(node_ids), chunk_size):
+        params = ua.ReadParameters()
+        for nid in node_ids[start:start + chunk_size]:
+            rv = ua.ReadValueId()
+            rv.NodeId = nid
+            rv.AttributeId = ua.AttributeIds.Value
+            params.NodesToRead.append(rv)
+        results.extend(client.uaclient.read(params))
+    return results
+
+
+        # === python-opcua internals ===
+
+OPCUA_INTERNALS_VERSIONS = ("0.98.",) # python-opcua releases whose private attributes OpcuaInternals was checked against
+
+# The private python-opcua attributes the monitor relies on, in one place. They are only touched with a version listed
+# in OPCUA_INTERNALS_VERSIONS; with any other version the supervisor keeps to public calls: no publish watch or socket
+# check (the heartbeat read remains), no subscription transfer (subscriptions are created again) and deleted
+# monitored items stay in the client-side map
+class OpcuaInternals:
+    def __init__(self):
+        self._supported = None
+
+    @property
+    def supported(self):
+        if self._supported is None:
+            try:
+                from importlib.metadata import version
+                installed = version("opcua")
+            except Exception:
+                installed = "unknown"
+            self._supported = installed.startswith(OPCUA_INTERNALS_VERSIONS)
+            if not self._supported:
+                print(f"{iso(datetime.now(timezone.utc))} | python-opcua {installed} is not a checked version: publish "
+                      "monitoring and subscription transfer are disabled.")
+        return self._supported
+
+    # Call on_publish(future) for every Publish response of the session (python-opcua looks the callback up per
+    # request). Returns whether the session is watched
+    def watch_publish(self, client, on_publish):
+        if not self.supported:
+            return False
+        uaclient = client.uaclient
+        callback = uaclient._call_publish_callback
+
+        def call(future):
+            on_publish(future)
+            callback(future)
+
+        uaclient._call_publish_callback = call
+        return True
+
+    # False when the session's socket or its receive thread is gone, None when this cannot be checked
+    def socket_alive(self, client):
+        if not self.supported:
+            return None
+        uasocket = client.uaclient._uasocket
+        return uasocket is not None and uasocket._thread is not None and uasocket._thread.is_alive()
+
+    # Raw service request on the secure channel, for services python-opcua has no client call for
+    def send_request(self, client, request):
+        if not self.supported:
+            raise NotImplementedError("raw requests are not supported with this python-opcua version")
+        return client.uaclient._uasocket.send_request(request)
+
+    # Deliver the Publish responses of a transferred subscription to it and start publishing on the new session
+    def adopt_subscription(self, client, sub):
+        uaclient = client.uaclient
+        sub.server = uaclient
+        uaclient._publishcallbacks[sub.subscription_id] = sub.publish_callback
+        uaclient.publish()
+
+    # Forget deleted monitored items client side (python-opcua only does so when they are deleted one at a time)
+    def forget_items(self, sub, handles):
+        if not self.supported:
+            return
+        handles = set(handles)
+        with sub._lock:
+            for key in [k for k, item in sub._monitoreditems_map.items() if item.server_handle in handles]:
+                del sub._monitoreditems_map[key]
+
+opcua_internals = OpcuaInternals()
+
+
+        # === Connection supervisor ===
+
+# Take over the subscriptions of a lost session (TransferSubscriptions, which python-opcua has no client call for).
+# Their monitored items and client handles stay valid; returns the scanRates that were transferred
+def transfer_subscriptions(client, subscriptions):
+    by_id = {sub.subscription_id: rate for rate, sub in subscriptions.items()}
+    if not by_id or not opcua_internals.supported:
+        return set()
+    request = ua.TransferSubscriptionsRequest()
+    request.Parameters.SubscriptionIds = list(by_id)
+    request.Parameters.SendInitialValues = False  # the backfill read already delivered the current values
+    try:
+        data = opcua_internals.send_request(client, request)
+        response = struct_from_binary(ua.TransferSubscriptionsResponse, data)
+        response.ResponseHeader.ServiceResult.check()
+    except Exception as e:
+        logger.warning("Subscription transfer not available: %s", e)
+        return set()
+    transferred = set()
+    for sub_id, result in zip(by_id, response.Results):
+        if not result.StatusCode.is_good():
+            continue
+        opcua_internals.adopt_subscription(client, subscriptions[by_id[sub_id]])
+        transferred.add(by_id[sub_id])
+    return transferred
+
+# Read all sensors in one bulk read after a reconnect and ingest values newer than the last sample before the outage.
+# A subscription delivering the same sample afterwards is skipped by SubHandler (SensorRuntime.backfill_t)
+def backfill(client):
+    rts = list(runtime.values())
+    results = read_values(client, [rt.node_id for rt in rts], get_max_nodes_per_read(client))
+    count = 0
+    for rt, dv in zip(rts, results):
+        if not dv.StatusCode.is_good():
+            continue
+        now_ts = dv.SourceTimestamp or datetime.now(timezone.utc)
+        t = to_us(now_ts)
+        last_ts = last_values.get(rt.name, (None, None))[1]
+        if last_ts is not None and to_us(last_ts) >= t:
+            continue  # unchanged during the outage
+        rt.backfill_t = t
+        if pipeline is not None:
+            pipeline.put(rt, dv.Value.Value, now_ts, dv.StatusCode.value)
+        else:
+            process_sample(rt, dv.Value.Value, now_ts, quality=dv.StatusCode.value)
+        count += 1
+    return count
+
+# Owns the client session and its subscriptions. A background thread checks the socket, the session keepalive,
+# publish responses (data or subscription keepalives) and a heartbeat read every connectionSettings.healthInterval,
+# and recovers a lost session: reconnect with backoff, backfill, transfer the subscriptions or create them again.
+class ConnectionSupervisor:
+    def __init__(self, client, handler):
+        self.client = client
+        self.handler = handler
+        self.subscriptions = {}  # scanRate -> Subscription
+        self.lock = threading.Lock()  # client and subscriptions: recovery vs. config reloads, not held while reconnecting
+        self.recovering = False  # the session is lost and being restored
+        self.failed = False  # gave up after MAX_RETRIES reconnect attempts
+        self.stale = []  # sensors removed or re-subscribed by reloads during a recovery, unsubscribed afterwards
+        self.publish_watched = False
+        self.outages = 0
+        self.recoveries = 0
+        self.transferred = 0
+        self.recreated = 0
+        self.backfilled = 0
+        self.downtime = 0.0  # s, summed over recoveries
+        self.last_recovery = None
+        self.last_ok = time.monotonic()
+        self.last_publish = time.monotonic()
+        self._heartbeat_status = None
+        self._reason = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="connection-supervisor", daemon=True)
+
+    def start(self):
+        with self.lock:
+            self._watch_publish(self.client)
+            self.subscriptions = subscribe_sensors(self.client, self.handler)
+        self._thread.start()
+
+    # Time stamp every publish response of the session
+    def _watch_publish(self, client):
+        def on_publish(future):
+            if not future.cancelled():
+                self.last_publish = time.monotonic()
+
+        self.publish_watched = opcua_internals.watch_publish(client, on_publish)
+        self.last_publish = time.monotonic()
+
+    # Ask for a recovery from another thread
+    def trigger(self, reason):
+        self._reason = reason
+        self._wake.set()
+
+    # Returns why the session is unusable, or None
+    def check(self):
+        client = self.client
+        if opcua_internals.socket_alive(client) is False:
+            return "connection closed"
+        if client.keepalive is not None and not client.keepalive.is_alive():
+            return "session keepalive stopped"
+        # Three missed keepalives of the slowest subscription
+        timeout = 3 * max([connection_settings["keepalive"]] + [rate / 1000 for rate in self.subscriptions])
+        if self.publish_watched and self.subscriptions and time.monotonic() - self.last_publish > timeout:
+            return f"no publish response for {timeout:.0f} s"
+        try:
+            heartbeat = read_values(client, [HEARTBEAT_NODE])[0]
+        except Exception as e:
+            return f"heartbeat read failed: {str(e) or type(e).__name__}"
+        status = heartbeat.StatusCode
+        if not status.is_good() and status.value != self._heartbeat_status:
+            logger.warning("[PERMISSION ERROR] Cannot read heartbeat node %s: %s", HEARTBEAT_NODE, status.name)
+        self._heartbeat_status = status.value
+        return None
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(connection_settings["health_interval"])
+            if self._stop.is_set():
+                break
+            self._wake.clear()
+            reason, self._reason = self._reason, None
+            if reason is None:
+                reason = self.check()
+            if reason is None:
+                self.last_ok = time.monotonic()
+            elif not self.recover(reason):
+                self.failed = True
+                logger.error("Unable to reconnect. Stopping monitoring. Press ENTER to return to the menu.")
+                break
+
+    def recover(self, reason):
+        self.outages += 1
+        metrics.reconnects += 1
+        logger.warning("Connection lost (%s). Attempting reconnect.", reason)
+        # Reloads and acknowledgements do not wait for the backoff: see reload() and running_client()
+        with self.lock:
+            self.recovering = True
+        client = reconnect(self.client, self._stop)
+        if client is None:
+            return False
+        with self.lock:
+            self.client = client
+            self._watch_publish(client)
+            try:
+                backfilled = backfill(client)
+            except Exception as e:
+                logger.error("Failed to read values after reconnect: %s", e)
+                backfilled = 0
+            transferred = transfer_subscriptions(client, self.subscriptions)
+            self.subscriptions = {rate: sub for rate, sub in self.subscriptions.items() if rate in transferred}
+            live = set(self.subscriptions.values())
+            unsubscribe_sensors([rt for rt in self.stale if rt.subscription in live])
+            self.stale = []
+            for rt in runtime.values():
+                if rt.subscription not in live:
+                    rt.subscription = rt.handle = None
+            lost = [rt for rt in runtime.values() if rt.subscription is None]
+            recreated = resubscribe(client, self.subscriptions, self.handler, [], lost)
+            self.recovering = False
+        recovery = time.monotonic() - self.last_ok
+        self.recoveries += 1
+        self.transferred += len(transferred)
+        self.recreated += len(recreated)
+        self.backfilled += backfilled
+        self.downtime += recovery
+        self.last_recovery = recovery
+        self.last_ok = time.monotonic()
+        metrics.reconnect_seconds.observe(recovery)
+        logger.info("Subscriptions restored after reconnect: %d transferred, %d created again, %d sensors backfilled. "
+                    "Recovered in %.1f s (MTTR %.1f s over %d outages).", len(transferred), len(recreated), backfilled,
+                    recovery, self.downtime / self.recoveries, self.recoveries)
+        return True
+
+    # Incremental reload against the session. During a recovery only the model changes; the new set of sensors is
+    # subscribed once the session is back
+    def reload(self, config=None):
+        with self.lock:
+            if not self.recovering:
+                return reload_config(self.client, self.subscriptions, self.handler, config)
+            diff = reload_config(config=config)
+            if diff is not None:
+                self.stale.extend(diff["removed"] + diff["moved"])
+            return diff
+
+    # MTTR: mean time from the last healthy check to restored subscriptions
+    def counters(self):
+        return {
+            "outages": self.outages,
+            "recoveries": self.recoveries,
+            "transferred_subscriptions": self.transferred,
+            "recreated_subscriptions": self.recreated,
+            "backfilled_samples": self.backfilled,
+            "last_recovery_s": round(self.last_recovery, 3) if self.last_recovery is not None else None,
+            "mttr_s": round(self.downtime / self.recoveries, 3) if self.recoveries else None,
+        }
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+
+        # === Load configuration JSON ===
+
+# Monitored item parameters of a sensor: its "monitoring" entry over monitoringSettings, as
+# (samplingInterval ms, queueSize, discardOldest, deadbandType, deadbandValue). samplingInterval 0 means the scanRate.
+# settings: the monitoringSettings to use (the running ones by default)
+def monitoring_params(sensor, settings=None):
+    settings = settings or monitoring_settings
+    cfg = sensor.get("monitoring", {})
+    sampling = float(cfg.get("samplingInterval", settings["sampling_interval"]))
+    return (sampling if sampling > 0 else float(sensor.get("scanRate", MIN_SCANRATE)),
+            max(1, int(cfg.get("queueSize", settings["queue_size"]))),
+            bool(cfg.get("discardOldest", settings["discard_oldest"])),
+            cfg.get("deadbandType", settings["deadband_type"]),
+            max(0.0, float(cfg.get("deadbandValue", settings["deadband_value"]))))
+
+# Time between two samples (ms): the scanRate, or the samplingInterval when the server queues several per publish
+def sample_interval(sensor, monitoring=None):
+    sampling, queue_size = monitoring_params(sensor, monitoring)[:2]
+    return max(sampling, sensor.get("scanRate", MIN_SCANRATE) / queue_size)
+
+# Sample window length: the sensor's "window" (or bufferSettings.window) seconds of samples
+def window_size(sensor, buffer=None, monitoring=None):
+    window = float(sensor.get("window", (buffer or buffer_settings)["window"]))
+    return max(MIN_WINDOW_SAMPLES, math.ceil(window * 1000 / sample_interval(sensor, monitoring)))
+
+# Window lengths (name -> samples) within bufferSettings.memoryBudget: when the configured windows do not fit, they
+# are all shortened by the same factor, down to MIN_WINDOW_SAMPLES. Prints the allocation when verbose.
+# buffer, monitoring: the settings of a configuration that is not applied yet
+def plan_windows(sensor_list, verbose=True, buffer=None, monitoring=None):
+    buffer = buffer or buffer_settings
+    sizes = {sensor["name"]: window_size(sensor, buffer, monitoring) for sensor in sensor_list}
+    budget = int(buffer["memory_budget"] * 2**20)
+    required = total = sum(RollingWindow.nbytes(n) for n in sizes.values())
+    while budget and total > budget and any(n > MIN_WINDOW_SAMPLES for n in sizes.values()):
+        factor = budget / total * 0.999
+        sizes = {name: max(MIN_WINDOW_SAMPLES, int(n * factor)) for name, n in sizes.items()}
+        total = sum(RollingWindow.nbytes(n) for n in sizes.values())
+    if verbose and total < required:
+        print(f"\nWarning: the configured sample windows need {required / 2**20:.1f} MB, more than the memoryBudget of "
+              f"{buffer['memory_budget']:g} MB. Shortened to {total / required:.1%} of their length.\n")
+    if verbose and budget and total > budget:
+        print(f"\nWarning: the shortest sample windows ({MIN_WINDOW_SAMPLES} samples) of {len(sizes)} sensors still need "
+              f"{total / 2**20:.1f} MB, more than the memoryBudget.\n")
+    if verbose:
+        budget_text = f" of a {buffer['memory_budget']:g} MB budget" if budget else ""
+        print(f"{iso(datetime.now(timezone.utc))} | Sample windows: {len(sizes)} sensors, {sum(sizes.values())} samples, "
+              f"{total / 2**20:.2f} MB{budget_text}.")
+    return sizes
+
+# Read a configuration file and clamp the scanRates; returns None (after printing why) when it cannot be used
+def read_config(path, verbose=True):
+    try:
+        with open(path, "r") as f:
+            try:
+                config = json.load(f)
+            except json.JSONDecodeError as jde:
+                print(f"{iso(datetime.now(timezone.utc))} | Malformed JSON in configuration file '{path}: {jde}")
+                return None
+    except FileNotFoundError:
+        print(f"{iso(datetime.now(timezone.utc))} | Configuration file '{path}' not found.")
+        return None
+
+    # Sensors of the "servers" entries carry their endpoint
+    if config.get("servers"):
+        config["sensors"] = config.get("sensors", []) + [
+            dict(sensor, endpoint=server["endpoint"]) for server in config["servers"] for sensor in server.get("sensors", [])]
+
+    if not config.get("sensors"):
+        print(f"{iso(datetime.now(timezone.utc))} | No sensors found in configuration file '{path}'.")
+        return None
+
+    # Clamp scanRate and print warnings
+    for sensor in config["sensors"]:
+        default_rate = sensor.get("scanRate", MIN_SCANRATE)
+        final_rate = default_rate
+        if final_rate > MAX_SCANRATE:
+            print(f"\nWarning: {sensor['name']} requested scan rate {final_rate}ms exceeds MAX_SCANRATE ({MAX_SCANRATE}ms). Clamping to maximum.\n")
+        if final_rate < MIN_SCANRATE:
+            print(f"\nWarning: {sensor['name']} requested scan rate {final_rate}ms is below MIN_SCANRATE ({MIN_SCANRATE}ms). Clamping to minimum.\n")
+        sensor["scanRate"] = max(MIN_SCANRATE, min(final_rate, MAX_SCANRATE))
+        deadband_type = sensor.get("monitoring", {}).get("deadbandType")
+        if deadband_type is not None and deadband_type not in DEADBAND_TYPES:
+            print(f"\nWarning: {sensor['name']} has an unknown deadbandType '{deadband_type}' (expected one of {', '.join(DEADBAND_TYPES)}). Using monitoringSettings.\n")
+            del sensor["monitoring"]["deadbandType"]
+        if verbose:
+            server = f", Server: {sensor['endpoint']}" if "endpoint" in sensor else ""
+            print(f"Sensor: {sensor['name']}, NodeId: {sensor['nodeId']}, ScanRate: {sensor['scanRate']}ms{server}")
+    return config
+
+# Settings sections of a configuration (everything except the sensor list), parsed over the running settings without
+# changing them; raises on invalid values
+def read_settings(config):
+    alarm = config.get("alarmSettings", {})
+    trend_cfg = config.get("trendSettings", {})
+    trend = dict(trend_settings)
+    trend["rise_rate"] = float(trend_cfg.get("riseRate", trend["rise_rate"]))
+    trend["fall_rate"] = float(trend_cfg.get("fallRate", trend["fall_rate"]))
+    trend["window"] = max(0.001, float(trend_cfg.get("window", trend["window"])))
+    trend["smoothing"] = min(1.0, max(0.001, float(trend_cfg.get("smoothing", trend["smoothing"]))))
+    trend["hysteresis"] = min(1.0, max(0.0, float(trend_cfg.get("hysteresis", trend["hysteresis"]))))
+    dashboard_cfg = config.get("dashboardSettings", {})
+    dashboard_new = dict(dashboard_settings)
+    dashboard_new["frame_rate"] = max(0.1, float(dashboard_cfg.get("frameRate", dashboard_new["frame_rate"])))
+    dashboard_new["compact"] = bool(dashboard_cfg.get("compact", dashboard_new["compact"]))
+    web_cfg = config.get("webSettings", {})
+    web = dict(web_settings)
+    web["api_token"] = str(web_cfg.get("apiToken") or "")
+    log_cfg = config.get("logSettings", {})
+    log = dict(log_settings)
+    log["level"] = str(log_cfg.get("level", log["level"])).upper()
+    log["format"] = log_cfg.get("format", log["format"])
+    log["file"] = log_cfg.get("file", log["file"])
+    log["status_interval"] = max(0.0, float(log_cfg.get("statusInterval", log["status_interval"])))
+    log["quiet"] = bool(log_cfg.get("quiet", log["quiet"]))
+    pipeline_cfg = config.get("pipelineSettings", {})
+    pipeline_new = dict(pipeline_settings)
+    pipeline_new["queue_size"] = max(1, int(pipeline_cfg.get("queueSize", pipeline_new["queue_size"])))
+    policy = pipeline_cfg.get("overflowPolicy", pipeline_new["overflow_policy"])
+    if policy in OVERFLOW_POLICIES:
+        pipeline_new["overflow_policy"] = policy
+    else:
+        print(f"\nWarning: unknown overflowPolicy '{policy}' (expected one of {', '.join(OVERFLOW_POLICIES)}). Keeping '{pipeline_new['overflow_policy']}'.\n")
+    pipeline_new["batch_alarms"] = bool(pipeline_cfg.get("batchAlarms", pipeline_new["batch_alarms"]))
+    historian_cfg = config.get("historianSettings", {})
+    historian_new = dict(historian_settings)
+    historian_new["enabled"] = bool(historian_cfg.get("enabled", historian_new["enabled"]))
+    historian_new["directory"] = os.path.expanduser(historian_cfg.get("directory", historian_new["directory"]))
+    historian_new["flush_interval"] = max(0.1, float(historian_cfg.get("flushInterval", historian_new["flush_interval"])))
+    reload_cfg = config.get("reloadSettings", {})
+    reload = dict(reload_settings)
+    reload["watch"] = bool(reload_cfg.get("watch", reload["watch"]))
+    reload["interval"] = max(0.1, float(reload_cfg.get("interval", reload["interval"])))
+    sharding_cfg = config.get("shardingSettings", {})
+    sharding = dict(sharding_settings)
+    sharding["enabled"] = bool(sharding_cfg.get("enabled", sharding["enabled"]))
+    sharding["max_sensors_per_worker"] = max(1, int(sharding_cfg.get("maxSensorsPerWorker", sharding["max_sensors_per_worker"])))
+    sharding["batch_interval"] = max(0.001, float(sharding_cfg.get("batchInterval", sharding["batch_interval"])))
+    connection_cfg = config.get("connectionSettings", {})
+    connection = dict(connection_settings)
+    for key, name in (("health_interval", "healthInterval"), ("keepalive", "keepAlive"), ("lifetime", "lifetime"),
+                      ("backoff_initial", "backoffInitial"), ("backoff_max", "backoffMax")):
+        connection[key] = max(0.1, float(connection_cfg.get(name, connection[key])))
+    buffer_cfg = config.get("bufferSettings", {})
+    buffer = dict(buffer_settings)
+    buffer["window"] = max(0.001, float(buffer_cfg.get("window", buffer["window"])))
+    buffer["memory_budget"] = max(0.0, float(buffer_cfg.get("memoryBudget", buffer["memory_budget"])))
+    monitoring_cfg = config.get("monitoringSettings", {})
+    monitoring = dict(monitoring_settings)
+    deadband_type = monitoring_cfg.get("deadbandType", monitoring["deadband_type"])
+    if deadband_type in DEADBAND_TYPES:
+        monitoring["deadband_type"] = deadband_type
+    else:
+        print(f"\nWarning: unknown deadbandType '{deadband_type}' (expected one of {', '.join(DEADBAND_TYPES)}). Keeping '{monitoring['deadband_type']}'.\n")
+    monitoring["deadband_value"] = max(0.0, float(monitoring_cfg.get("deadbandValue", monitoring["deadband_value"])))
+    monitoring["sampling_interval"] = max(0.0, float(monitoring_cfg.get("samplingInterval", monitoring["sampling_interval"])))
+    monitoring["queue_size"] = max(1, int(monitoring_cfg.get("queueSize", monitoring["queue_size"])))
+    monitoring["discard_oldest"] = bool(monitoring_cfg.get("discardOldest", monitoring["discard_oldest"]))
+    return {"endpoint": config.get("endpoint", ENDPOINT), "alarm": alarm, "time_delay": int(alarm.get("timeDelay", 0)),
+            "trend": trend, "dashboard": dashboard_new, "web": web, "log": log, "pipeline": pipeline_new, "historian": historian_new,
+            "reload": reload, "sharding": sharding, "connection": connection, "buffer": buffer, "monitoring": monitoring}
+
+# Make settings from read_settings the running ones
+def commit_settings(settings):
+    global alarm_settings, TIME_DELAY, ENDPOINT
+    ENDPOINT = settings["endpoint"]
+    alarm_settings = settings["alarm"]
+    TIME_DELAY = settings["time_delay"]
+    # Reloads keep the log writer unless logSettings changed
+    log_changed = log_listener is None or settings["log"] != log_settings
+    for running, key in ((trend_settings, "trend"), (dashboard_settings, "dashboard"), (web_settings, "web"),
+                         (log_settings, "log"), (pipeline_settings, "pipeline"), (historian_settings, "historian"),
+                         (reload_settings, "reload"), (sharding_settings, "sharding"),
+                         (connection_settings, "connection"), (buffer_settings, "buffer"),
+                         (monitoring_settings, "monitoring")):
+        running.update(settings[key])
+    dashboard.frame_rate = dashboard_settings["frame_rate"]
+    dashboard.compact = dashboard_settings["compact"]
+    if log_changed:
+        setup_logging()
+
+# Apply the settings sections (everything except the sensor list)
+def apply_settings(config):
+    commit_settings(read_settings(config))
+
+# Raise when a sensor entry has values the runtime model cannot compile (monitoring: settings from read_settings)
+def check_sensors(sensor_list, monitoring):
+    for sensor in sensor_list:
+        try:
+            float(sensor.get("deadband", 0.0))
+            alarms = sensor.get("alarms", {})
+            for key in ("high", "high_high", "low", "low_low"):
+                if alarms.get(key) is not None:
+                    float(alarms[key])
+            monitoring_params(sensor, monitoring)
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"sensor {sensor['name']}: {e}") from None
+
+# Settings and window lengths of a configuration, validated before anything is applied
+def prepare_config(config, verbose=True):
+    settings = read_settings(config)
+    check_sensors(config["sensors"], settings["monitoring"])
+    sizes = plan_windows(config["sensors"], verbose, settings["buffer"], settings["monitoring"])
+    return settings, sizes
+
+# Load the configuration file when 2 is entered in the menu
+def load_config_json():
+    global alarm_history, config_revision, config_mtime
+    path = config_path
+
+    try:
+        mtime = os.stat(path).st_mtime if os.path.exists(path) else None
+        config = read_config(path)
+        if config is None:
+            return
+        settings, sizes = prepare_config(config)
+        commit_settings(settings)
+        build_model(config["sensors"], sizes)
+        loaded_config.clear()
+        loaded_config.update(config)
+
+        # Initialize alarm history
+        alarm_history.reset()
+        config_revision += 1
+        config_mtime = mtime
+
+        print(f"{iso(datetime.now(timezone.utc))} | Configuration loaded from {path}")
+
+    except Exception as e:
+        print(f"{iso(datetime.now(timezone.utc))} | Failed to load configuration: {e}")
+
+# Fresh buffers, states and runtime model for a sensor list; sizes: window lengths from plan_windows
+def build_model(sensor_list, sizes):
+    global sensors
+    sensors = sensor_list
+
+    # Initialize buffers and states
+    buffers.clear()
+    states.clear()
+    for sensor in sensors:
+        buffers[sensor["name"]] = RollingWindow(sizes[sensor["name"]])
+    states.update({s["name"]: new_sensor_states() for s in sensors})
+
+    # Compile the runtime model (NodeId lookup for the subscription handler)
+    runtime.clear()
+    runtime_by_name.clear()
+    for sensor in sensors:
+        rt = SensorRuntime(sensor, buffers[sensor["name"]], states[sensor["name"]])
+        runtime[rt.key] = rt
+        runtime_by_name[rt.name] = rt
+
+def new_sensor_states():
+    return {lvl: {"active": False, "pending_since": None, "started_at": None} for lvl in ("HH", "H", "L", "LL")}
+
+# Clear the active alarms of levels (level -> threshold) a sensor no longer evaluates, and its active trend when the
+# sensor itself is removed; otherwise they would stay active in the alarm history. A level can be active there more
+# than once (ALARM_ACTIVE repeats), so one ALARM_CLEAR is emitted per active entry.
+def clear_alarms(rt, thresholds, now_ts, end_trend=False):
+    value = last_values.get(rt.name, (None, None))[0]
+    with alarm_history.lock:
+        entries = {level: len(alarm_history.active.get((rt.name, level), ())) for level in thresholds}
+    for level, thr in thresholds.items():
+        st = rt.states[level]
+        if not st["active"] and not entries[level]:
+            continue
+        started_at = st["started_at"]
+        # python-opcua timestamps are naive UTC
+        ts = now_ts.replace(tzinfo=None) if started_at is not None and started_at.tzinfo is None else now_ts
+        for _ in range(max(1, entries[level])):
+            emit_event("ALARM_CLEAR", rt.config, level, value, thr, ts, started_at)
+        st.update(active=False, pending_since=None, started_at=None)
+    trend = rt.trend
+    if end_trend and trend.direction is not None:
+        emit_trend("TREND_END", rt, trend.direction, value, trend.slope or 0.0, now_ts, started_at=trend.started_at)
+        trend.direction = trend.started_at = None
+
+# Apply a changed configuration file to the running model. Sensors are matched by nodeId (and name): only added and
+# removed sensors, and sensors whose scanRate or monitored item parameters changed, touch the server; limits, deadband
+# and unit are updated in place. The whole file is validated before anything is applied.
+# Buffers, alarm states and the alarm history are kept; the active alarms and trends of removed sensors are cleared.
+# Without a client only the model is updated. config: an already read configuration (a shard worker's part), instead
+# of the file. Returns the changes as {"added", "removed", "moved", "changed": [SensorRuntime], "settings": bool}, or
+# None when nothing was applied.
+def reload_config(client=None, subscriptions=None, handler=None, config=None):
+    global sensors, config_revision, config_mtime
+    if not runtime:
         load_config_json()
+        return None
+    path = config_path if config is None else "the coordinator"
+    try:
+        if config is None:
+            mtime = os.stat(path).st_mtime if os.path.exists(path) else None
+            config = read_config(path, verbose=False)
+            if config is None:
+                return None
+        else:
+            mtime = config_mtime
+        new = {}
+        for sensor in config["sensors"]:
+            new[sensor_key(sensor)] = sensor
+        names = [s["name"] for s in config["sensors"]]
+        if len(set(names)) != len(names) or len(new) != len(names):
+            print(f"{iso(datetime.now(timezone.utc))} | Configuration not reloaded: sensor names and nodeIds must be unique.")
+            return None
+        settings, sizes = prepare_config(config, verbose=path == config_path)
+    except Exception as e:
+        print(f"{iso(datetime.now(timezone.utc))} | Failed to reload configuration: {e}")
+        return None
+    settings_changed = settings_sections(config) != settings_sections(loaded_config)
+    commit_settings(settings)
 
-    stop_monitoring = False
-    timestamp_str = datetime.now().strftime("%Y%m%d_%H%M%S")
-    file_path = os.path.expanduser(f"~/Downloads/alarm_history_{timestamp_str}.json")
+    kept = [(rt, new[key]) for key, rt in runtime.items() if key in new and new[key]["name"] == rt.name]
+    kept_keys = {rt.key for rt, _ in kept}
+    removed = [rt for key, rt in runtime.items() if key not in kept_keys]
+    added = [cfg for key, cfg in new.items() if key not in kept_keys]
+    moved = [rt for rt, cfg in kept if cfg["scanRate"] != rt.config["scanRate"] or monitoring_params(cfg) != rt.monitoring]
+    moved_set = set(moved)
+    changed = []
+    now_ts = datetime.now(timezone.utc)
+
+    # The ingest worker must not process samples while the model changes
+    with (pipeline.lock if pipeline is not None else contextlib.nullcontext()):
+        evaluator = pipeline.evaluator if pipeline is not None else None
+        if evaluator is not None:
+            evaluator.store_states()
+
+        for rt in removed:
+            clear_alarms(rt, {level: thr for level, thr, *_ in rt.levels}, now_ts, end_trend=True)
+            rt.removed = True
+            del runtime[rt.key]
+            del runtime_by_name[rt.name]
+            buffers.pop(rt.name, None)
+            states.pop(rt.name, None)
+            last_values.pop(rt.name, None)
+            prev_values.pop(rt.name, None)
+
+        window_us = trend_window_us()
+        for rt, cfg in kept:
+            if sizes[rt.name] != rt.buffer.maxlen:
+                rt.buffer = buffers[rt.name] = rt.buffer.resized(sizes[rt.name])
+            if rt.trend.window_us != window_us or rt.trend.buffer is not rt.buffer:
+                rt.trend = rt.trend.resized(window_us, trend_settings["smoothing"], rt.buffer)
+            if cfg == rt.config and rt not in moved_set:
+                rt.config = cfg
+                continue
+            old_levels = {level: thr for level, thr, *_ in rt.levels}
+            rt.configure(cfg)
+            # A level removed from the config cannot clear by itself anymore
+            kept_levels = {level for level, *_ in rt.levels}
+            clear_alarms(rt, {level: thr for level, thr in old_levels.items() if level not in kept_levels}, now_ts)
+            changed.append(rt)
+
+        new_rts = []
+        for sensor in added:
+            buffers[sensor["name"]] = RollingWindow(sizes[sensor["name"]])
+            states[sensor["name"]] = new_sensor_states()
+            rt = SensorRuntime(sensor, buffers[sensor["name"]], states[sensor["name"]])
+            runtime[rt.key] = rt
+            runtime_by_name[rt.name] = rt
+            new_rts.append(rt)
+
+        sensors = config["sensors"]
+        loaded_config.clear()
+        loaded_config.update(config)
+        if evaluator is not None:
+            pipeline.evaluator = BatchAlarmEvaluator(runtime.values())
+        config_revision += 1
+        config_mtime = mtime
+
+    if historian is not None:
+        historian.add([rt.name for rt in new_rts])
+
+    # Server side: drop removed and moved items, register added and moved ones on the subscription of their scanRate
+    if client is not None and subscriptions is not None:
+        resubscribe(client, subscriptions, handler, removed + moved, new_rts + moved)
+
+    print(f"{iso(datetime.now(timezone.utc))} | Configuration reloaded from {path}: {len(added)} added, {len(removed)} removed, "
+          f"{len(moved)} re-subscribed (scanRate or monitoring changed), {len(changed) - len(moved)} updated in place.")
+    return {"added": new_rts, "removed": removed, "moved": moved, "changed": changed, "settings": settings_changed}
+
+# Settings sections of a configuration, for comparing two of them
+def settings_sections(config):
+    return {key: value for key, value in config.items() if key not in ("sensors", "servers")}
+
+# Polls the config file's modification time and calls on_change when it changes
+class ConfigWatcher:
+    def __init__(self, path, interval, on_change):
+        self.path = path
+        self.interval = interval
+        self.on_change = on_change
+        self.mtime = config_mtime  # file version of the running configuration
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="config-watcher", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                mtime = os.stat(self.path).st_mtime
+            except OSError:
+                continue
+            if mtime != self.mtime:
+                self.mtime = mtime
+                try:
+                    self.on_change()
+                except Exception as e:
+                    print(f"{iso(datetime.now(timezone.utc))} | Failed to reload configuration: {e}")
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
+        # === Sharding ===
+
+# Configurations with "servers" (or shardingSettings.enabled) run their sensors in worker processes
+def sharded():
+    return sharding_settings["enabled"] or any("endpoint" in rt.config for rt in runtime.values())
+
+# One shard per endpoint; large tag lists are split evenly into shards of at most maxSensorsPerWorker sensors.
+# Returns [(endpoint, [SensorRuntime])]
+def plan_shards(rts):
+    groups = {}
+    for rt in rts:
+        groups.setdefault(rt.config.get("endpoint", ENDPOINT), []).append(rt)
+    shards = []
+    for endpoint, group in groups.items():
+        size = math.ceil(len(group) / math.ceil(len(group) / sharding_settings["max_sensors_per_worker"]))
+        shards.extend((endpoint, group[start:start + size]) for start in range(0, len(group), size))
+    return shards
+
+# Worker side: samples as parallel arrays (position of the sensor in the shard, time in us, value, status code) and
+# alarm event records, sent to the coordinator every shardingSettings.batchInterval
+class ShardOutbox:
+    def __init__(self, shard, out, positions, interval):
+        self.shard = shard
+        self.out = out
+        self.interval = interval
+        self.index = positions  # sensor name -> position in the coordinator's list of the shard
+        self.batches = 0
+        self._lock = threading.Lock()
+        self._reset()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="shard-outbox", daemon=True)
+        self._thread.start()
+
+    def _reset(self):
+        self._idx, self._t, self._v, self._q = array("I"), array("q"), array("d"), array("I")
+        self._alarms = []
+
+    def sample(self, rt, t, num, quality):
+        with self._lock:
+            self._idx.append(self.index[rt.name])
+            self._t.append(t)
+            self._v.append(math.nan if num is None else num)
+            self._q.append(quality)
+
+    def alarm(self, record):
+        with self._lock:
+            self._alarms.append(record)
+
+    # Positions of added sensors, known before they are subscribed. Those of the other sensors do not change, so
+    # batches already sent stay valid; removed sensors keep theirs until the last sample in flight is sent.
+    def relocate(self, positions):
+        with self._lock:
+            self.index = dict(self.index, **positions)
 
+    def flush(self):
+        with self._lock:
+            if not self._idx and not self._alarms:
+                return
+            batch = ("batch", self.shard, self._idx.tobytes(), self._t.tobytes(), self._v.tobytes(), self._q.tobytes(), self._alarms)
+            self._reset()
+        self.out.put(batch)
+        self.batches += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.flush()
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+        self.flush()
+
+# Worker process of one shard: own OPC UA client, connection supervisor, ingest pipeline and alarm engine.
+# alarm_states and trend_states carry the active alarms and trends of the shard's sensors, so a restarted worker does
+# not raise them again. commands: ("reload", config, positions) applies the shard's part of a reloaded configuration
+# to the running session, ("stop",) ends a worker whose sensors were all removed.
+def run_shard(shard, config, positions, alarm_states, trend_states, out, commands, stop):
+    global stop_monitoring, pipeline, supervisor, outbox
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl+C reaches the whole process group; the coordinator stops us
+    apply_settings(config)
+    build_model(config["sensors"], plan_windows(config["sensors"], verbose=False))
+    loaded_config.update(config)
+    for name, levels in alarm_states.items():
+        for level, st in levels.items():
+            states[name][level].update(st)
+    for name, (direction, started_at) in trend_states.items():
+        runtime_by_name[name].trend.direction, runtime_by_name[name].trend.started_at = direction, started_at
+    outbox = ShardOutbox(shard, out, positions, sharding_settings["batch_interval"])
+    counters = {}
     client = connect_to_opcua()
-    if not client:
+    if client is not None:
+        pipeline = IngestPipeline(pipeline_settings["queue_size"], pipeline_settings["overflow_policy"], pipeline_settings["batch_alarms"])
+        supervisor = ConnectionSupervisor(client, SubHandler())
+        try:
+            supervisor.start()
+            while not stop.is_set() and not supervisor.failed:
+                try:
+                    command = commands.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+                if command[0] == "stop":
+                    break
+                outbox.relocate(command[2])
+                # Alarm events of removed sensors are already cleared by the coordinator, which drops these ones
+                supervisor.reload(command[1])
+        finally:
+            stop_monitoring = True
+            supervisor.stop()
+            try:
+                supervisor.client.disconnect()
+            except Exception:
+                pass
+            pipeline.stop()
+            counters = {"pipeline": pipeline.counters(), "connection": supervisor.counters()}
+    outbox.close()
+    counters["batches"] = outbox.batches
+    out.put(("exit", shard, counters))
+    out.close()
+    out.join_thread()
+    shutdown_logging()
+    os._exit(0)  # python-opcua client threads may linger after disconnect
+
+# Coordinator side: starts one worker process per shard and merges their batches into this process's sample windows,
+# sample history, dashboard and alarm history. The alarm states of the sensors mirror the workers' alarm events.
+# A shard's list of sensors only grows: samples refer to sensors by position, and removed sensors keep theirs.
+class ShardCoordinator:
+    def __init__(self, shards):
+        import multiprocessing
+        self.shards = [(endpoint, list(rts)) for endpoint, rts in shards]
+        self.batches = 0
+        self.samples = 0
+        self.alarms = 0
+        self.workers = {}  # shard -> counters reported by the stopped worker
+        self._ctx = multiprocessing.get_context("spawn")
+        self._queue = self._ctx.Queue()
+        self._stop = self._ctx.Event()
+        self._commands = []  # per shard
+        self._processes = []
+        self._running = 0
+        self._lock = threading.Lock()  # shard lists: reloads vs. the batch thread
+        self._thread = threading.Thread(target=self._run, name="shard-coordinator", daemon=True)
+
+    def start(self):
+        for shard in range(len(self.shards)):
+            self.start_shard(shard)
+        self._thread.start()
+
+    # Configuration of a shard worker: the settings and its live sensors, with their positions in the shard
+    def shard_config(self, shard):
+        endpoint, rts = self.shards[shard]
+        live = [rt for rt in rts if not rt.removed]
+        config = dict(loaded_config, endpoint=endpoint, historianSettings={"enabled": False},
+                      sensors=[{k: v for k, v in rt.config.items() if k != "endpoint"} for rt in live])
+        config.pop("servers", None)
+        return config, {rt.name: i for i, rt in enumerate(rts) if not rt.removed}
+
+    def start_shard(self, shard):
+        endpoint, rts = self.shards[shard]
+        config, positions = self.shard_config(shard)
+        alarm_states = {rt.name: {level: {"active": True, "started_at": st["started_at"]}
+                                  for level, st in rt.states.items() if st["active"]} for rt in rts if not rt.removed}
+        trend_states = {rt.name: (rt.trend.direction, rt.trend.started_at) for rt in rts if rt.trend.direction and not rt.removed}
+        commands = self._ctx.Queue()
+        process = self._ctx.Process(target=run_shard, name=f"opcua-shard-{shard}", daemon=True,
+                                    args=(shard, config, positions, alarm_states, trend_states, self._queue, commands, self._stop))
+        process.start()
+        self._commands.append(commands)
+        self._processes.append(process)
+        self._running += 1
+        print(f"{iso(datetime.now(timezone.utc))} | Shard {shard}: {len(positions)} sensors of {endpoint} (process {process.pid}).")
+
+    # Apply the changes of reload_config: added sensors join a shard of their endpoint with room left (or new shards),
+    # and only the shards whose sensors changed get their new part (all of them when a settings section changed)
+    def reload(self, diff):
+        limit = sharding_settings["max_sensors_per_worker"]
+        with self._lock:
+            affected = set(range(len(self.shards))) if diff["settings"] else set()
+            shard_of = {rt: shard for shard, (_, rts) in enumerate(self.shards) for rt in rts}
+            affected.update(shard_of[rt] for rt in diff["removed"] + diff["changed"] if rt in shard_of)
+            live = [sum(not rt.removed for rt in rts) for _, rts in self.shards]
+            unplaced = []
+            for rt in diff["added"]:
+                endpoint = rt.config.get("endpoint", ENDPOINT)
+                room = [shard for shard, (e, _) in enumerate(self.shards)
+                        if e == endpoint and live[shard] < limit and self._processes[shard].is_alive()]
+                if not room:
+                    unplaced.append(rt)
+                    continue
+                shard = min(room, key=live.__getitem__)
+                self.shards[shard][1].append(rt)
+                live[shard] += 1
+                affected.add(shard)
+            for shard in sorted(affected):
+                if not self._processes[shard].is_alive():
+                    continue
+                if not live[shard]:
+                    self._commands[shard].put(("stop",))
+                else:
+                    self._commands[shard].put(("reload",) + self.shard_config(shard))
+            for endpoint, rts in plan_shards(unplaced):
+                self.shards.append((endpoint, rts))
+                self.start_shard(len(self.shards) - 1)
+        print(f"{iso(datetime.now(timezone.utc))} | Reload sent to {len(affected)} of {len(self.shards)} shards.")
+
+    def _run(self):
+        while self._running:
+            try:
+                message = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                if not any(process.is_alive() for process in self._processes):
+                    break
+                continue
+            kind, shard = message[0], message[1]
+            if kind == "exit":
+                with self._lock:
+                    self._running -= 1
+                self.workers[shard] = message[2]
+                if not self._stop.is_set():
+                    print(f"{iso(datetime.now(timezone.utc))} | Shard {shard} ({self.shards[shard][0]}) stopped.")
+                continue
+            try:
+                with self._lock:
+                    rts = self.shards[shard][1]
+                self.apply(rts, *message[2:])
+            except Exception as e:
+                logger.error("Failed to apply a batch of shard %d: %s", shard, e)
+
+    def apply(self, rts, idx, ts, vs, qs, alarms):
+        idx, ts, vs, qs = array("I", idx), array("q", ts), array("d", vs), array("I", qs)
+        with (pipeline.lock if pipeline is not None else contextlib.nullcontext()):
+            for i, t, v, quality in zip(idx, ts, vs, qs):
+                rt = rts[i]
+                if rt.removed:
+                    continue
+                rt.notifications += 1
+                num = v if math.isfinite(v) else None
+                if historian is not None:
+                    historian.append(rt.name, t, num, quality)
+                if num is None:
+                    continue
+                if rt.hold_us:
+                    rt.buffer.hold(t, rt.hold_us)
+                rt.buffer.append(num, t)
+                rt.revision += 1
+                prev_values[rt.name] = last_values.get(rt.name, (None, None))
+                last_values[rt.name] = (num, from_us(t))
+                dashboard.update(rt.name, num)
+            for record in alarms:
+                rt = runtime_by_name.get(record["sensor"])
+                if rt is None or rt.removed:
+                    continue  # the coordinator's reload already cleared the alarms of removed sensors
+                is_trend = record["event"].startswith("TREND_")
+                active = record["event"] in ("ALARM_ACTIVE", "TREND_START")
+                started_at = datetime.fromisoformat(record["timestamp"].replace("Z", "+00:00")) if active else None
+                if is_trend:
+                    rt.trend.direction, rt.trend.started_at = (record["type"].lower(), started_at) if active else (None, None)
+                else:
+                    rt.states[record["type"]].update(active=active, pending_since=None, started_at=started_at)
+                record_alarm_event(record)
+                publish("alarm", {k: record[k] for k in (TREND_FIELDS if is_trend else ALARM_FIELDS)})
+        self.batches += 1
+        self.samples += len(idx)
+        self.alarms += len(alarms)
+
+    def stop(self):
+        self._stop.set()
+        for process in self._processes:
+            process.join(30)
+            if process.is_alive():
+                process.terminate()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def counters(self):
+        return {"shards": len(self.shards), "batches": self.batches, "samples": self.samples, "alarm_events": self.alarms,
+                "workers": self.workers}
+
+
+        # === asyncio engine ===
+
+# Notifications of one server's asyncua session. asyncua has its own NodeId type, so sensors are looked up in a map
+# built from their nodeId strings.
+class AsyncSubHandler(SubHandler):
+    def __init__(self, rts, lost):
+        self.track(rts)
+        self.lost = lost  # asyncio.Event, set when the server reports a bad subscription status
+
+    def track(self, rts):
+        self.by_node = {asyncua.ua.NodeId.from_string(rt.config["nodeId"]): rt for rt in rts}
+
+    def lookup(self, node):
+        return self.by_node.get(node.nodeid)
+
+    def status_change_notification(self, status):
+        code = getattr(status, "Status", status)
+        logger.warning("[WARNING] Subscription status changed: %s", code)
+        if not code.is_good():
+            self.lost.set()
+
+# IngestPipeline on the event loop: the asyncua callbacks enqueue, two tasks process samples and fan out events.
+# Callbacks run on the loop and cannot wait, so the block policy drops the oldest sample instead.
+class AsyncPipeline(IngestPipeline):
+    def __init__(self, queue_size, overflow_policy, batch_alarms=False):
+        if overflow_policy == "block":
+            logger.warning("[WARNING] The asyncio engine cannot block on a full queue, using drop_oldest.")
+            overflow_policy = "drop_oldest"
+        self.evaluator = self.new_evaluator(batch_alarms)
+        self.samples = BoundedQueue(queue_size, overflow_policy)
+        self.events = BoundedQueue(queue_size, "drop_oldest")
+        self.processed = 0
+        self.errors = 0
+        self.lock = threading.Lock()
+        self._samples_ready = asyncio.Event()
+        self._events_ready = asyncio.Event()
+
+    def put(self, rt, value, now_ts, quality=0):
+        self.samples.put(rt, (value, now_ts, quality))
+        self._samples_ready.set()
+
+    def publish(self, event, payload):
+        self.events.put(event, payload)
+        self._events_ready.set()
+
+    # Batches are taken only when items are queued, so BoundedQueue.get_batch never waits on the loop
+    async def run_samples(self):
+        while True:
+            if not len(self.samples):
+                if self.samples.closed:
+                    break
+                self._samples_ready.clear()
+                await self._samples_ready.wait()
+                continue
+            self.process_batch(self.samples.get_batch(PIPELINE_BATCH_SIZE))
+            await asyncio.sleep(0)  # let notifications in between batches
+        if self.evaluator is not None:
+            self.evaluator.store_states()
+
+    async def run_events(self, sio):
+        while True:
+            if not len(self.events):
+                if self.events.closed:
+                    return
+                self._events_ready.clear()
+                await self._events_ready.wait()
+                continue
+            for event, payload in self.events.get_batch(PIPELINE_BATCH_SIZE):
+                try:
+                    started = time.perf_counter()
+                    await sio.emit(event, payload)
+                    metrics.emit_histogram(event).observe(time.perf_counter() - started)
+                except Exception as e:
+                    logger.error("Failed to emit %s: %s", event, e)
+
+    # The tasks drain their queues and return; the owner awaits them
+    def stop(self):
+        self.samples.close()
+        self.events.close()
+        self._samples_ready.set()
+        self._events_ready.set()
+
+# Socket.IO server of the asyncio engine, with the same rooms and events as the Flask-SocketIO handlers
+def create_async_socketio():
+    import socketio as python_socketio
+    sio = python_socketio.AsyncServer(async_mode="asgi", cors_allowed_origins="*")
+
+    @sio.on("connect")
+    async def on_connect(sid, environ, auth=None):
+        await sio.enter_room(sid, "all")
+        await sio.emit("snapshot", dashboard.snapshot(), to=sid)
+
+    @sio.on("subscribe")
+    async def on_subscribe(sid, data):
+        names = (data or {}).get("sensors") or []
+        dashboard.subscribe(sid, names)
+        if names:
+            await sio.leave_room(sid, "all")
+        else:
+            await sio.enter_room(sid, "all")
+        await sio.emit("snapshot", dashboard.snapshot(names), to=sid)
+
+    @sio.on("disconnect")
+    async def on_disconnect(sid, *args):
+        dashboard.unsubscribe(sid)
+
+    return sio
+
+# Dashboard page and Socket.IO on one ASGI app; the Flask routes (History API) are mounted when asgiref is installed
+def create_asgi_app(sio):
+    import socketio as python_socketio
+    create_web_app()
+    asgiref_wsgi = optional_import("asgiref.wsgi")
+    if asgiref_wsgi is not None:
+        return python_socketio.ASGIApp(sio, other_asgi_app=asgiref_wsgi.WsgiToAsgi(app))
+    print(f"{iso(datetime.now(timezone.utc))} | asgiref is not installed: the History API is not served (python3 -m pip install asgiref).")
+    return python_socketio.ASGIApp(sio, static_files={"/": os.path.join(app.root_path, "templates", "index.html")})
+
+async def serve_web(sio, host, port):
+    uvicorn = optional_import("uvicorn")
+    if uvicorn is None:
+        print(f"{iso(datetime.now(timezone.utc))} | uvicorn is not installed: running without the web dashboard (python3 -m pip install uvicorn).")
         return
+    server = uvicorn.Server(uvicorn.Config(create_asgi_app(sio), host=host, port=port, log_level="warning"))
+    await server.serve()
 
-    def print_initial_values(client):
-        for sensor in sensors:
+async def run_dashboard(sio):
+    while True:
+        await asyncio.sleep(1.0 / max(dashboard.frame_rate, 0.1))
+        for frame, to in dashboard.take_frames():
             try:
-                node = client.get_node(sensor["nodeId"])
-                val = node.get_value()
-                num = normalize_number(val)
-                buffers[sensor['name']].append(num if num is not None else val)
-                numeric_values = [x for x in buffers[sensor['name']] if isinstance(x,(int,float)) and math.isfinite(x)]
-                if numeric_values:
-                    min_val, max_val, avg_val = min(numeric_values), max(numeric_values), mean(numeric_values)
+                started = time.perf_counter()
+                await sio.emit("update", frame, to=to)
+                metrics.emit_histogram("update").observe(time.perf_counter() - started)
+                dashboard.messages += 1
+            except Exception as e:
+                logger.error("Failed live emit: %s.", e)
+
+# Journal and sample history writes (fsync) run in the default executor, so the loop never waits for the disk
+async def run_persistence():
+    next_history = time.monotonic()
+    while True:
+        await asyncio.sleep(JOURNAL_FLUSH_INTERVAL)
+        await asyncio.to_thread(alarm_journal.maintain)
+        if historian is not None and time.monotonic() >= next_history:
+            try:
+                await asyncio.to_thread(historian.flush)
+            except Exception as e:
+                print(f"{iso(datetime.now(timezone.utc))} | Failed to write sample history: {e}")
+            next_history = time.monotonic() + historian.flush_interval
+
+# Register sensors on an asyncua session, on the subscription of their scanRate (created when missing, kept in
+# subscriptions); failed items are logged and left unsubscribed
+async def subscribe_async(client, handler, rts, endpoint, subscriptions):
+    groups = {}
+    for rt in rts:
+        rt.subscription = rt.handle = None
+        groups.setdefault(rt.config["scanRate"], []).append(rt)
+    for rate, group in sorted(groups.items()):
+        subscription = subscriptions.get(rate)
+        if subscription is None:
+            subscription = subscriptions[rate] = await client.create_subscription(subscription_params(asyncua.ua, rate), handler)
+        subscribed = 0
+        for start in range(0, len(group), MAX_ITEMS_PER_CALL):
+            chunk = group[start:start + MAX_ITEMS_PER_CALL]
+            nodes = [client.get_node(rt.config["nodeId"]) for rt in chunk]
+            handles = await subscription.create_monitored_items(monitored_item_requests(asyncua.ua, nodes, chunk))
+            retry = rejected_filters(handles)
+            if retry:
+                log_rejected_filters([chunk[i] for i in retry], [handles[i] for i in retry])
+                again = await subscription.create_monitored_items(
+                    monitored_item_requests(asyncua.ua, [nodes[i] for i in retry], [chunk[i] for i in retry], False))
+                for i, handle in zip(retry, again):
+                    handles[i] = handle
+            for rt, handle in zip(chunk, handles):
+                if isinstance(handle, asyncua.ua.StatusCode):
+                    logger.warning("[PERMISSION ERROR] Cannot subscribe to node %s (%s): %s", rt.config["nodeId"], rt.name, handle.name)
                 else:
-                    min_val = max_val = avg_val = val
-                print(
-                    f"{iso(datetime.now(timezone.utc))} | {sensor['name']} = {fmt_num(val)} {sensor.get('unit','')} | "
-                    f"Min: {fmt_num(min_val)}, Max: {fmt_num(max_val)}, Avg: {fmt_num(avg_val)} "
-                    f"(buffer {len(numeric_values)}/{buffers[sensor['name']].maxlen})",
-                    flush=True
-                )
-            except ua.UaStatusCodeError as e:
-                print(f"{iso(datetime.now(timezone.utc))} | [PERMISSION ERROR] Cannot access node {sensor['nodeId']} ({sensor['name']}): {e}")
+                    rt.subscription, rt.handle = subscription, handle
+                    subscribed += 1
+        logger.info("Subscribed to %d/%d sensors with scanRate=%sms on %s.", subscribed, len(group), rate, endpoint)
+
+# Delete the monitored items of sensors, one request per subscription and MAX_ITEMS_PER_CALL items
+async def unsubscribe_async(rts):
+    groups = {}
+    for rt in rts:
+        if rt.subscription is not None:
+            groups.setdefault(rt.subscription, []).append(rt)
+    for subscription, group in groups.items():
+        for start in range(0, len(group), MAX_ITEMS_PER_CALL):
+            handles = [rt.handle for rt in group[start:start + MAX_ITEMS_PER_CALL]]
+            try:
+                await subscription.unsubscribe(handles)
             except Exception as e:
-                print(f"{iso(datetime.now(timezone.utc))} | Failed to read initial value for {sensor['name']}: {e}")
+                logger.error("Failed to unsubscribe %d sensors: %s", len(handles), e)
+        for rt in group:
+            rt.subscription = rt.handle = None
 
+# One asyncua session per server: connect with backoff, one subscription per scanRate, check the connection every
+# healthInterval and start over when it is lost (new subscriptions deliver the current values again). A reload
+# changes the sensors of the running session (update), without reconnecting. on_fail is called when it gives up.
+class AsyncSession:
+    def __init__(self, endpoint, rts, on_fail=None):
+        self.endpoint = endpoint
+        self.rts = list(rts)
+        self.on_fail = on_fail
+        self.failed = False  # gave up after MAX_RETRIES connection attempts
+        self.stop = asyncio.Event()
+        self.lost = asyncio.Event()
+        self.handler = AsyncSubHandler(self.rts, self.lost)
+        self.client = None  # connected and subscribed session
+        self.subscriptions = {}  # scanRate -> asyncua Subscription
+        self.lock = asyncio.Lock()  # connect and subscribe vs. update
+        self.task = asyncio.create_task(self.run())
 
-    try:
-        handler = SubHandler()
-        subscriptions = []
+    async def run(self):
+        attempt = 0  # failed attempts since the last successful subscribe
+        lost_at = None  # time.monotonic() of the last connection loss
+        while not self.stop.is_set():
+            if attempt:
+                if attempt > MAX_RETRIES:
+                    logger.error("Unable to connect to %s after multiple attempts.", self.endpoint)
+                    self.failed = True
+                    if self.on_fail is not None:
+                        self.on_fail()
+                    return
+                delay = backoff_delay(attempt)
+                logger.info("Reconnecting to %s in %.1f s (attempt %d/%d).", self.endpoint, delay, attempt, MAX_RETRIES)
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self.stop.wait(), delay)
+                if self.stop.is_set():
+                    return
+            attempt += 1
+            client = asyncua.Client(url=self.endpoint)
+            try:
+                await client.connect()
+            except Exception as e:
+                logger.warning("Connection to %s failed: %s.", self.endpoint, str(e) or type(e).__name__)
+                continue
+            logger.info("Successfully connected to %s.", self.endpoint)
+            self.lost.clear()
+            try:
+                async with self.lock:
+                    await subscribe_async(client, self.handler, self.rts, self.endpoint, self.subscriptions)
+                    self.client = client
+                attempt = 0
+                if lost_at is not None:
+                    metrics.reconnect_seconds.observe(time.monotonic() - lost_at)
+                    lost_at = None
+                while not self.stop.is_set() and not self.lost.is_set():
+                    with contextlib.suppress(asyncio.TimeoutError):
+                        await asyncio.wait_for(self.stop.wait(), connection_settings["health_interval"])
+                    await client.check_connection()
+                if self.lost.is_set():
+                    logger.warning("Subscriptions on %s lost. Attempting reconnect.", self.endpoint)
+            except Exception as e:
+                logger.warning("Connection to %s lost (%s). Attempting reconnect.", self.endpoint, str(e) or type(e).__name__)
+            finally:
+                async with self.lock:
+                    self.client = None
+                    self.subscriptions = {}
+                    for rt in self.rts:
+                        rt.subscription = rt.handle = None
+                with contextlib.suppress(Exception):
+                    await client.disconnect()
+            if not self.stop.is_set() and lost_at is None:
+                lost_at = time.monotonic()
+                metrics.reconnects += 1
 
-        # Create initial subscriptions
-        for sensor in sensors:
+    # Drop the monitored items of removed sensors and register the added ones. moved: sensors whose scanRate or
+    # monitored item parameters changed, re-registered. Without a connection the next subscribe takes the new set.
+    async def update(self, removed, added, moved=()):
+        async with self.lock:
+            gone = set(removed)
+            self.rts = [rt for rt in self.rts if rt not in gone] + list(added)
+            self.handler.track(self.rts)
+            if self.client is None:
+                return
             try:
-                sub = client.create_subscription(sensor["scanRate"], handler)
-                node = client.get_node(sensor["nodeId"])
-                handle = sub.subscribe_data_change(node)
-                subscriptions.append((sub, handle))
-                print(f"{iso(datetime.now(timezone.utc))} | Subscribed to {sensor['name']} with scanRate={sensor['scanRate']}ms.")
-            except ua.UaStatusCodeError as e:
-                print(f"{iso(datetime.now(timezone.utc))} | [PERMISSION ERROR] Cannot subscribe to node {sensor['nodeId']} ({sensor['name']}): {e}")
+                await unsubscribe_async(list(removed) + list(moved))
+                await subscribe_async(self.client, self.handler, list(added) + list(moved), self.endpoint, self.subscriptions)
+                in_use = {rt.subscription for rt in self.rts}
+                for rate, subscription in list(self.subscriptions.items()):
+                    if subscription not in in_use:
+                        with contextlib.suppress(Exception):
+                            await subscription.delete()
+                        del self.subscriptions[rate]
             except Exception as e:
-                print(f"{iso(datetime.now(timezone.utc))} | Failed to subscribe to {sensor['name']}: {e}")
+                logger.error("Failed to update the subscriptions on %s: %s", self.endpoint, e)
+                self.lost.set()  # subscribe everything again after a reconnect
+
+    async def close(self):
+        self.stop.set()
+        await asyncio.gather(self.task, return_exceptions=True)
+
+# Send the changes of reload_config to the sessions of the servers they concern; sessions are started for new
+# servers (with on_fail, see AsyncSession) and closed when all their sensors are removed. Returns the sessions by endpoint.
+async def reload_sessions(sessions, diff, on_fail=None):
+    owner = {rt: session for session in sessions.values() for rt in session.rts}
+    changes = {}  # session -> ([removed], [added], [moved])
+    for rt in diff["removed"]:
+        if rt in owner:
+            changes.setdefault(owner[rt], ([], [], []))[0].append(rt)
+    for rt in diff["moved"]:
+        if rt in owner:
+            changes.setdefault(owner[rt], ([], [], []))[2].append(rt)
+    for rt in diff["added"]:
+        endpoint = rt.config.get("endpoint", ENDPOINT)
+        session = sessions.get(endpoint)
+        if session is None:
+            session = sessions[endpoint] = AsyncSession(endpoint, [], on_fail)
+        changes.setdefault(session, ([], [], []))[1].append(rt)
+    for session, (removed, added, moved) in changes.items():
+        await session.update(removed, added, moved)
+        if not session.rts:
+            await session.close()
+            del sessions[session.endpoint]
+    return sessions
+
+# Console commands: a reader on stdin where the loop supports it, otherwise blocking readlines on a daemon thread
+async def read_commands(commands):
+    loop = asyncio.get_running_loop()
+    if daemon_commands is not None:
+        for signum, command in daemon_signals():
+            loop.add_signal_handler(signum, commands.put_nowait, command)
+        return
+    try:
+        loop.add_reader(sys.stdin.fileno(), lambda: commands.put_nowait(sys.stdin.readline()))
+        return
+    except (NotImplementedError, OSError, ValueError):
+        pass
+
+    def read_lines():
+        line = None
+        while line != "":
+            try:
+                line = sys.stdin.readline()
+            except (OSError, ValueError):
+                line = ""  # no usable console: as end of input
+            with contextlib.suppress(RuntimeError):  # the loop is closed
+                loop.call_soon_threadsafe(commands.put_nowait, line)
+
+    threading.Thread(target=read_lines, name="console-reader", daemon=True).start()
+
+# Sessions, ingest, persistence and dashboard fan-out as tasks on one event loop; False when every session gave up
+async def monitor_async(web=(WEB_HOST, WEB_PORT)):
+    global stop_monitoring, file_path, alarm_journal, pipeline, historian
+
+    stop_monitoring = False
+    file_path = new_history_path()
+    recover_alarm_journals(os.path.dirname(file_path))
+
+    loop = asyncio.get_running_loop()
+    alarm_journal = AlarmJournal(file_path, alarm_history, background=False)
+    if historian_settings["enabled"]:
+        historian = Historian(historian_settings["directory"], [rt.name for rt in runtime.values()], historian_settings["flush_interval"], background=False)
+    pipeline = AsyncPipeline(pipeline_settings["queue_size"], pipeline_settings["overflow_policy"], pipeline_settings["batch_alarms"])
+    sio = create_async_socketio()
+    ingest = [asyncio.create_task(pipeline.run_samples()), asyncio.create_task(pipeline.run_events(sio))]
+    background = [asyncio.create_task(task) for task in (run_persistence(),) + ((run_dashboard(sio), serve_web(sio, *web)) if web else ())]
+    commands = asyncio.Queue()  # console lines or signals; None when a session gave up
+    watcher = None
+    failed = False
+
+    def session_failed():
+        commands.put_nowait(None)
+
+    by_endpoint = {}
+    for rt in runtime.values():
+        by_endpoint.setdefault(rt.config.get("endpoint", ENDPOINT), []).append(rt)
+    sessions = {endpoint: AsyncSession(endpoint, rts, session_failed) for endpoint, rts in by_endpoint.items()}
+    try:
+        await read_commands(commands)
+        if reload_settings["watch"]:
+            watcher = ConfigWatcher(config_path, reload_settings["interval"], lambda: loop.call_soon_threadsafe(commands.put_nowait, "r"))
+            watcher.start()
+
+        print(f"{iso(datetime.now(timezone.utc))} | Monitoring sensors (asyncio engine). {command_help()}\n")
+
+        while not stop_monitoring:
+            command = await commands.get()
+            if command is None:
+                if sessions and all(session.failed for session in sessions.values()):
+                    logger.error("Unable to reconnect. Stopping monitoring.")
+                    failed = True
+                    stop_monitoring = True
+                continue
+            if command == "":  # end of input: keep running until interrupted
+                with contextlib.suppress(Exception):
+                    loop.remove_reader(sys.stdin.fileno())
+                continue
+            command = command.strip().lower()
+            if command == "q":
+                stop_monitoring = True
+            elif command == "r":
+                # The model is reloaded on the loop; only the sessions of changed sensors touch their server
+                diff = reload_config()
+                if diff is not None:
+                    await reload_sessions(sessions, diff, session_failed)
+    finally:
+        stop_monitoring = True
+        with contextlib.suppress(Exception):
+            loop.remove_reader(sys.stdin.fileno())
+        if watcher is not None:
+            watcher.stop()
+        await asyncio.gather(*(session.close() for session in sessions.values()))
+        logger.info("Disconnected from OPC UA server.")
+        pipeline.stop()
+        await asyncio.gather(*ingest, return_exceptions=True)
+        for task in background:
+            task.cancel()
+        await asyncio.gather(*background, return_exceptions=True)
+        close_run()
+    return not failed
+
+# Entry point of --engine asyncio; returns the exit code (see --daemon in the README)
+def run_async_engine(web=(WEB_HOST, WEB_PORT)):
+    global asyncua
+    if asyncua is None:
+        asyncua = optional_import("asyncua")
+    if asyncua is None:
+        print(f"{iso(datetime.now(timezone.utc))} | The asyncio engine needs asyncua (python3 -m pip install asyncua).")
+        return 1
+    if not sensors:
+        load_config_json()
+    if not sensors or (web and not web_host_allowed(web[0])):
+        return 2
+    mark_ready()
+    try:
+        return 0 if asyncio.run(monitor_async(web)) else 1
+    except KeyboardInterrupt:
+        return 0
+
+
+        # === Run commands ===
+
+# 'q' stops a run and 'r' reloads the configuration: typed + ENTER on the console, or sent as signals to a daemon
+DAEMON_SIGNALS = (("SIGTERM", "q"), ("SIGINT", "q"), ("SIGHUP", "r"))
+DAEMON_POLL = 1.0 # s, a daemon run checks the connection supervisor at least this often
+
+daemon_commands = None # queue.SimpleQueue of a daemon (its put is safe in a signal handler)
+
+def daemon_signals():
+    return [(getattr(signal, name), command) for name, command in DAEMON_SIGNALS if hasattr(signal, name)]
+
+def start_daemon():
+    global daemon_commands
+    daemon_commands = queue.SimpleQueue()
+    for signum, command in daemon_signals():
+        signal.signal(signum, lambda signum, frame, command=command: daemon_commands.put(command))
+
+# Next command of a run: a console line, or a signal of a daemon ("" when none arrived within DAEMON_POLL)
+def next_command():
+    if daemon_commands is None:
+        return input().strip().lower()
+    try:
+        return daemon_commands.get(timeout=DAEMON_POLL)
+    except queue.Empty:
+        return ""
+
+# Wait up to `delay` s; True when a daemon was told to stop meanwhile (a reload before the run has started is dropped)
+def stop_requested(delay):
+    global stop_monitoring
+    if daemon_commands is None:
+        time.sleep(delay)
+        return False
+    deadline = time.monotonic() + delay
+    while (remaining := deadline - time.monotonic()) > 0:
+        try:
+            if daemon_commands.get(timeout=remaining) == "q":
+                stop_monitoring = True
+                return True
+        except queue.Empty:
+            break
+    return False
+
+def command_help():
+    if daemon_commands is not None:
+        return f"Send SIGTERM or SIGINT to stop, SIGHUP to reload {config_path} (pid {os.getpid()})."
+    return f"Press 'q' + ENTER anytime to stop, 'r' + ENTER to reload {config_path}."
+
+
+        # === Run simulation ===
+
+# Run the simulation when 1 is entered in the menu 
+def run_simulation():
+    global stop_monitoring, file_path, alarm_journal, pipeline, historian, supervisor
+
+    if not sensors:
+        print(f"{iso(datetime.now(timezone.utc))} | No configuration loaded. Loading default config.json.")
+        load_config_json()
+    if sharded():
+        return run_sharded()
+
+    stop_monitoring = False
+    file_path = new_history_path()
+    recover_alarm_journals(os.path.dirname(file_path))
+
+    client = connect_to_opcua()
+    if not client:
+        return stop_monitoring  # a daemon stopped while connecting ended as requested
+    alarm_journal = AlarmJournal(file_path, alarm_history)
+    if historian_settings["enabled"]:
+        historian = Historian(historian_settings["directory"], [rt.name for rt in runtime.values()], historian_settings["flush_interval"])
+    pipeline = IngestPipeline(pipeline_settings["queue_size"], pipeline_settings["overflow_policy"], pipeline_settings["batch_alarms"])
+
+    # Read all sensors and the heartbeat node in one bulk read (chunked to the server limit)
+    def print_initial_values(client):
+        rts = list(runtime.values())
+        try:
+            max_nodes = get_max_nodes_per_read(client)
+            results = read_values(client, [HEARTBEAT_NODE] + [rt.node_id for rt in rts], max_nodes)
+        except Exception as e:
+            logger.error("Failed to read initial values: %s", e)
+            return
+
+        for rt, dv in zip(rts, results[1:]):
+            if not dv.StatusCode.is_good():
+                logger.warning("[PERMISSION ERROR] Cannot access node %s (%s): %s", rt.config["nodeId"], rt.name, dv.StatusCode.name)
+                continue
+            val = dv.Value.Value
+            num = normalize_number(val)
+            buf = rt.buffer
+            if num is not None and math.isfinite(num):
+                buf.append(num, to_us(dv.SourceTimestamp or datetime.now(timezone.utc)))
+                rt.revision += 1
+            if buf:
+                min_val, max_val, avg_val = buf.min(), buf.max(), buf.mean()
+            else:
+                min_val = max_val = avg_val = val
+            logger.info(
+                "%s = %s %s | Min: %s, Max: %s, Avg: %s (buffer %d/%d)",
+                rt.name, fmt_num(val), rt.unit, fmt_num(min_val), fmt_num(max_val), fmt_num(avg_val), len(buf), buf.maxlen,
+                extra={"sensor": rt.name, "value": num, "min": min_val, "max": max_val, "avg": avg_val}
+            )
+
+
+    supervisor = ConnectionSupervisor(client, SubHandler())
+    watcher = None
+
+    # Incremental reload against the current session (menu command or file watcher)
+    def reload():
+        supervisor.reload()
+
+    try:
+        # Create initial subscriptions (one per scanRate) and watch the connection from now on
+        supervisor.start()
 
         print_initial_values(client)
 
-        print(f"{iso(datetime.now(timezone.utc))} | Monitoring sensors. Press 'q' + ENTER anytime to stop.\n If 'ServiceFault from server received while waiting for publish response' appears and the server is down, press ENTER to reconnect.\n")
+        if reload_settings["watch"]:
+            watcher = ConfigWatcher(config_path, reload_settings["interval"], reload)
+            watcher.start()
 
-        last_reconnect = 0
+        print(f"{iso(datetime.now(timezone.utc))} | Monitoring sensors. {command_help()}\n A lost connection is detected and restored in the background.\n")
 
         while not stop_monitoring:
             try:
-                if input().strip().lower() == "q" :
-                #if keyboard.is_pressed("q"):
+                command = next_command()
+                if supervisor.failed:
                     stop_monitoring = True
                     break
-
-                now = time.time()
-                if now - last_reconnect < 2:
-                    time.sleep(0.2)
-                    continue
-
-                # Ping server to detect connection loss
-                try:
-                    client.get_node("i=1008").get_value()  
-                except ua.UaStatusCodeError as e:
-                    print(f"{iso(datetime.now(timezone.utc))} | [PERMISSION ERROR] Cannot read heartbeat node i=1008: {e}")
-                except Exception:
-                    print(f"{iso(datetime.now(timezone.utc))} | Connection lost. Attempting reconnect.\n")
-                    new_client = reconnect(client)
-                    if not new_client:
-                        print(f"{iso(datetime.now(timezone.utc))} | Unable to reconnect. Stopping monitoring.\n")
-                        stop_monitoring = True
-                        break
-                    client = new_client
-
-                    # Re-subscribe after reconnect
-                    subscriptions.clear()
-                    for sensor in sensors:
-                        sub = client.create_subscription(sensor["scanRate"], handler)
-                        node = client.get_node(sensor["nodeId"])
-                        handle = sub.subscribe_data_change(node)
-                        subscriptions.append((sub, handle))
-                    print(f"{iso(datetime.now(timezone.utc))} | Subscriptions restored after reconnect.\n")
-
-                    # Print initial values again
-                    print_initial_values(client)
+                if command == "q" :
+                    stop_monitoring = True
+                    break
+                if command == "r":
+                    reload()
 
             except KeyboardInterrupt:
                 stop_monitoring = True
 
     finally:
+        if watcher is not None:
+            watcher.stop()
+        running_supervisor, supervisor = supervisor, None
+        running_supervisor.stop()
         try:
-            client.disconnect()
+            running_supervisor.client.disconnect()
         except:
             pass
-        print(f"{iso(datetime.now(timezone.utc))} | Disconnected from OPC UA server.")
+        logger.info("Disconnected from OPC UA server.")
+        logger.info("Connection: %s", json.dumps(running_supervisor.counters()))
+        close_run()
+    return not running_supervisor.failed
+
+# Stop the pipeline and write the sample history and the alarm history of a run
+def close_run():
+    global pipeline, historian, alarm_journal
+    running, pipeline = pipeline, None
+    running.stop()
+    print(f"{iso(datetime.now(timezone.utc))} | Pipeline: {json.dumps(running.counters())}")
+    if historian is not None:
+        history, historian = historian, None
+        try:
+            history.close()
+            print(f"{iso(datetime.now(timezone.utc))} | Sample history written to {history.directory}: {json.dumps(history.counters())}")
+        except Exception as e:
+            print(f"{iso(datetime.now(timezone.utc))} | Failed to write sample history: {e}")
+    journal, alarm_journal = alarm_journal, None
+    try:
+        journal.close()
+    except Exception as e:
+        print(f"{iso(datetime.now(timezone.utc))} | Failed to compact alarm journal: {e}")
         write_alarm_history()
-        print(f"{iso(datetime.now(timezone.utc))} | Alarm history saved to {file_path}.")
+    print(f"{iso(datetime.now(timezone.utc))} | Alarm history saved to {file_path}.")
+
+# Sharded run: the shard workers connect, subscribe and evaluate alarms; this process merges their samples and alarm
+# events and serves the dashboard. A reload applies the new configuration here and sends each affected worker its part.
+def run_sharded():
+    global stop_monitoring, file_path, alarm_journal, pipeline, historian
+
+    stop_monitoring = False
+    file_path = new_history_path()
+    recover_alarm_journals(os.path.dirname(file_path))
+
+    alarm_journal = AlarmJournal(file_path, alarm_history)
+    if historian_settings["enabled"]:
+        historian = Historian(historian_settings["directory"], [rt.name for rt in runtime.values()], historian_settings["flush_interval"])
+    # Dashboard fan-out only: samples arrive already processed by the workers
+    pipeline = IngestPipeline(pipeline_settings["queue_size"], pipeline_settings["overflow_policy"])
+    coordinator = ShardCoordinator(plan_shards(runtime.values()))
+    reload_lock = threading.Lock()
+    watcher = None
+
+    def reload():
+        with reload_lock:
+            diff = reload_config()
+            if diff is not None:
+                coordinator.reload(diff)
+
+    try:
+        coordinator.start()
+        if reload_settings["watch"]:
+            watcher = ConfigWatcher(config_path, reload_settings["interval"], reload)
+            watcher.start()
+
+        print(f"{iso(datetime.now(timezone.utc))} | Monitoring sensors in {len(coordinator.shards)} worker processes. {command_help()}\n")
+
+        while not stop_monitoring:
+            try:
+                command = next_command()
+                if command == "q":
+                    stop_monitoring = True
+                    break
+                if command == "r":
+                    reload()
+
+            except KeyboardInterrupt:
+                stop_monitoring = True
+
+    finally:
+        if watcher is not None:
+            watcher.stop()
+        with reload_lock:
+            coordinator.stop()
+        print(f"{iso(datetime.now(timezone.utc))} | Shard workers stopped: {json.dumps(coordinator.counters())}")
+        close_run()
+    return True
+
+
+        # === Replay recorded data ===
+
+# Stream (nodeId, SourceTimestamp, value) records from a CSV file (with header) or a JSONL file
+def read_recording(path):
+    import csv
+
+    def parse_ts(text):
+        ts = datetime.fromisoformat(str(text).strip().replace("Z", "+00:00"))
+        return ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
+
+    with open(path, "r", newline="", encoding="utf-8") as f:
+        if path.lower().endswith((".jsonl", ".ndjson")):
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    yield record["nodeId"], parse_ts(record["SourceTimestamp"]), record["value"]
+        else:
+            for row in csv.DictReader(f):
+                yield row["nodeId"], parse_ts(row["SourceTimestamp"]), row["value"]
+
+# Feed a recording through SubHandler as fast as possible (speed=0) or at `speed` x real time
+def replay_recording(path, speed=0.0, quiet=True):
+    global stop_monitoring, file_path, alarm_journal, pipeline
+    load_config_json()
+    if not sensors:
+        return
+    if not os.path.exists(path):
+        print(f"{iso(datetime.now(timezone.utc))} | Recording '{path}' not found.")
+        return
+
+    stop_monitoring = False
+    file_path = new_history_path("alarm_history_replay")
+    alarm_journal = AlarmJournal(file_path, alarm_history)
+    pipeline = IngestPipeline(pipeline_settings["queue_size"], "block", pipeline_settings["batch_alarms"])
+    previous_level = logger.level
+    if quiet:
+        logger.setLevel(logging.ERROR)
+
+    handler = SubHandler()
+    node_ids = {}   # nodeId string -> node stand-in with a parsed NodeId
+    count = 0
+    first_ts = None
+    print(f"{iso(datetime.now(timezone.utc))} | Replaying {path} ({'max speed' if speed <= 0 else f'{speed}x real time'}).")
+    start = time.perf_counter()
+    try:
+        for node_id, src_ts, value in read_recording(path):
+            node = node_ids.get(node_id)
+            if node is None:
+                node = node_ids[node_id] = types.SimpleNamespace(nodeid=ua.NodeId.from_string(node_id))
+            item = types.SimpleNamespace(Value=types.SimpleNamespace(SourceTimestamp=src_ts))
+            if speed > 0:
+                if first_ts is None:
+                    first_ts = src_ts
+                delay = (src_ts - first_ts).total_seconds() / speed - (time.perf_counter() - start)
+                if delay > 0:
+                    time.sleep(delay)
+            handler.datachange_notification(node, value, types.SimpleNamespace(monitored_item=item))
+            count += 1
+    except KeyboardInterrupt:
+        print(f"{iso(datetime.now(timezone.utc))} | Replay interrupted.")
+    except Exception as e:
+        print(f"{iso(datetime.now(timezone.utc))} | Replay failed after {count} samples: {e}")
+    finally:
+        running, pipeline = pipeline, None
+        running.stop()
+        elapsed = time.perf_counter() - start
+        journal, alarm_journal = alarm_journal, None
+        journal.close()
+        logger.setLevel(previous_level)
+
+    stats = alarm_history["statistics"]
+    by_sensor = {}
+    for alarm in alarm_history["alarms"]:
+        by_sensor.setdefault(alarm["sensor"], {"HH": 0, "H": 0, "L": 0, "LL": 0})[alarm["type"]] += 1
+    print("\n=== Replay report ===")
+    print(f"Samples: {count} in {elapsed:.2f}s ({count / elapsed if elapsed > 0 else 0:.0f} samples/s)")
+    print(f"Alarms: {stats['total_alarms']} total, {stats['active_alarms']} still active, by type {stats['by_type']}")
+    for name, counts in sorted(by_sensor.items()):
+        print(f"  {name}: " + ", ".join(f"{lvl}={n}" for lvl, n in counts.items()))
+    trends = alarm_history.get("trends", [])
+    print(f"Trends: {len(trends)} total ({sum(t['type'] == 'RISE' for t in trends)} rise, {sum(t['type'] == 'FALL' for t in trends)} fall), "
+          f"{sum(t['active'] for t in trends)} still active")
+    print(f"Alarm history saved to {file_path}.")
 
 
         # === Main menu ===
@@ -543,10 +4772,12 @@ def menu():
     while not exit_program:
         print("\n=== OPC UA MENU ===")
         print("[1] Run simulation")
-        print("[2] Load config.json")
+        print(f"[2] Load {config_path} (keeps buffers and alarm history when already loaded)")
         print(f"[3] Set decimal precision (currently {DECIMALS})")
-        print("[4] Acknowledge alarm")
-        print("[5] Export alarm history to CSV")
+        print("[4] Acknowledge alarms")
+        print("[5] Export alarm history (CSV, gzip, Parquet or NPZ)")
+        print("[6] Replay recorded data")
+        print("[7] Profile for N seconds" + (" (running)" if profiler.running else ""))
         print("[0] Exit program")
         choice = input("Choice: ").strip()
 
@@ -559,7 +4790,7 @@ def menu():
             run_simulation()
 
         elif choice_int == 2:
-            load_config_json()
+            reload_config()
 
         elif choice_int == 3:
             try:
@@ -573,30 +4804,29 @@ def menu():
                 print("Invalid number.")
 
         elif choice_int == 4:
-            if not alarm_history.get("alarms"):
-                print("No alarms to acknowledge.")
-            else:
-                for idx, alarm in enumerate(alarm_history["alarms"], start=1):
-                    status = "ACK" if alarm["acknowledged"] else "UNACK"
-                    print(f"[{idx}] {alarm['timestamp']} | {alarm['sensor']} | {alarm['type']} | Active={alarm['active']} | {status}")
-                print("[0] Do nothing")
-                    
-                try:
-                    ack_idx = int(input("\nEnter alarm index to acknowledge: ").strip())
-                    if ack_idx == 0:
-                        print("Canceled acknowledgment.")
-                    else:
-                        actual_index = ack_idx - 1
-                        # Attempt real method call
-                        client = connect_to_opcua()  
-                        acknowledge_alarm(actual_index, client)
-                        if client:
-                            client.disconnect()
-                except ValueError:
-                    print("Invalid input.")
+            browse_alarms()
 
         elif choice_int == 5:
-            export_alarm_history_csv()
+            export_alarm_history()
+
+        elif choice_int == 6:
+            path = os.path.expanduser(input("Recording file (CSV or JSONL): ").strip())
+            try:
+                speed = float(input("Speed factor (0 = as fast as possible, 1 = real time): ").strip() or 0)
+                replay_recording(path, speed)
+            except ValueError:
+                print("Invalid number.")
+
+        elif choice_int == 7:
+            try:
+                seconds = float(input("Seconds to profile (profiling runs in the background): ").strip() or 30)
+                path = start_profile(seconds)
+                if path is None:
+                    print(f"A profile is already running ({profiler.path}).")
+                else:
+                    print(f"Profiling for {seconds:g} s, the profile is written to {path}.")
+            except ValueError:
+                print("Invalid number.")
 
         elif choice_int == 0:
             print("Exiting program.")
@@ -607,6 +4837,41 @@ def menu():
 
 # Main code
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="OPC UA sensor monitoring")
+    parser.add_argument("config", nargs="?", default=config_path, help=f"configuration file (default: {config_path})")
+    parser.add_argument("--daemon", action="store_true",
+                        help="headless: monitor right away without the menu or console input; SIGTERM/SIGINT stop, SIGHUP reloads the configuration")
+    parser.add_argument("--web", action=argparse.BooleanOptionalAction, default=None,
+                        help="serve the dashboard, History API and /metrics (default: on, off with --daemon)")
+    parser.add_argument("--host", default=WEB_HOST, help=f"web server address (default: {WEB_HOST})")
+    parser.add_argument("--port", type=int, default=WEB_PORT, help=f"web server port (default: {WEB_PORT})")
+    parser.add_argument("--replay", metavar="FILE", help="replay recorded samples (CSV or JSONL with nodeId, SourceTimestamp, value) and exit")
+    parser.add_argument("--speed", type=float, default=0.0, help="replay speed factor (0 = as fast as possible, 1 = real time)")
+    parser.add_argument("--verbose", action="store_true", help="keep sample and alarm logging during replay")
+    parser.add_argument("--engine", choices=("threads", "asyncio"), default="threads",
+                        help="threads: python-opcua client and the menu; asyncio: asyncua sessions on one event loop, monitoring right away")
+    args = parser.parse_args()
+    config_path = args.config
+    web = (args.host, args.port) if (not args.daemon if args.web is None else args.web) else None
+    if args.replay:
+        replay_recording(args.replay, args.speed, quiet=not args.verbose)
+        raise SystemExit(0)
+    if args.daemon:
+        start_daemon()
+    if args.engine == "asyncio":
+        raise SystemExit(run_async_engine(web))
+
     load_config_json()
-    threading.Thread(target=lambda: socketio.run(app, host="127.0.0.1", port=5000), daemon=True).start()
-    menu()
+    if web and not web_host_allowed(web[0]):
+        raise SystemExit(2)
+    if web:
+        start_web_server(*web)
+        dashboard.start()
+    mark_ready()
+    if not args.daemon:
+        menu()
+        raise SystemExit(0)
+    if not sensors:
+        raise SystemExit(2)
+    print(f"{iso(datetime.now(timezone.utc))} | Ready in {metrics.startup_seconds * 1000:.0f} ms, {resident_bytes() / 2**20:.1f} MB resident.")
+    raise SystemExit(0 if run_simulation() else 1)
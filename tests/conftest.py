@@ -0,0 +1,50 @@
+import json
+
+import pytest
+
+import opcua_monitor as monitor
+
+
+def alarm_record(sensor, event="ALARM_ACTIVE", level="H", timestamp="2024-01-01T00:00:00Z"):
+    return {"event": event, "timestamp": timestamp, "sensor": sensor, "nodeId": "ns=2;s=" + sensor, "type": level,
+            "priority": 1, "value": "85.00", "threshold": 80.0, "duration": None, "active": event == "ALARM_ACTIVE",
+            "acknowledged": False}
+
+
+@pytest.fixture
+def alarm():
+    return alarm_record
+
+
+# Empty alarm history of a run writing to tmp_path
+@pytest.fixture
+def history(tmp_path, monkeypatch):
+    history = monitor.AlarmHistory()
+    monkeypatch.setattr(monitor, "alarm_history", history)
+    monkeypatch.setattr(monitor, "file_path", str(tmp_path / "alarm_history_test.json"))
+    return history
+
+
+MODEL_STATE = ("sensors", "buffers", "states", "last_values", "prev_values", "runtime", "runtime_by_name", "loaded_config",
+               "alarm_settings", "trend_settings", "pipeline_settings", "dashboard_settings", "web_settings",
+               "historian_settings", "reload_settings", "connection_settings", "buffer_settings", "monitoring_settings",
+               "sharding_settings", "log_settings")
+
+
+# Isolated runtime model and settings, loaded from a config file written by the returned function
+@pytest.fixture
+def model(tmp_path, monkeypatch, history):
+    for name in MODEL_STATE:
+        value = getattr(monitor, name)
+        monkeypatch.setattr(monitor, name, type(value)(value))
+    for name in ("TIME_DELAY", "ENDPOINT", "config_mtime", "config_revision", "pipeline", "historian", "outbox"):
+        monkeypatch.setattr(monitor, name, getattr(monitor, name))
+    monkeypatch.setattr(monitor, "config_path", str(tmp_path / "config.json"))
+
+    def write_config(sensors, **settings):
+        config = {"logSettings": {"quiet": True}, **settings, "sensors": sensors}
+        with open(monitor.config_path, "w") as f:
+            json.dump(config, f)
+
+    yield write_config
+    monitor.shutdown_logging()
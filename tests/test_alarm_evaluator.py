@@ -0,0 +1,87 @@
+import math
+import random
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import opcua_monitor as monitor
+
+pytest.importorskip("numpy")
+
+SENSOR = {"name": "T1", "nodeId": "ns=2;s=T1", "deadband": 2.0,
+          "alarms": {"high_high": 90, "high": 80, "low": 10, "low_low": 5}}
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def sensor_runtime(config=SENSOR):
+    return monitor.SensorRuntime(config, monitor.RollingWindow(10), monitor.new_sensor_states())
+
+
+@pytest.fixture
+def events(monkeypatch):
+    emitted = []
+
+    def emit_event(event_type, sensor, level, value, threshold, now_ts, started_at=None):
+        emitted.append((event_type, sensor["name"], level, value, threshold, now_ts, started_at))
+
+    monkeypatch.setattr(monitor, "emit_event", emit_event)
+    return emitted
+
+
+# Events and final states of check_levels and of BatchAlarmEvaluator for the same samples, sent in batches of batch
+def run_both(events, values, delay=0.0, batch=7, configs=(SENSOR,), monkeypatch=None):
+    monkeypatch.setattr(monitor, "TIME_DELAY", delay)
+    samples = [(i % len(configs), value, START + timedelta(seconds=i)) for i, value in enumerate(values)]
+    rts = [sensor_runtime(config) for config in configs]
+    for k, value, ts in samples:
+        monitor.check_levels(rts[k], value, ts)
+    expected, states = list(events), [rt.states for rt in rts]
+    events.clear()
+
+    rts = [sensor_runtime(config) for config in configs]
+    evaluator = monitor.BatchAlarmEvaluator(rts)
+    for start in range(0, len(samples), batch):
+        evaluator.evaluate([(rts[k], value, ts) for k, value, ts in samples[start:start + batch]])
+    evaluator.store_states()
+    return expected, states, list(events), [rt.states for rt in rts]
+
+
+def test_boundaries(events, monkeypatch):
+    # Exactly at a limit activates, exactly at limit -/+ deadband clears
+    values = [80, 79, 78, 80, 90, 88, 87, 78, 10, 11, 12, 5, 7, 8, 12, 80.0, 77.999]
+    expected, states, got, batch_states = run_both(events, values, monkeypatch=monkeypatch)
+    assert [e[:3] for e in expected][:2] == [("ALARM_ACTIVE", "T1", "H"), ("ALARM_CLEAR", "T1", "H")]
+    assert got == expected and batch_states == states
+
+
+def test_hysteresis(events, monkeypatch):
+    # Between the clear limit and the limit the state holds, active or not
+    values = [81, 79, 78.5, 79.9, 77, 79, 80]
+    expected, states, got, batch_states = run_both(events, values, monkeypatch=monkeypatch)
+    assert [e[0] for e in expected] == ["ALARM_ACTIVE", "ALARM_CLEAR", "ALARM_ACTIVE"]
+    assert got == expected and batch_states == states
+
+
+def test_nan(events, monkeypatch):
+    # NaN compares false: it neither activates nor clears, and resets a pending alarm
+    values = [85, math.nan, 70, math.nan, 85, math.nan, 86, 87, 88]
+    expected, states, got, batch_states = run_both(events, values, delay=2.0, monkeypatch=monkeypatch)
+    assert [e[:4] for e in expected] == [("ALARM_ACTIVE", "T1", "H", 88)]
+    assert got == expected and batch_states == states
+
+
+def test_time_delay(events, monkeypatch):
+    values = [85, 86, 70, 85, 86, 87, 88, 70, 3, 3, 3, 3, 50]
+    expected, states, got, batch_states = run_both(events, values, delay=2.0, batch=3, monkeypatch=monkeypatch)
+    assert got == expected and batch_states == states
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_random_samples(events, monkeypatch, seed):
+    rng = random.Random(seed)
+    configs = [dict(SENSOR, name=f"T{i}", nodeId=f"ns=2;s=T{i}", deadband=rng.choice([0.0, 1.0, 5.0])) for i in range(4)]
+    configs[3]["alarms"] = {"high": 50}
+    values = [rng.choice([math.nan, 80, 90, 10, 5, rng.uniform(0, 100)]) for _ in range(400)]
+    expected, states, got, batch_states = run_both(events, values, delay=rng.choice([0.0, 3.0]), batch=rng.randint(1, 50),
+                                                   configs=configs, monkeypatch=monkeypatch)
+    assert got == expected and batch_states == states
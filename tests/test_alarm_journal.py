@@ -0,0 +1,147 @@
+import json
+import os
+
+import pytest
+
+import opcua_monitor as monitor
+
+
+def test_write_json_atomic_replaces_target(tmp_path):
+    path = tmp_path / "history.json"
+    path.write_text("old")
+    monitor.write_json_atomic(str(path), {"alarms": [1, 2]})
+    assert json.loads(path.read_text()) == {"alarms": [1, 2]}
+    assert os.listdir(tmp_path) == ["history.json"]
+
+
+def test_write_json_atomic_keeps_target_on_error(tmp_path):
+    path = tmp_path / "history.json"
+    path.write_text("old")
+    with pytest.raises(TypeError):
+        monitor.write_json_atomic(str(path), {"bad": object()})
+    assert path.read_text() == "old"
+    assert os.listdir(tmp_path) == ["history.json"]
+
+
+def test_write_json_atomic_needs_a_path():
+    with pytest.raises(ValueError):
+        monitor.write_json_atomic("", {})
+
+
+def test_write_alarm_history_without_run(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(monitor, "file_path", "")
+    monitor.write_alarm_history()
+    assert os.listdir(tmp_path) == []
+
+
+def test_compact_reopens_journal_when_rotation_fails(tmp_path, monkeypatch, alarm):
+    journal = monitor.AlarmJournal(str(tmp_path / "alarm_history_x.json"), monitor.AlarmHistory(), background=False)
+    journal.record(alarm("T1"))
+    real_replace = os.replace
+
+    def failing_replace(src, dst):
+        if src == journal.path:
+            raise OSError("disk full")
+        real_replace(src, dst)
+
+    monkeypatch.setattr(os, "replace", failing_replace)
+    with pytest.raises(OSError):
+        journal.compact()
+    monkeypatch.setattr(os, "replace", real_replace)
+    assert not journal._file.closed
+    journal.record(alarm("T2"))
+    journal.flush()
+    assert [r["sensor"] for r in map(json.loads, open(journal.path))] == ["T1", "T2"]
+    journal.close()
+    assert len(monitor.replay_alarm_journal(journal.snapshot_path)["alarms"]) == 2
+
+
+def test_failed_flush_keeps_records(tmp_path, monkeypatch, alarm):
+    journal = monitor.AlarmJournal(str(tmp_path / "alarm_history_x.json"), monitor.AlarmHistory(), background=False)
+    journal.record(alarm("T1"))
+    monkeypatch.setattr(os, "fsync", lambda fd: (_ for _ in ()).throw(OSError("I/O error")))
+    journal.maintain()
+    assert journal.pending() == 1
+    monkeypatch.undo()
+    journal.flush()
+    assert journal.pending() == 0
+    journal.close()
+    assert os.listdir(tmp_path) == ["alarm_history_x.json"]
+    assert len(monitor.replay_alarm_journal(journal.snapshot_path)["alarms"]) == 1
+
+
+def test_failed_snapshot_keeps_rotated_journal(tmp_path, monkeypatch, alarm):
+    journal = monitor.AlarmJournal(str(tmp_path / "alarm_history_x.json"), monitor.AlarmHistory(), background=False)
+    journal.record(alarm("T1"))
+    real_write = monitor.write_json_atomic
+    monkeypatch.setattr(monitor, "write_json_atomic", lambda path, data: (_ for _ in ()).throw(OSError("disk full")))
+    with pytest.raises(OSError):
+        journal.compact()
+    journal.record(alarm("T2"))
+    with pytest.raises(OSError):
+        journal.compact()
+    monkeypatch.setattr(monitor, "write_json_atomic", real_write)
+    assert len(monitor.replay_alarm_journal(journal.snapshot_path)["alarms"]) == 2
+    journal.close()
+    assert os.listdir(tmp_path) == ["alarm_history_x.json"]
+    assert len(monitor.replay_alarm_journal(journal.snapshot_path)["alarms"]) == 2
+
+
+def test_recover_skips_journals_of_running_instances(tmp_path, alarm):
+    live = monitor.AlarmJournal(str(tmp_path / "alarm_history_20240101_000000_1.json"), monitor.AlarmHistory(), background=False)
+    live.record(alarm("T1"))
+    live.flush()
+    crashed = monitor.AlarmJournal(str(tmp_path / "alarm_history_20240101_000000_2.json"), monitor.AlarmHistory(), background=False)
+    crashed.record(alarm("T2"))
+    crashed.flush()
+    crashed._file.close()
+    crashed._lock_file.close()  # the lock goes away with the process
+
+    monitor.recover_alarm_journals(str(tmp_path))
+
+    assert os.path.exists(live.path) and os.path.exists(live.lock_path)
+    assert not os.path.exists(crashed.path) and not os.path.exists(crashed.lock_path)
+    with open(crashed.snapshot_path) as f:
+        assert [a["sensor"] for a in json.load(f)["alarms"]] == ["T2"]
+    live.record(alarm("T3"))
+    live.close()
+    assert sorted(os.listdir(tmp_path)) == ["alarm_history_20240101_000000_1.json", "alarm_history_20240101_000000_2.json"]
+    assert len(monitor.replay_alarm_journal(live.snapshot_path)["alarms"]) == 2
+
+
+def test_journal_refuses_a_locked_history(tmp_path):
+    path = str(tmp_path / "alarm_history_x.json")
+    journal = monitor.AlarmJournal(path, monitor.AlarmHistory(), background=False)
+    with pytest.raises(RuntimeError):
+        monitor.AlarmJournal(path, monitor.AlarmHistory(), background=False)
+    journal.close()
+
+
+def test_history_paths_are_unique_per_process():
+    assert monitor.new_history_path().endswith(f"_{os.getpid()}.json")
+
+
+# The snapshot replays the journal onto the previous one, without holding the lock record() takes
+def test_compact_snapshot_matches_history(tmp_path, monkeypatch, alarm):
+    history = monitor.AlarmHistory()
+    history.apply(alarm("T0"))  # from before the journal was opened
+    journal = monitor.AlarmJournal(str(tmp_path / "alarm_history_x.json"), history, background=False)
+    real_replay = monitor.replay_alarm_journal
+
+    def replay(*args):
+        assert not journal._lock.locked()
+        return real_replay(*args)
+
+    monkeypatch.setattr(monitor, "replay_alarm_journal", replay)
+    journal.record(alarm("T1"))
+    journal.record(alarm("T2", level="L"))
+    journal.compact()
+    journal.record(alarm("T1", event="ALARM_CLEAR"))
+    journal.record({"event": "ACK", "index": 2})
+    journal.compact()
+    with open(journal.snapshot_path) as f:
+        snapshot = json.load(f)
+    assert snapshot.pop("journal_seq") == journal.seq == 4
+    assert snapshot == json.loads(json.dumps(history))
+    journal.close()
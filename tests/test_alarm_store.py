@@ -0,0 +1,108 @@
+import random
+
+import pytest
+
+import opcua_monitor as monitor
+from opcua import ua
+
+
+@pytest.fixture
+def store(history, monkeypatch):
+    monkeypatch.setattr(monitor, "alarm_journal", None)
+    monkeypatch.setattr(monitor, "outbox", None)
+    return history
+
+
+# Stub python-opcua client: records every Call request and answers with the given status per object
+class StubClient:
+    def __init__(self, bad=(), error=None):
+        self.calls = []
+        self.bad = set(bad)
+        self.error = error
+        self.uaclient = self
+
+    def call(self, requests):
+        self.calls.append(requests)
+        if self.error is not None:
+            raise self.error
+        return [ua.CallMethodResult() if r.ObjectId.to_string() not in self.bad else self.bad_result() for r in requests]
+
+    @staticmethod
+    def bad_result():
+        result = ua.CallMethodResult()
+        result.StatusCode = ua.StatusCode(ua.StatusCodes.BadConditionBranchAlreadyAcked)
+        return result
+
+
+def raise_alarms(alarm, count):
+    monitor.record_alarm_events([alarm(f"S{i}", timestamp=f"2024-01-01T00:00:{i % 60:02d}Z") for i in range(count)])
+
+
+# One CallMethodRequest per alarm, MAX_ITEMS_PER_CALL requests per Call service request
+def test_acknowledge_in_batches(store, alarm, monkeypatch):
+    monkeypatch.setattr(monitor, "MAX_ITEMS_PER_CALL", 3)
+    raise_alarms(alarm, 8)
+    client = StubClient(bad={"ns=2;s=S4"})
+    assert monitor.acknowledge_alarms([7, 0, 1, 1, 2, 3, 4, 5, 99, -1], client, "shift change") == [7, 0, 1, 2, 3, 4, 5]
+    assert [len(requests) for requests in client.calls] == [3, 3, 1]
+    requests = [r for batch in client.calls for r in batch]
+    assert [r.ObjectId.to_string() for r in requests] == [f"ns=2;s=S{i}" for i in (7, 0, 1, 2, 3, 4, 5)]
+    first = requests[0]
+    assert first.MethodId == ua.NodeId(ua.ObjectIds.AcknowledgeableConditionType_Acknowledge)
+    assert first.InputArguments[0].Value == store["alarms"][7]["timestamp"].encode()
+    assert first.InputArguments[1].Value.Text == "shift change"
+
+    # Marked locally whatever the server answered; acknowledged alarms are not sent again
+    assert [a["acknowledged"] for a in store["alarms"]] == [True] * 6 + [False, True]
+    assert store["statistics"]["unacknowledged_alarms"] == 1
+    client = StubClient()
+    assert monitor.acknowledge_alarms([0, 6], client) == [6]
+    assert [len(requests) for requests in client.calls] == [1]
+    assert monitor.acknowledge_alarms([0, 6], client) == [] and len(client.calls) == 1
+
+
+# A server without Acknowledge: the first failed Call stops the batches, the alarms are still marked locally
+def test_acknowledge_without_server_support(store, alarm, monkeypatch):
+    monkeypatch.setattr(monitor, "MAX_ITEMS_PER_CALL", 2)
+    raise_alarms(alarm, 5)
+    client = StubClient(error=ua.UaStatusCodeError(ua.StatusCodes.BadMethodInvalid))
+    assert monitor.acknowledge_alarms(range(5), client) == [0, 1, 2, 3, 4]
+    assert len(client.calls) == 1
+    assert store["statistics"]["unacknowledged_alarms"] == 0
+
+
+def linear_query(alarms, sensor=None, level=None, active=None, acknowledged=None):
+    return [i for i in reversed(range(len(alarms)))
+            if (sensor is None or alarms[i]["sensor"] == sensor) and (level is None or alarms[i]["type"] == level)
+            and (active is None or alarms[i]["active"] == active)
+            and (acknowledged is None or alarms[i]["acknowledged"] == acknowledged)]
+
+
+# The indexed query, on a random history and on the same history reindexed after a reload, against a linear scan
+def test_query_matches_a_linear_scan(history, alarm):
+    rng = random.Random(7)
+    sensors, levels = ["T1", "T2", "T3", "P1"], ["HH", "H", "L", "LL"]
+    for k in range(600):
+        sensor, level = rng.choice(sensors), rng.choice(levels)
+        roll = rng.random()
+        if roll < 0.5:
+            history.apply(alarm(sensor, level=level, timestamp=f"2024-01-01T00:{k // 60 % 60:02d}:{k % 60:02d}Z"))
+        elif roll < 0.8:
+            history.apply({"event": "ALARM_CLEAR", "sensor": sensor, "type": level, "duration": 1.0})
+        elif history["alarms"]:
+            history.apply({"event": "ACK", "index": rng.randrange(len(history["alarms"]))})
+
+    alarms = history["alarms"]
+    stats = history["statistics"]
+    assert stats["by_type"] == {level: sum(a["type"] == level for a in alarms) for level in levels}
+    assert stats["active_alarms"] == sum(a["active"] for a in alarms)
+    assert stats["unacknowledged_alarms"] == sum(not a["acknowledged"] for a in alarms)
+
+    reloaded = monitor.AlarmHistory({"alarms": [dict(a) for a in alarms], "trends": []})
+    filters = [dict(sensor=s, level=l, active=a, acknowledged=k)
+               for s in sensors + [None, "X9"] for l in levels + [None] for a in (None, True, False) for k in (None, True, False)]
+    for store in (history, reloaded):
+        for f in filters:
+            expected = linear_query(alarms, **f)
+            assert store.query(**f) == (len(expected), expected), f
+            assert store.query(offset=3, limit=5, **f) == (len(expected), expected[3:8]), f
@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+
+import opcua_monitor as monitor
+from tests.test_subscriptions import free_port
+
+asyncua = pytest.importorskip("asyncua")
+
+
+def sensor(name, rate=100):
+    return {"name": name, "nodeId": f"ns=2;s={name}", "scanRate": rate, "alarms": {"high": 80}}
+
+
+def value(name):
+    return monitor.last_values.get(name, (None,))[0]
+
+
+async def wait_for(condition, timeout=5.0):
+    for _ in range(int(timeout / 0.05)):
+        if condition():
+            return True
+        await asyncio.sleep(0.05)
+    return condition()
+
+
+# A reload on the asyncio engine changes the monitored items of the running session, without reconnecting
+def test_async_session_reload(model, monkeypatch):
+    monkeypatch.setattr(monitor, "asyncua", asyncua)
+    monkeypatch.setattr(monitor, "stop_monitoring", False)
+
+    async def run():
+        endpoint = f"opc.tcp://127.0.0.1:{free_port()}/test"
+        server = asyncua.Server()
+        await server.init()
+        server.set_endpoint(endpoint)
+        await server.register_namespace("test")
+        variables = {name: await server.nodes.objects.add_variable(asyncua.ua.NodeId(name, 2), name, value)
+                     for name, value in (("T1", 20.0), ("T2", 30.0))}
+        async with server:
+            model([sensor("T1")], endpoint=endpoint)
+            monitor.load_config_json()
+            sessions = {endpoint: monitor.AsyncSession(endpoint, monitor.runtime.values())}
+            session = sessions[endpoint]
+            try:
+                assert await wait_for(lambda: value("T1") == 20.0)
+                client = session.client
+                t1 = monitor.runtime_by_name["T1"]
+
+                model([sensor("T2")], endpoint=endpoint)
+                diff = monitor.reload_config()
+                await monitor.reload_sessions(sessions, diff)
+                assert await wait_for(lambda: value("T2") == 30.0)
+                assert session.client is client
+                assert t1.subscription is None and [rt.name for rt in session.rts] == ["T2"]
+                assert len(session.subscriptions) == 1
+
+                await variables["T2"].write_value(31.0)
+                assert await wait_for(lambda: value("T2") == 31.0)
+
+                # A changed scanRate moves the item to a new subscription and deletes the unused one
+                model([sensor("T2", 200)], endpoint=endpoint)
+                await monitor.reload_sessions(sessions, monitor.reload_config())
+                assert list(session.subscriptions) == [200] and session.client is client
+                await variables["T2"].write_value(32.0)
+                assert await wait_for(lambda: value("T2") == 32.0)
+            finally:
+                await asyncio.gather(*(s.close() for s in sessions.values()))
+
+    asyncio.run(run())
+
+
+# The asyncio engine exits with 2 without sensors and with 1 once every session has given up
+def test_async_engine_exit_codes(model, monkeypatch, tmp_path):
+    monkeypatch.setattr(monitor, "asyncua", asyncua)
+    monkeypatch.setattr(monitor, "daemon_commands", monitor.queue.SimpleQueue())
+    monkeypatch.setattr(monitor, "alarm_journal", None)
+    monkeypatch.setattr(monitor, "new_history_path", lambda: str(tmp_path / "alarm_history_test.json"))
+    monkeypatch.setattr(monitor, "MAX_RETRIES", 1)
+    monkeypatch.setattr(monitor, "backoff_delay", lambda attempt: 0.0)
+
+    model([])
+    assert monitor.run_async_engine(None) == 2
+
+    model([sensor("T1")], endpoint=f"opc.tcp://127.0.0.1:{free_port()}/test")
+    monitor.load_config_json()
+    assert monitor.run_async_engine(None) == 1
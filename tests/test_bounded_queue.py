@@ -0,0 +1,81 @@
+import threading
+
+import pytest
+
+import opcua_monitor as monitor
+
+
+def drain(queue):
+    return [tuple(entry) for entry in queue.get_batch(100)]
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        monitor.BoundedQueue(4, "drop_newest")
+
+
+def test_drop_oldest():
+    queue = monitor.BoundedQueue(3, "drop_oldest")
+    for k in range(5):
+        queue.put("T1", k)
+    assert (queue.enqueued, queue.dropped, queue.max_depth) == (5, 2, 3)
+    assert drain(queue) == [("T1", 2), ("T1", 3), ("T1", 4)]
+
+
+# Below maxsize every item is kept; once full, a put replaces the item queued for its key in place
+def test_coalesce_only_on_overflow():
+    queue = monitor.BoundedQueue(3, "coalesce")
+    queue.put("T1", 1)
+    queue.put("T1", 2)
+    queue.put("T2", 3)
+    queue.put("T1", 4)  # full: replaces the newest T1 item
+    queue.put("T2", 5)
+    assert (queue.enqueued, queue.coalesced, queue.dropped) == (3, 2, 0)
+    assert drain(queue) == [("T1", 1), ("T1", 4), ("T2", 5)]
+
+
+def test_coalesce_drops_the_oldest_for_a_new_key():
+    queue = monitor.BoundedQueue(2, "coalesce")
+    queue.put("T1", 1)
+    queue.put("T2", 2)
+    queue.put("T3", 3)  # full, nothing queued for T3
+    assert queue.dropped == 1
+    queue.put("T1", 4)  # the T1 item was dropped: nothing to replace
+    assert (queue.dropped, queue.coalesced) == (2, 0)
+    assert drain(queue) == [("T3", 3), ("T1", 4)]
+    # After a drain the queue is refilled in order and coalesces again once full
+    queue.put("T1", 5)
+    queue.put("T2", 6)
+    queue.put("T1", 7)
+    assert queue.coalesced == 1 and drain(queue) == [("T1", 7), ("T2", 6)]
+
+
+def test_block_waits_for_a_consumer():
+    queue = monitor.BoundedQueue(2, "block")
+    queue.put("T1", 1)
+    queue.put("T1", 2)
+    done = threading.Event()
+
+    def producer():
+        queue.put("T1", 3)
+        done.set()
+
+    thread = threading.Thread(target=producer, daemon=True)
+    thread.start()
+    assert not done.wait(0.2)
+    assert queue.get_batch(1) == [["T1", 1]]
+    assert done.wait(2)
+    thread.join(2)
+    assert queue.dropped == 0 and drain(queue) == [("T1", 2), ("T1", 3)]
+
+
+def test_close_releases_a_blocked_producer_and_consumer():
+    queue = monitor.BoundedQueue(1, "block")
+    queue.put("T1", 1)
+    thread = threading.Thread(target=queue.put, args=("T1", 2), daemon=True)
+    thread.start()
+    queue.close()
+    thread.join(2)
+    assert not thread.is_alive()
+    assert drain(queue) == [("T1", 2)] and queue.dropped == 1
+    assert queue.get_batch(10) == []
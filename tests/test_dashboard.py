@@ -0,0 +1,75 @@
+import pytest
+
+import opcua_monitor as monitor
+
+
+def broadcaster(monkeypatch, compact):
+    monkeypatch.setattr(monitor, "dashboard_settings", {"frame_rate": 10, "compact": compact})
+    return monitor.DashboardBroadcaster()
+
+
+# Each frame only carries the sensors that changed since the previous one, with their latest value
+def test_delta_frames(monkeypatch):
+    dashboard = broadcaster(monkeypatch, compact=False)
+    assert dashboard.take_frames() == []
+    dashboard.update("T1", 1.0)
+    dashboard.update("T2", 2.0)
+    dashboard.update("T1", 3.0)
+    assert dashboard.take_frames() == [({"T1": 3.0, "T2": 2.0}, "all")]
+    assert dashboard.take_frames() == []
+    dashboard.update("T2", 4.0)
+    assert dashboard.take_frames() == [({"T2": 4.0}, "all")]
+    assert dashboard.frames == 2
+    assert dashboard.snapshot() == {"sensors": ["T1", "T2"], "values": {"T1": 3.0, "T2": 4.0}, "compact": False}
+
+
+# Compact frames name a sensor once, in the first frame that carries it, and round floats
+def test_compact_encoding(monkeypatch):
+    dashboard = broadcaster(monkeypatch, compact=True)
+    dashboard.update("T1", 1.23456)
+    dashboard.update("T2", "OFF")
+    assert dashboard.take_frames() == [({"i": [0, 1], "v": [round(1.23456, monitor.DECIMALS), "OFF"],
+                                         "n": {"T1": 0, "T2": 1}}, "all")]
+    dashboard.update("T2", "ON")
+    dashboard.update("T3", 7)
+    assert dashboard.take_frames() == [({"i": [1, 2], "v": ["ON", 7], "n": {"T3": 2}}, "all")]
+    dashboard.update("T1", 2.0)
+    assert dashboard.take_frames() == [({"i": [0], "v": [2.0]}, "all")]
+    assert dashboard.snapshot(["T1", "T3"]) == {"sensors": ["T1", "T2", "T3"], "values": {"T1": 2.0, "T3": 7},
+                                                "compact": True}
+
+
+# A client that subscribed to some sensors gets its own frame with only those, names included
+@pytest.mark.parametrize("compact", [False, True])
+def test_per_sid_filters(monkeypatch, compact):
+    dashboard = broadcaster(monkeypatch, compact)
+    dashboard.subscribe("a", ["T1"])
+    dashboard.subscribe("b", ["T2", "T3"])
+    dashboard.update("T1", 1.0)
+    dashboard.update("T2", 2.0)
+    frames = dict((to, frame) for frame, to in dashboard.take_frames())
+    assert sorted(frames) == ["a", "all", "b"]
+    if compact:
+        assert frames["a"] == {"i": [0], "v": [1.0], "n": {"T1": 0}}
+        assert frames["b"] == {"i": [1], "v": [2.0], "n": {"T2": 1}}
+    else:
+        assert frames["a"] == {"T1": 1.0} and frames["b"] == {"T2": 2.0}
+
+    # No frame for a client whose sensors did not change; an empty subscription or a disconnect removes the filter
+    dashboard.update("T1", 5.0)
+    assert [to for _, to in dashboard.take_frames()] == ["all", "a"]
+    dashboard.subscribe("a", [])
+    dashboard.unsubscribe("b")
+    dashboard.update("T2", 6.0)
+    assert [to for _, to in dashboard.take_frames()] == ["all"]
+
+
+def test_flush_emits_every_frame(monkeypatch):
+    dashboard = broadcaster(monkeypatch, compact=False)
+    sent = []
+    monkeypatch.setattr(monitor, "emit_timed", lambda event, frame, to: sent.append((event, frame, to)))
+    dashboard.subscribe("a", ["T1"])
+    dashboard.update("T1", 1.0)
+    dashboard.flush()
+    assert sent == [("update", {"T1": 1.0}, "all"), ("update", {"T1": 1.0}, "a")]
+    assert dashboard.messages == 2
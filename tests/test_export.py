@@ -0,0 +1,49 @@
+import csv
+import json
+import os
+
+import opcua_monitor as monitor
+
+
+def add_alarms(history, alarm, sensors):
+    for k, sensor in enumerate(sensors):
+        history.apply(alarm(sensor, timestamp=f"2024-01-01T00:00:{k:02d}Z"))
+
+
+def exported(path):
+    with open(path, newline="") as f:
+        return [row for row in csv.reader(f)][1:]
+
+
+def test_full_export_does_not_advance_the_watermark(tmp_path, history, alarm):
+    path = str(tmp_path / "alarms.csv")
+    add_alarms(history, alarm, ["T1", "T2"])
+    assert monitor.export_alarms(path, incremental=True)["rows"] == 2
+    add_alarms(history, alarm, ["T1"])
+    assert monitor.export_alarms(path, sensors=["T2"])["rows"] == 1
+    assert not os.path.exists(path + ".watermark.json")
+    assert monitor.export_alarms(path, incremental=True)["rows"] == 3
+    assert [row[1] for row in exported(path)] == ["T1", "T2", "T1"]
+
+
+def test_incremental_export_with_filters(tmp_path, history, alarm):
+    path = str(tmp_path / "alarms.csv")
+    add_alarms(history, alarm, ["T1", "T2", "T1"])
+    assert monitor.export_alarms(path, sensors=["T1"], incremental=True)["rows"] == 2
+    add_alarms(history, alarm, ["T2", "T1"])
+    assert monitor.export_alarms(path, sensors=["T1"], incremental=True)["rows"] == 1
+    assert [row[1] for row in exported(path)] == ["T1", "T1", "T1"]
+    # Other filters would skip the T2 alarms before the watermark
+    assert monitor.export_alarms(path, incremental=True) is None
+    with open(path + ".watermark.json") as f:
+        assert json.load(f)["next_index"] == 5
+
+
+def test_full_export_replaces_an_incremental_one(tmp_path, history, alarm):
+    path = str(tmp_path / "alarms.csv")
+    add_alarms(history, alarm, ["T1", "T2"])
+    monitor.export_alarms(path, incremental=True)
+    assert monitor.export_alarms(path, start=monitor.parse_iso_us("2024-01-01T00:00:01Z"))["rows"] == 1
+    assert not os.path.exists(path + ".watermark.json")
+    assert monitor.export_alarms(path, incremental=True)["rows"] == 2
+    assert len(exported(path)) == 2
@@ -0,0 +1,137 @@
+import math
+import os
+
+import pytest
+
+import opcua_monitor as monitor
+
+HOUR = 3600 * 10**6
+T0 = 1_704_067_200 * 10**6  # 2024-01-01T00:00:00Z, the start of a raw (hourly) and a 1 s (daily) segment
+
+
+# Reads with NumPy (structured arrays) and without it (lists of tuples)
+@pytest.fixture(params=["numpy", "plain"])
+def records(request, monkeypatch):
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+        assert monitor.load_numpy() is not None
+        return lambda result: [tuple(r) for r in result.tolist()]
+    monkeypatch.setattr(monitor, "np", None)
+    monkeypatch.setattr(monitor, "numpy_missing", True)
+    return list
+
+
+def historian(tmp_path, names=("T1",)):
+    return monitor.Historian(str(tmp_path / "history"), names, background=False)
+
+
+def segments(tmp_path, tier, name="T1"):
+    directory = tmp_path / "history" / name / tier
+    return {int(n[:-4]): os.path.getsize(directory / n) for n in os.listdir(directory)}
+
+
+# Rollup records (start, min, max, avg, count) of samples, recomputed for buckets of width microseconds
+def rollups(samples, width):
+    buckets = {}
+    for t, value in samples:
+        buckets.setdefault(t - t % width, []).append(value)
+    return [(start, min(values), max(values), math.fsum(values) / len(values), len(values))
+            for start, values in sorted(buckets.items())]
+
+
+def check_rollups(got, expected):
+    assert [r[0] for r in got] == [r[0] for r in expected]
+    for (t, low, high, avg, count), (_, low0, high0, avg0, count0) in zip(got, expected):
+        assert (low, high, count) == (low0, high0, count0)
+        assert avg == pytest.approx(avg0)
+
+
+def test_segment_writes(tmp_path, records):
+    history = historian(tmp_path)
+    samples = [(T0 + k * 600 * 10**6, float(k)) for k in range(9)]  # every 10 min for 80 min
+    for t, value in samples:
+        history.append("T1", t, value, 0)
+    history.append("T1", T0, 99.0)  # out of order: dropped
+    history.append("T1", T0 + 90 * 60 * 10**6, None)  # not numeric: NaN with a bad quality
+    history.flush()
+    assert segments(tmp_path, "raw") == {T0: 6 * 24, T0 + HOUR: 4 * 24}
+    assert history.counters()["samples"] == 10 and history.counters()["out_of_order"] == 1
+
+    raw = records(history.read("T1", T0, T0 + 2 * HOUR))
+    assert raw[:-1] == [(t, value, 0) for t, value in samples]
+    assert math.isnan(raw[-1][1]) and raw[-1][2] == monitor.STATUS_BAD
+    history.close()
+
+
+# A torn record at the end of a segment (a crash during a write) is trimmed on the next read and write
+def test_torn_segment(tmp_path, records):
+    history = historian(tmp_path)
+    history.append("T1", T0, 1.0)
+    history.flush()
+    with open(tmp_path / "history" / "T1" / "raw" / f"{T0}.seg", "ab") as f:
+        f.write(b"\x01" * 10)
+    assert records(history.read("T1", T0, T0 + HOUR)) == [(T0, 1.0, 0)]
+    history.append("T1", T0 + 1, 2.0)
+    history.flush()
+    assert segments(tmp_path, "raw") == {T0: 2 * 24}
+    assert records(history.read("T1", T0, T0 + HOUR)) == [(T0, 1.0, 0), (T0 + 1, 2.0, 0)]
+    history.close()
+
+
+# The 1 s, 1 min and 1 h tiers against a recomputation, with the open buckets before close and written after
+def test_rollups(tmp_path, records):
+    history = historian(tmp_path)
+    step = 700_000  # 0.7 s: buckets with 1 or 2 samples
+    samples = [(T0 + k * step, math.sin(k / 40) * 50 + k % 7) for k in range(int(2.5 * HOUR / step))]
+    for t, value in samples:
+        history.append("T1", t, value)
+    history.append("T1", samples[-1][0] + 1, 1e9, 0x80350000)  # bad quality: raw only
+    end = T0 + 3 * HOUR
+
+    for tier, width in (("1s", 10**6), ("1m", 60 * 10**6), ("1h", HOUR)):
+        check_rollups(records(history.read("T1", T0, end, tier)), rollups(samples, width))
+    check_rollups(records(history.read("T1", T0 + HOUR, T0 + 2 * HOUR, "1h")), rollups(samples, HOUR)[1:2])
+    history.close()
+    assert len(segments(tmp_path, "1h")) == 1 and sorted(segments(tmp_path, "1s")) == [T0]
+    for tier, width in (("1s", 10**6), ("1m", 60 * 10**6), ("1h", HOUR)):
+        check_rollups(records(history.read("T1", T0, end, tier)), rollups(samples, width))
+
+
+# A new historian on the same directory continues after the last sample on disk; a bucket written by both runs is
+# merged when read
+def test_reopen_after_close(tmp_path, records):
+    first = [(T0 + k * 10**6, float(k)) for k in range(90)]
+    second = [(T0 + (90 + k) * 10**6, float(90 + k)) for k in range(60)]
+    history = historian(tmp_path)
+    for t, value in first:
+        history.append("T1", t, value)
+    history.close()
+
+    history = historian(tmp_path)
+    history.append("T1", first[10][0], -1.0)  # before the last sample on disk
+    for t, value in second:
+        history.append("T1", t, value)
+    assert history.counters()["out_of_order"] == 1
+    assert records(history.read("T1", T0, T0 + HOUR)) == [(t, value, 0) for t, value in first + second]
+    check_rollups(records(history.read("T1", T0, T0 + HOUR, "1m")), rollups(first + second, 60 * 10**6))
+    history.close()
+    check_rollups(records(history.read("T1", T0, T0 + HOUR, "1h")), rollups(first + second, HOUR))
+
+
+# Reads spanning several segment files return exactly the records with start <= t < end
+def test_read_across_segment_boundaries(tmp_path, records):
+    history = historian(tmp_path, ("T1", "T2"))
+    samples = [(T0 + k * 60 * 10**6, float(k)) for k in range(4 * 60)]  # one a minute for 4 h: 4 raw segments
+    for t, value in samples:
+        history.append("T1", t, value)
+        history.append("T2", t, -value)
+    history.flush()
+    assert len(segments(tmp_path, "raw")) == 4
+
+    for start, end in ((T0 + HOUR - 1, T0 + HOUR + 1), (T0 + 30 * 60 * 10**6, T0 + 3 * HOUR + 1),
+                       (T0 - HOUR, T0 + 5 * HOUR), (T0 + HOUR, T0 + 2 * HOUR), (T0 + 2 * HOUR, T0 + 2 * HOUR)):
+        expected = [(t, value, 0) for t, value in samples if start <= t < end]
+        assert records(history.read("T1", start, end)) == expected
+    assert records(history.read("T2", T0 + HOUR, T0 + HOUR + 1)) == [(T0 + HOUR, -60.0, 0)]
+    assert records(history.read("T1", T0 + 5 * HOUR, T0 + 6 * HOUR)) == []
+    history.close()
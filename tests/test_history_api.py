@@ -0,0 +1,97 @@
+import math
+
+import pytest
+
+import opcua_monitor as monitor
+
+pytest.importorskip("flask")
+
+T0 = 1_704_067_200 * 10**6  # 2024-01-01T00:00:00Z
+
+
+@pytest.fixture
+def client(model, monkeypatch):
+    monkeypatch.setattr(monitor, "api_cache", monitor.ResponseCache(monitor.API_CACHE_SIZE))
+    model([{"name": "T1", "nodeId": "ns=2;s=T1", "scanRate": 1000, "alarms": {"high": 80}}])
+    monitor.load_config_json()
+    monitor.create_web_app()
+    return monitor.app.test_client()
+
+
+def add_samples(values, start=0):
+    rt = monitor.runtime_by_name["T1"]
+    for k, value in enumerate(values, start):
+        rt.buffer.append(value, T0 + k * 10**6)
+        rt.revision += 1
+    monitor.last_values["T1"] = (values[-1], monitor.from_us(T0 + (start + len(values) - 1) * 10**6))
+
+
+def series(start=0, end=1000, **params):
+    return {"from": (T0 + start * 10**6) / 1000, "to": (T0 + end * 10**6) / 1000, **params}
+
+
+def test_lttb_keeps_endpoints_and_extremes():
+    t = list(range(1000))
+    v = [math.sin(k / 50) for k in t]
+    v[300], v[700] = 25.0, -25.0
+    selected = monitor.lttb_indices(t, v, 50)
+    assert len(selected) == 50 and selected == sorted(set(selected))
+    assert selected[0] == 0 and selected[-1] == 999
+    assert 300 in selected and 700 in selected
+    assert monitor.lttb_indices(t[:10], v[:10], 50) == list(range(10))
+
+
+def test_minmax_keeps_extremes():
+    v = [math.sin(k / 50) for k in range(1000)]
+    v[301], v[702] = 25.0, -25.0
+    selected = monitor.minmax_indices(v, 40)
+    assert len(selected) <= 40 and selected == sorted(selected)
+    assert 301 in selected and 702 in selected
+    # Every bucket keeps its own min and max
+    for k in range(20):
+        chunk = range(k * 50, (k + 1) * 50)
+        kept = [i for i in selected if i in chunk]
+        assert {v[i] for i in kept} == {min(v[i] for i in chunk), max(v[i] for i in chunk)}
+
+
+def test_series_downsampled_from_memory(client):
+    add_samples([float(k % 17) for k in range(100)])
+    body = client.get("/api/sensors/T1/series", query_string=series(points=10)).get_json()
+    assert body["source"] == "memory" and body["count"] == 100
+    assert len(body["t"]) == 10 and body["t"][0] == T0 / 1000 and body["t"][-1] == (T0 + 99 * 10**6) / 1000
+    body = client.get("/api/sensors/T1/series", query_string=series(10, 19, method="minmax")).get_json()
+    assert body["count"] == 10 and body["v"] == [float(k % 17) for k in range(10, 20)]
+
+
+# The ETag of a response stays valid until a sample arrives; a conditional request then gets 304
+def test_series_etag_round_trip(client):
+    add_samples([1.0, 2.0, 3.0])
+    response = client.get("/api/sensors/T1/series", query_string=series())
+    assert response.status_code == 200 and response.headers["ETag"]
+    assert response.headers["Last-Modified"] == "Mon, 01 Jan 2024 00:00:02 GMT"
+    etag = response.headers["ETag"]
+
+    again = client.get("/api/sensors/T1/series", query_string=series(), headers={"If-None-Match": etag})
+    assert again.status_code == 304 and again.headers["ETag"] == etag and not again.data
+    assert monitor.api_cache.hits == 1
+
+    add_samples([4.0], start=3)
+    changed = client.get("/api/sensors/T1/series", query_string=series(), headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["ETag"] != etag
+    assert changed.get_json()["v"] == [1.0, 2.0, 3.0, 4.0]
+
+
+@pytest.mark.parametrize("params,message", [
+    ({"from": "yesterday"}, "'from' must be an ISO 8601 time or epoch milliseconds"),
+    ({"to": "2024-13-01"}, "'to' must be an ISO 8601 time or epoch milliseconds"),
+    ({"points": "many"}, "'points' must be an integer"),
+    ({"method": "average"}, "'method' must be lttb or minmax"),
+    ({"from": "2024-01-02T00:00:00Z", "to": "2024-01-01T00:00:00Z"}, "'from' must not be after 'to'"),
+])
+def test_series_bad_parameters(client, params, message):
+    response = client.get("/api/sensors/T1/series", query_string=params)
+    assert response.status_code == 400 and response.get_json() == {"error": message}
+
+
+def test_series_unknown_sensor(client):
+    assert client.get("/api/sensors/T9/series").status_code == 404
@@ -0,0 +1,119 @@
+from datetime import datetime, timezone
+
+import opcua_monitor as monitor
+from tests.test_subscriptions import free_port
+
+
+def sensor(name, node, high=80, **extra):
+    return {"name": name, "nodeId": f"ns=2;s={node}", "scanRate": 1000, "alarms": {"high": high}, **extra}
+
+
+def raise_alarm(name, value=90.0):
+    rt = monitor.runtime_by_name[name]
+    monitor.process_sample(rt, value, datetime.now(timezone.utc))
+
+
+def test_reload_diff(model, history):
+    model([sensor("T1", "a"), sensor("T2", "b"), sensor("T3", "c")])
+    monitor.load_config_json()
+    t1 = monitor.runtime_by_name["T1"]
+    raise_alarm("T1")
+    model([sensor("T1", "a", high=85), sensor("T2", "b", scanRate=2000), sensor("T4", "d")])
+    monitor.reload_config()
+    assert sorted(monitor.runtime_by_name) == ["T1", "T2", "T4"]
+    assert monitor.runtime_by_name["T1"] is t1  # updated in place, window and alarm state kept
+    assert len(t1.buffer) == 1 and t1.states["H"]["active"]
+    assert t1.levels[0][2] == 85.0
+    assert monitor.runtime_by_name["T2"].config["scanRate"] == 2000
+
+
+def test_removed_sensor_clears_its_alarms(model, history):
+    model([sensor("T1", "a"), sensor("T2", "b")])
+    monitor.load_config_json()
+    raise_alarm("T1")
+    raise_alarm("T2")
+    assert history["statistics"]["active_alarms"] == 2
+    model([sensor("T2", "b")])
+    monitor.reload_config()
+    assert history["statistics"]["active_alarms"] == 1
+    assert history.active_levels() == {"T2": {"H"}}
+    assert [(a["sensor"], a["active"]) for a in history["alarms"]] == [("T1", False), ("T2", True)]
+
+
+def test_removed_level_clears_its_alarm(model, history):
+    model([sensor("T1", "a")])
+    monitor.load_config_json()
+    raise_alarm("T1")
+    model([dict(sensor("T1", "a"), alarms={"high_high": 95})])
+    monitor.reload_config()
+    assert history.active_levels() == {}
+
+
+def test_invalid_config_changes_nothing(model, history):
+    model([sensor("T1", "a")], trendSettings={"riseRate": 2.0})
+    monitor.load_config_json()
+    revision = monitor.config_revision
+    model([sensor("T1", "a"), sensor("T2", "b", monitoring={"queueSize": "many"})], trendSettings={"riseRate": 5.0})
+    monitor.reload_config()
+    assert monitor.trend_settings["rise_rate"] == 2.0
+    assert sorted(monitor.runtime_by_name) == ["T1"]
+    assert monitor.config_revision == revision
+
+
+class FakeProcess:
+    def is_alive(self):
+        return True
+
+
+def test_sharded_reload_reaches_only_affected_shards(model, monkeypatch):
+    servers = [{"endpoint": "opc.tcp://a:4840", "sensors": [sensor("A1", "a1"), sensor("A2", "a2")]},
+               {"endpoint": "opc.tcp://b:4840", "sensors": [sensor("B1", "b1")]}]
+    model([], servers=servers)
+    monitor.load_config_json()
+    coordinator = monitor.ShardCoordinator(monitor.plan_shards(monitor.runtime.values()))
+    coordinator._processes = [FakeProcess(), FakeProcess()]
+    coordinator._commands = [monitor.queue.SimpleQueue(), monitor.queue.SimpleQueue()]
+    started = []
+    monkeypatch.setattr(coordinator, "start_shard", started.append)
+
+    servers[0]["sensors"] = [sensor("A1", "a1", high=90), sensor("A3", "a3")]
+    model([], servers=servers)
+    coordinator.reload(monitor.reload_config())
+
+    kind, config, positions = coordinator._commands[0].get_nowait()
+    assert kind == "reload" and config["endpoint"] == "opc.tcp://a:4840"
+    assert [s["name"] for s in config["sensors"]] == ["A1", "A3"]
+    assert positions == {"A1": 0, "A3": 2}  # A2 keeps position 1 for samples in flight
+    assert coordinator._commands[1].empty()
+    assert started == []
+
+    servers[1]["sensors"] = []
+    model([], servers=servers, shardingSettings={"maxSensorsPerWorker": 2})
+    coordinator.reload(monitor.reload_config())
+    assert coordinator._commands[1].get_nowait() == ("stop",)
+    assert coordinator._commands[0].get_nowait()[0] == "reload"  # settings changed
+
+
+# A reload keeps the log writer unless logSettings changed; connection messages are written to the log
+def test_reload_reopens_the_log_only_when_its_settings_change(model, tmp_path, monkeypatch):
+    log_file = tmp_path / "monitor.log"
+    model([sensor("T1", "a")], logSettings={"file": str(log_file)})
+    monitor.load_config_json()
+    listener = monitor.log_listener
+    model([sensor("T1", "a", high=85)], logSettings={"file": str(log_file)})
+    monitor.reload_config()
+    assert monitor.log_listener is listener
+
+    monkeypatch.setattr(monitor, "MAX_RETRIES", 1)
+    monkeypatch.setattr(monitor, "RETRY_DELAY", 0)
+    monkeypatch.setattr(monitor, "ENDPOINT", f"opc.tcp://127.0.0.1:{free_port()}")
+    assert monitor.connect_to_opcua() is None
+
+    model([sensor("T1", "a", high=85)], logSettings={"file": str(log_file), "level": "WARNING"})
+    monitor.reload_config()
+    assert monitor.log_listener is not listener
+    monitor.shutdown_logging()
+    messages = [line.split(" | ", 1)[1] for line in log_file.read_text().splitlines()]
+    assert messages[0] == "Anonymous connection enabled."
+    assert messages[1].startswith("Connection failed (attempt 1/1): ")
+    assert messages[2] == "Unable to connect after multiple attempts."
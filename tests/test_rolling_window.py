@@ -0,0 +1,122 @@
+import math
+import random
+
+import pytest
+
+import opcua_monitor as monitor
+
+
+def check(window, samples):
+    recent = samples[-window.maxlen:]
+    values = [value for _, value in recent]
+    assert len(window) == len(recent)
+    assert list(window) == values
+    assert window.min() == min(values) and window.max() == max(values)
+    # The running sum drifts by a few ulps of the largest value seen since the last re-sum (at most two windows ago)
+    scale = max(1.0, max(abs(value) for _, value in samples[-2 * window.maxlen:]))
+    assert window.mean() == pytest.approx(math.fsum(values) / len(values), abs=1e-12 * scale)
+    times, stored = window.snapshot()
+    assert list(times) == [t for t, _ in recent] and list(stored) == values
+
+
+def test_empty():
+    window = monitor.RollingWindow(5)
+    assert len(window) == 0 and list(window) == []
+    assert window.min() is None and window.max() is None and window.mean() is None
+
+
+# Min/max/mean against a recomputation over many wraps and compactions of the arrays
+@pytest.mark.parametrize("maxlen", [1, 2, 7, 100])
+def test_matches_recomputation(maxlen):
+    rng = random.Random(maxlen)
+    window = monitor.RollingWindow(maxlen)
+    samples = []
+    for t in range(5 * window.capacity + 3):
+        value = rng.choice([rng.uniform(-50, 50), 1e9, -1e9, 0.0, samples[-1][1] if samples else 0.0])
+        samples.append((t, value))
+        window.append(value, t)
+        check(window, samples)
+
+
+def test_monotonic_runs():
+    window = monitor.RollingWindow(4)
+    samples = [(t, float(v)) for t, v in enumerate(list(range(10)) + list(range(10, 0, -1)))]
+    for t, value in samples:
+        window.append(value, t)
+        check(window, samples[:t + 1])
+
+
+def test_arrays():
+    pytest.importorskip("numpy")
+    window = monitor.RollingWindow(3)
+    for t, value in enumerate([1.0, 2.0, 3.0, 4.0, 5.0]):
+        window.append(value, t)
+    times, values = window.arrays()
+    assert times.tolist() == [2, 3, 4] and values.tolist() == [3.0, 4.0, 5.0]
+
+
+def test_resized():
+    window = monitor.RollingWindow(5)
+    samples = [(t, float(t * t)) for t in range(8)]
+    for t, value in samples:
+        window.append(value, t)
+    check(window.resized(3), samples)
+    check(window.resized(20), samples[-5:])
+
+
+# A held value is repeated once per period, up to the window length
+def test_hold():
+    window = monitor.RollingWindow(4)
+    window.hold(1000, 100)  # nothing to repeat yet
+    assert len(window) == 0
+    window.append(5.0, 0)
+    window.hold(240, 100)  # due at 100 and 200; 200 is within half a period of 240, the sample at 240 stands for it
+    assert list(window.snapshot()[0]) == [0, 100]
+    window.append(7.0, 240)
+    window.hold(10_000, 100)
+    times, values = window.snapshot()
+    assert list(times) == [9640, 9740, 9840, 9940] and list(values) == [7.0] * 4
+
+
+# Least-squares slope of the samples of the last window_us before the newest one
+def least_squares(samples, window_us):
+    recent = [(t, value) for t, value in samples if t >= samples[-1][0] - window_us]
+    n = len(recent)
+    if n < monitor.TREND_MIN_SAMPLES or 2 * (recent[-1][0] - recent[0][0]) < window_us:
+        return None
+    xs = [(t - recent[0][0]) / 1e6 for t, _ in recent]
+    mean_x, mean_v = sum(xs) / n, sum(value for _, value in recent) / n
+    return sum((x - mean_x) * (value - mean_v) for x, (_, value) in zip(xs, recent)) / sum((x - mean_x) ** 2 for x in xs)
+
+
+# The trend sums read the samples from the sample window: a trend window longer than it is cut to it
+@pytest.mark.parametrize("maxlen,window_us", [(200, 30_000_000), (20, 30_000_000)])
+def test_trend_window_matches_recomputation(maxlen, window_us):
+    rng = random.Random(maxlen)
+    window = monitor.RollingWindow(maxlen)
+    trend = monitor.TrendWindow(window_us, window)
+    samples = []
+    t = 0
+    for i in range(5 * window.capacity):
+        t += rng.choice([100_000, 500_000, 1_000_000])
+        value = 10 * math.sin(i / 50) + rng.random()
+        window.append(value, t)
+        samples.append((t, value))
+        slope = trend.update(1.0)  # no smoothing
+        expected = least_squares(samples[-maxlen:], window_us)
+        if expected is not None:
+            assert slope == pytest.approx(expected, rel=1e-6, abs=1e-9)
+
+
+def test_trend_window_resized():
+    window = monitor.RollingWindow(100)
+    trend = monitor.TrendWindow(10_000_000, window)
+    samples = [(t * 1_000_000, 2.0 * t) for t in range(30)]
+    for t, value in samples:
+        window.append(value, t)
+        trend.update(1.0)
+    trend.direction = "rise"
+    resized = trend.resized(5_000_000, 1.0, window.resized(50))
+    assert resized.buffer.trend is resized and resized.direction == "rise"
+    resized.buffer.append(60.0, 30_000_000)
+    assert resized.update(1.0) == pytest.approx(2.0)
@@ -0,0 +1,93 @@
+import asyncio
+import socket
+import time
+
+import pytest
+
+import opcua_monitor as monitor
+
+asyncua = pytest.importorskip("asyncua")
+
+SENSOR = {"name": "T1", "nodeId": "ns=2;s=T1", "scanRate": 100, "alarms": {"high": 80},
+          "monitoring": {"samplingInterval": 50, "queueSize": 4, "discardOldest": False, "deadbandType": "absolute",
+                         "deadbandValue": 0.5}}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class Recorder:
+    def __init__(self):
+        self.values = []
+
+    def datachange_notification(self, node, val, data):
+        self.values.append(val)
+
+    def status_change_notification(self, status):
+        pass
+
+
+def sensor_runtime():
+    return monitor.SensorRuntime(SENSOR, monitor.RollingWindow(10), monitor.new_sensor_states())
+
+
+def check_request(request, ua_types):
+    params = request.RequestedParameters
+    assert (params.SamplingInterval, params.QueueSize, params.DiscardOldest) == (50, 4, False)
+    assert params.Filter.DeadbandType == ua_types.DeadbandType.Absolute and params.Filter.DeadbandValue == 0.5
+
+
+def test_monitored_items_python_opcua():
+    from opcua import Client, Server, ua
+    endpoint = f"opc.tcp://127.0.0.1:{free_port()}/test"
+    server = Server()
+    server.set_endpoint(endpoint)
+    server.register_namespace("test")
+    server.get_objects_node().add_variable(ua.NodeId("T1", 2), "T1", 20.0)
+    server.start()
+    client = Client(endpoint)
+    try:
+        client.connect()
+        rt = sensor_runtime()
+        requests = monitor.monitored_item_requests(ua, [client.get_node(rt.node_id)], [rt])
+        check_request(requests[0], ua)
+        recorder = Recorder()
+        sub = client.create_subscription(100, recorder)
+        handles = monitor.create_monitored_items(client, sub, [rt])
+        assert isinstance(handles[0], int)
+        deadline = time.monotonic() + 5
+        while not recorder.values and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert recorder.values == [20.0]
+    finally:
+        client.disconnect()
+        server.stop()
+
+
+def test_monitored_items_asyncua():
+    async def run():
+        endpoint = f"opc.tcp://127.0.0.1:{free_port()}/test"
+        server = asyncua.Server()
+        await server.init()
+        server.set_endpoint(endpoint)
+        await server.register_namespace("test")
+        await server.nodes.objects.add_variable(asyncua.ua.NodeId("T1", 2), "T1", 20.0)
+        async with server:
+            async with asyncua.Client(endpoint) as client:
+                rt = sensor_runtime()
+                requests = monitor.monitored_item_requests(asyncua.ua, [client.get_node(SENSOR["nodeId"])], [rt])
+                check_request(requests[0], asyncua.ua)
+                recorder = Recorder()
+                sub = await client.create_subscription(100, recorder)
+                handles = await sub.create_monitored_items(requests)
+                assert isinstance(handles[0], int)
+                for _ in range(100):
+                    if recorder.values:
+                        break
+                    await asyncio.sleep(0.05)
+                assert recorder.values == [20.0]
+
+    asyncio.run(run())
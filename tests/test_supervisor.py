@@ -0,0 +1,59 @@
+import pytest
+
+import opcua_monitor as monitor
+
+
+class FakeSession:
+    uaclient = None
+    keepalive = None
+
+
+@pytest.fixture
+def recovering(monkeypatch):
+    supervisor = monitor.ConnectionSupervisor(FakeSession(), monitor.SubHandler())
+    supervisor.recovering = True
+    monkeypatch.setattr(monitor, "supervisor", supervisor)
+    return supervisor
+
+
+# Acknowledgements do not wait for a reconnect in progress
+def test_running_client_fails_fast(recovering):
+    with recovering.lock:  # as if a reload held it
+        with pytest.raises(monitor.SessionUnavailable):
+            monitor.running_client()
+    recovering.recovering = False
+    assert monitor.running_client() is recovering.client
+
+
+def test_acknowledge_api_unavailable(recovering, history, alarm):
+    pytest.importorskip("flask")
+    monitor.create_web_app()
+    history.apply(alarm("T1"))
+    response = monitor.app.test_client().post("/api/alarms/acknowledge", json={"indexes": [0]})
+    assert response.status_code == 503
+    assert not history["alarms"][0]["acknowledged"]
+
+
+# Reloads during a recovery change the model only; the removed and re-subscribed sensors are remembered
+def test_reload_during_recovery(model, recovering):
+    sensors = [{"name": name, "nodeId": f"ns=2;s={name}", "scanRate": 1000, "alarms": {"high": 80}}
+               for name in ("T1", "T2", "T3")]
+    model(sensors)
+    monitor.load_config_json()
+    old = dict(monitor.runtime_by_name)
+    model([sensors[1], dict(sensors[2], scanRate=2000)])
+    diff = recovering.reload()
+    assert [rt.name for rt in diff["removed"]] == ["T1"] and [rt.name for rt in diff["moved"]] == ["T3"]
+    assert recovering.stale == [old["T1"], old["T3"]]
+
+
+# Private python-opcua attributes are only used with a checked version
+def test_unchecked_opcua_version(monkeypatch):
+    internals = monitor.OpcuaInternals()
+    monkeypatch.setattr(monitor, "OPCUA_INTERNALS_VERSIONS", ("0.0.",))
+    monkeypatch.setattr(monitor, "opcua_internals", internals)
+    assert not internals.supported
+    assert not internals.watch_publish(FakeSession(), lambda future: None)
+    assert internals.socket_alive(FakeSession()) is None
+    sub = type("Sub", (), {"subscription_id": 1})()
+    assert monitor.transfer_subscriptions(FakeSession(), {1000: sub}) == set()
@@ -0,0 +1,98 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import opcua_monitor as monitor
+
+SENSOR = {"name": "T1", "nodeId": "ns=2;s=T1", "alarms": {}}
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+# Trend settings without smoothing, a 10 s window; published trend events are collected
+@pytest.fixture
+def published(monkeypatch, history):
+    monkeypatch.setattr(monitor, "trend_settings", {"rise_rate": 1.0, "fall_rate": -1.0, "window": 10.0,
+                                                    "smoothing": 1.0, "hysteresis": 0.5})
+    for name in ("pipeline", "outbox", "alarm_journal"):
+        monkeypatch.setattr(monitor, name, None)
+    events = []
+    monkeypatch.setattr(monitor, "publish", lambda event, payload: events.append((event, payload)))
+    return events
+
+
+def sensor_runtime():
+    return monitor.SensorRuntime(SENSOR, monitor.RollingWindow(1000), monitor.new_sensor_states())
+
+
+# One sample per second following the given slopes (units per second), one slope per segment of seconds
+def feed(rt, segments, start=0, value=0.0):
+    t = start
+    for slope, seconds in segments:
+        for _ in range(seconds):
+            t += 1
+            value += slope
+            ts = START + timedelta(seconds=t)
+            rt.buffer.append(value, monitor.to_us(ts))
+            monitor.check_trend(rt, value, ts)
+    return t, value
+
+
+def test_slope_of_a_linear_series():
+    window = monitor.RollingWindow(100)
+    trend = monitor.TrendWindow(10_000_000, window)
+    slopes = []
+    for t in range(20):
+        window.append(3.0 - 0.5 * t, t * 1_000_000)
+        slopes.append(trend.update(0.3))
+    # No slope before the window holds TREND_MIN_SAMPLES samples spanning half its length
+    assert slopes[:5] == [None] * 5
+    assert slopes[5:] == pytest.approx([-0.5] * 15)
+
+
+def test_rising_trend_starts_once_and_ends_below_the_hysteresis(published):
+    rt = sensor_runtime()
+    t, value = feed(rt, [(0.0, 10), (2.0, 30)])
+    assert [(p["type"], p["active"]) for _, p in published] == [("RISE", True)]
+    assert rt.trend.direction == "rise"
+
+    # Below riseRate but above hysteresis * riseRate: the trend holds
+    t, value = feed(rt, [(0.8, 30)], t, value)
+    assert len(published) == 1 and rt.trend.direction == "rise"
+
+    t, value = feed(rt, [(0.0, 30)], t, value)
+    assert [(p["type"], p["active"]) for _, p in published] == [("RISE", True), ("RISE", False)]
+    assert rt.trend.direction is None and rt.trend.started_at is None
+    end = published[1][1]
+    start_ts = monitor.parse_iso_us(published[0][1]["timestamp"])
+    assert end["duration"] == pytest.approx((monitor.parse_iso_us(end["timestamp"]) - start_ts) / 1e6)
+    assert end["slope"] < 0.5
+
+    trends = monitor.alarm_history["trends"]
+    assert len(trends) == 1 and trends[0]["type"] == "RISE"
+    assert not trends[0]["active"] and trends[0]["duration"] == end["duration"]
+    assert not monitor.alarm_history.active_trends
+
+
+def test_falling_trend(published):
+    rt = sensor_runtime()
+    feed(rt, [(0.0, 10), (-3.0, 20), (0.0, 20)])
+    assert [(p["type"], p["active"]) for _, p in published] == [("FALL", True), ("FALL", False)]
+
+
+def test_noise_below_the_rates_raises_nothing(published):
+    rt = sensor_runtime()
+    feed(rt, [(0.9, 1), (-0.9, 1)] * 50)
+    assert published == []
+
+
+# A restored (aware) start time and a python-opcua (naive UTC) end time give the duration between them
+def test_emit_trend_duration(published):
+    rt = sensor_runtime()
+    started = START
+    monitor.emit_trend("TREND_START", rt, "rise", 12.0, 1.5, started)
+    monitor.emit_trend("TREND_END", rt, "rise", 20.0, 0.4, (START + timedelta(seconds=90)).replace(tzinfo=None),
+                       started_at=started)
+    start, end = published[0][1], published[1][1]
+    assert (start["value"], start["slope"], start["duration"]) == ("12.00", 1.5, None)
+    assert (end["value"], end["active"], end["duration"]) == ("20.00", False, 90.0)
+    assert monitor.alarm_history["trends"][0]["duration"] == 90.0
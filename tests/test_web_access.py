@@ -0,0 +1,69 @@
+import pytest
+
+import opcua_monitor as monitor
+
+pytest.importorskip("flask")
+
+REMOTE = {"REMOTE_ADDR": "192.0.2.7"}
+SENSOR = {"name": "T1", "nodeId": "ns=2;s=T1", "scanRate": 1000, "alarms": {"high": 80}}
+
+
+@pytest.fixture
+def web(model, alarm, monkeypatch):
+    monkeypatch.setattr(monitor, "alarm_journal", None)
+    monkeypatch.setattr(monitor, "supervisor", None)
+
+    def start(**settings):
+        model([SENSOR], **settings)
+        monitor.load_config_json()
+        monitor.alarm_history.apply(alarm("T1"))
+        monitor.create_web_app()
+        return monitor.app.test_client()
+    return start
+
+
+@pytest.mark.parametrize("host,loopback", [
+    ("127.0.0.1", True), ("127.1.2.3", True), ("::1", True), ("::ffff:127.0.0.1", True), ("localhost", True),
+    ("0.0.0.0", False), ("::", False), ("192.0.2.7", False), ("example.com", False), ("", False),
+])
+def test_is_loopback(host, loopback):
+    assert monitor.is_loopback(host) is loopback
+
+
+def test_public_host_needs_a_token(model, capsys):
+    model([SENSOR])
+    monitor.load_config_json()
+    assert monitor.web_host_allowed("127.0.0.1")
+    assert not monitor.web_host_allowed("0.0.0.0")
+    assert "webSettings.apiToken" in capsys.readouterr().out
+    model([SENSOR], webSettings={"apiToken": "s3cret"})
+    monitor.load_config_json()
+    assert monitor.web_host_allowed("0.0.0.0")
+
+
+# Without a token, state-changing requests are accepted from this machine only; reads stay open
+def test_without_token_only_loopback_changes_state(web):
+    client = web()
+    assert client.post("/api/alarms/acknowledge", json={"indexes": [0]}, environ_base=REMOTE).status_code == 403
+    assert client.delete("/api/profile", environ_base=REMOTE).status_code == 403
+    assert client.post("/api/profile", environ_base=REMOTE).status_code == 403
+    assert not monitor.profiler.running
+    assert client.get("/api/profile", environ_base=REMOTE).status_code == 200
+    assert client.get("/api/alarms", environ_base=REMOTE).get_json()["alarms"][0]["acknowledged"] is False
+
+    response = client.post("/api/alarms/acknowledge", json={"indexes": [0]})
+    assert response.status_code == 200 and response.get_json() == {"acknowledged": [0], "count": 1}
+
+
+# With a token, every state-changing request must carry it, from this machine too
+def test_token_required_when_configured(web):
+    client = web(webSettings={"apiToken": "s3cret"})
+    for headers in ({}, {"Authorization": "Bearer wrong"}, {"Authorization": "s3cret"}):
+        response = client.post("/api/alarms/acknowledge", json={"indexes": [0]}, headers=headers)
+        assert response.status_code == 401
+        assert client.delete("/api/profile", headers=headers).status_code == 401
+    assert not monitor.alarm_history["alarms"][0]["acknowledged"]
+
+    response = client.post("/api/alarms/acknowledge", json={"indexes": [0]}, environ_base=REMOTE,
+                           headers={"Authorization": "Bearer s3cret"})
+    assert response.status_code == 200 and monitor.alarm_history["alarms"][0]["acknowledged"]